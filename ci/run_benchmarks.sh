@@ -0,0 +1,11 @@
+#!/bin/bash
+
+set -xe
+
+if [[ ! "${CI}" == "true" ]]; then
+    source /tmp/coldfront_venv/bin/activate
+fi
+
+export DJANGO_SETTINGS_MODULE="local_settings"
+
+python -m django test coldfront_plugin_cloud.tests.benchmarks
@@ -19,6 +19,9 @@ class ResourceAllocator(abc.ABC):
 
     project_name_max_length = None
 
+    # Raised by get_project when the project doesn't exist
+    project_not_found_errors: tuple[type[Exception], ...] = ()
+
     class Project(NamedTuple):
         name: str
         id: str
@@ -60,35 +63,65 @@ class ResourceAllocator(abc.ABC):
     def set_users(self, project_id, apply):
         coldfront_users = allocation_models.AllocationUser.objects.filter(
             allocation=self.allocation, status__name="Active"
-        )
+        ).select_related("user")
         cluster_users = self.get_users(project_id)
         failed_validation = False
 
         # Create users that exist in coldfront but not in the resource
+        missing_users = []
         for coldfront_user in coldfront_users:
             coldfront_username = coldfront_user.user.username
             if coldfront_username not in cluster_users:
                 failed_validation = True
                 logger.info(f"{coldfront_username} is not part of {project_id}")
-                if apply:
-                    self.get_or_create_federated_user(coldfront_username)
-                    self.assign_role_on_user(coldfront_username, project_id)
+                missing_users.append(coldfront_username)
+
+        if apply and missing_users:
+            for coldfront_username in missing_users:
+                self.get_or_create_federated_user(coldfront_username)
+            self.assign_roles_bulk(missing_users, project_id)
 
         # remove users that are in the resource but not in coldfront
         users = set(
             [coldfront_user.user.username for coldfront_user in coldfront_users]
         )
+        extra_users = []
         for allocation_user in cluster_users:
             if allocation_user not in users:
                 failed_validation = True
                 logger.info(
                     f"{allocation_user} exists in the resource {project_id} but not in coldfront"
                 )
-                if apply:
-                    self.remove_role_from_user(allocation_user, project_id)
+                extra_users.append(allocation_user)
+
+        if apply and extra_users:
+            self.remove_roles_bulk(extra_users, project_id)
 
         return failed_validation
 
+    def assign_roles_bulk(self, usernames, project_id):
+        """Assign the member role to several users of a project.
+
+        Allocators should override this when the backend allows doing so with
+        fewer requests than one assign_role_on_user call per user."""
+        for username in usernames:
+            self.assign_role_on_user(username, project_id)
+
+    def remove_roles_bulk(self, usernames, project_id):
+        """Remove the member role from several users of a project.
+
+        Allocators should override this when the backend allows doing so with
+        fewer requests than one remove_role_from_user call per user."""
+        for username in usernames:
+            self.remove_role_from_user(username, project_id)
+
+    def get_project_versions(self) -> dict[str, str]:
+        """Returns a version for each project that changes when the project does.
+
+        Used to skip validating projects that have not changed. Allocators
+        for backends that cannot tell this cheaply return an empty dict."""
+        return {}
+
     def check_and_apply_quota_attr(
         self,
         attr: str,
@@ -146,7 +179,11 @@ class ResourceAllocator(abc.ABC):
         return self.resource.get_attribute(attributes.RESOURCE_ROLE) or "member"
 
     @abc.abstractmethod
-    def set_project_configuration(self, project_id, apply=True):
+    def set_project_configuration(self, project_id, apply=True) -> bool:
+        """Validates the users, quota and other configuration of a project,
+        applying the expected configuration if apply is set.
+
+        Returns whether the project differed from its expected configuration."""
         pass
 
     @abc.abstractmethod
@@ -7,14 +7,13 @@ import logging
 import os
 
 from coldfront_plugin_cloud import attributes
-from coldfront_plugin_cloud import utils
+from coldfront_plugin_cloud import profiling, utils
+from coldfront_plugin_cloud.management import mixins
 from coldfront_plugin_cloud.models.quota_models import QuotaSpecs
 
-import boto3
 from django.core.management.base import BaseCommand
 from coldfront.core.resource.models import Resource, ResourceType
 from coldfront.core.allocation.models import Allocation
-import pytz
 
 
 logging.basicConfig(level=logging.INFO)
@@ -34,7 +33,8 @@ def get_rates():
     if _RATES is None:
         from nerc_rates import load_from_url
 
-        _RATES = load_from_url()
+        with profiling.phase(profiling.IO):
+            _RATES = load_from_url()
     return _RATES
 
 
@@ -91,10 +91,13 @@ class InvoiceRow:
 
 
 def datetime_type(v):
-    return pytz.utc.localize(datetime.fromisoformat(v))
+    d = datetime.fromisoformat(v)
+    if d.tzinfo is None:
+        return d.replace(tzinfo=timezone.utc)
+    return d.astimezone(timezone.utc)
 
 
-class Command(BaseCommand):
+class Command(mixins.ProfileMixin, mixins.DebugSqlMixin, BaseCommand):
     help = "Generate invoices for storage billing."
 
     def add_arguments(self, parser):
@@ -156,13 +159,13 @@ class Command(BaseCommand):
     def default_start_argument():
         d = (datetime.now() - timedelta(days=1)).replace(day=1)
         d = d.replace(hour=0, minute=0, second=0, microsecond=0)
-        return pytz.utc.localize(d)
+        return d.replace(tzinfo=timezone.utc)
 
     @staticmethod
     def default_end_argument():
         d = datetime.now()
         d = d.replace(hour=0, minute=0, second=0, microsecond=0)
-        return pytz.utc.localize(d)
+        return d.replace(tzinfo=timezone.utc)
 
     @staticmethod
     def upload_to_s3(s3_endpoint, s3_bucket, file_location, invoice_month, end_time):
@@ -177,6 +180,8 @@ class Command(BaseCommand):
         if not invoice_month:
             raise Exception("No invoice month specified. Required for S3 upload.")
 
+        import boto3
+
         s3 = boto3.client(
             "s3",
             endpoint_url=s3_endpoint,
@@ -363,10 +368,11 @@ class Command(BaseCommand):
 
         if options["upload_to_s3"]:
             logger.info(f"Uploading to S3 endpoint {options['s3_endpoint_url']}.")
-            self.upload_to_s3(
-                options["s3_endpoint_url"],
-                options["s3_bucket_name"],
-                options["output"],
-                options["invoice_month"],
-                options["end"],
-            )
+            with profiling.phase(profiling.IO):
+                self.upload_to_s3(
+                    options["s3_endpoint_url"],
+                    options["s3_bucket_name"],
+                    options["output"],
+                    options["invoice_month"],
+                    options["end"],
+                )
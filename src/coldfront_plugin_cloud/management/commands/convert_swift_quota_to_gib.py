@@ -2,6 +2,7 @@ import logging
 
 from coldfront_plugin_cloud import attributes
 from coldfront_plugin_cloud import openstack
+from coldfront_plugin_cloud.management import mixins
 
 from django.core.management.base import BaseCommand
 from django.db.models import Q
@@ -12,7 +13,7 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-class Command(BaseCommand):
+class Command(mixins.ApiMetricsMixin, BaseCommand):
     help = """One time command to convert all Swift quotas on all Openstack allocations from
     GB to GiB. I.e a Swift quota of 1000^2 bytes will now be 1024^2 bytes"""
 
@@ -1,39 +1,173 @@
+import collections
+import concurrent.futures
+import csv
+import json
 import logging
 import sys
 
 from coldfront_plugin_cloud import attributes
+from coldfront_plugin_cloud import openshift
 from coldfront_plugin_cloud import openstack
+from coldfront_plugin_cloud.management import mixins
 
 from novaclient import client as novaclient
 from django.core.management.base import BaseCommand
-from coldfront.core.resource.models import Resource, ResourceType
-from coldfront.core.allocation.models import Allocation, AllocationStatusChoice
+from django.db.models import OuterRef, Subquery
+from coldfront.core.resource.models import Resource
+from coldfront.core.allocation.models import (
+    Allocation,
+    AllocationAttribute,
+    AllocationStatusChoice,
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+OPENSHIFT_GPU_QUOTA_ATTRIBUTES = [
+    attributes.QUOTA_REQUESTS_GPU,
+    attributes.QUOTA_REQUESTS_VM_GPU_A100_SXM4,
+    attributes.QUOTA_REQUESTS_VM_GPU_V100,
+    attributes.QUOTA_REQUESTS_VM_GPU_H100,
+]
 
-class Command(BaseCommand):
+SERVER_PAGE_SIZE = 1000
+
+USAGE_FIELDS = ["project_id", "allocation_id", "project", "quota", "used", "allowed"]
+
+
+def iter_servers(client, search_opts, page_size=None):
+    """Yields servers matching search_opts one page at a time.
+
+    Nova has no field selection for server lists, so pages are kept small
+    and only consumed as a stream instead of listing every server at once.
+    """
+    page_size = page_size or SERVER_PAGE_SIZE
+    marker = None
+    while True:
+        servers = client.servers.list(
+            search_opts=search_opts, marker=marker, limit=page_size
+        )
+        yield from servers
+        if len(servers) < page_size:
+            return
+        marker = servers[-1].id
+
+
+class Command(mixins.ApiMetricsMixin, mixins.ProfileMixin, BaseCommand):
     help = "Count GPU instances."
 
     def add_arguments(self, parser):
         parser.add_argument(
-            "--resource", type=str, required=True, help="Name of OpenStack Resource."
+            "--resource",
+            type=str,
+            required=True,
+            help="Name of OpenStack or OpenShift Resource.",
         )
         parser.add_argument(
             "--flavor",
             type=str,
-            required=True,
             action="append",
-            help="Flavor of GPU quota instances in the form <flavor name>=<quota used by 1 instance>.",
+            help="Flavor of GPU quota instances in the form <flavor name>=<quota used by 1 instance>."
+            " Required for OpenStack resources.",
         )
+        parser.add_argument(
+            "--format",
+            choices=["text", "json", "csv"],
+            default="text",
+            help="Output format. json and csv write the usage of every project to stdout.",
+        )
+
+    @staticmethod
+    def get_active_allocations(resource):
+        return Allocation.objects.filter(
+            resources__in=[resource],
+            status=AllocationStatusChoice.objects.get(name="Active"),
+        ).select_related("project")
+
+    @staticmethod
+    def get_project_id_to_allocation(allocations):
+        project_ids = AllocationAttribute.objects.filter(
+            allocation=OuterRef("pk"),
+            allocation_attribute_type__name=attributes.ALLOCATION_PROJECT_ID,
+        ).values("value")[:1]
+        return {
+            x.cloud_project_id: x
+            for x in allocations.annotate(cloud_project_id=Subquery(project_ids))
+            if x.cloud_project_id
+        }
+
+    @staticmethod
+    def get_allowed_quotas(allocations, quota_attributes):
+        """Returns {(allocation pk, attribute name): value} with a single query."""
+        allowed = AllocationAttribute.objects.filter(
+            allocation_id__in=[x.pk for x in allocations],
+            allocation_attribute_type__name__in=quota_attributes,
+        ).values_list("allocation_id", "allocation_attribute_type__name", "value")
+        return {
+            (allocation_id, attr): int(value) for allocation_id, attr, value in allowed
+        }
 
     def handle(self, *args, **options):
-        resource = Resource.objects.get(
-            resource_type=ResourceType.objects.get(name="OpenStack"),
+        resource = Resource.objects.select_related("resource_type").get(
+            resource_type__name__in=[
+                "OpenStack",
+                "OpenShift",
+                "OpenShift Virtualization",
+            ],
             name=options["resource"],
         )
 
+        if resource.resource_type.name == "OpenStack":
+            usage = self.handle_openstack(resource, options)
+        else:
+            usage = self.handle_openshift(resource)
+
+        if options["format"] == "json":
+            self.stdout.write(json.dumps(usage, indent=2))
+        elif options["format"] == "csv":
+            writer = csv.DictWriter(
+                self.stdout, fieldnames=USAGE_FIELDS, lineterminator="\n"
+            )
+            writer.writeheader()
+            writer.writerows(usage)
+        else:
+            self.log_usage(resource, usage)
+
+    @staticmethod
+    def get_usage(project_id, allocation, quota, used, allowed):
+        return {
+            "project_id": project_id,
+            "allocation_id": allocation.pk if allocation else None,
+            "project": allocation.project.title if allocation else None,
+            "quota": quota,
+            "used": used,
+            "allowed": allowed,
+        }
+
+    @staticmethod
+    def log_usage(resource, usage):
+        over_quota = 0
+        for x in usage:
+            if x["allocation_id"] is None:
+                msg = (
+                    f"No active allocation found in ColdFront for project"
+                    f' {x["project_id"]} using {x["used"]} of "{x["quota"]}".'
+                )
+                logger.error(msg)
+            elif x["used"] > x["allowed"]:
+                over_quota += 1
+                msg = (
+                    f'Allocation ID {x["allocation_id"]} of project "{x["project"]}"'
+                    f' is using {x["used"]} of "{x["quota"]}". (Allowed {x["allowed"]}).'
+                )
+                logger.warning(msg)
+        logger.info(f"{over_quota} GPU quotas exceeded on {resource.name}.")
+
+    def handle_openstack(self, resource, options):
+        if not options["flavor"]:
+            logger.critical("At least one --flavor is required for OpenStack!")
+            sys.exit(1)
+
         session = openstack.get_session_for_resource(resource)
         client = novaclient.Client(session=session, version=2)
 
@@ -61,45 +195,81 @@ class Command(BaseCommand):
 
         # Find all active OpenStack projects and create a
         # dictionary with the project id
-        allocations = Allocation.objects.filter(
-            resources__in=[resource],
-            status=AllocationStatusChoice.objects.get(name="Active"),
+        project_id_to_allocation = self.get_project_id_to_allocation(
+            self.get_active_allocations(resource)
+        )
+        allowed_quotas = self.get_allowed_quotas(
+            project_id_to_allocation.values(), [attributes.QUOTA_GPU]
         )
-        project_id_to_allocation = {
-            x.get_attribute(attributes.ALLOCATION_PROJECT_ID): x for x in allocations
-        }
-        count_per_project = dict()
 
         # There's likely less flavors than projects, so we query instances
-        # by flavor.
-        for flavor, value in flavors:
-            gpu_servers = client.servers.list(
-                search_opts={
-                    "all_tenants": True,
-                    "flavor": flavor.id,
-                    "status": "Active",
-                }
-            )
-            for s in gpu_servers:
-                count_per_project.setdefault(s.tenant_id, 0)
-                count_per_project[s.tenant_id] += value
+        # by flavor, with the queries for all flavors running concurrently.
+        def count_flavor(flavor_and_value):
+            flavor, value = flavor_and_value
+            count = collections.Counter()
+            search_opts = {"all_tenants": True, "flavor": flavor.id, "status": "Active"}
+            for s in iter_servers(client, search_opts):
+                count[s.tenant_id] += value
+            return count
+
+        count_per_project = collections.Counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(flavors)) as pool:
+            for count in pool.map(count_flavor, flavors):
+                count_per_project.update(count)
 
         # Go through gpu counts and compare with quota attributes
+        usage = []
         for project_id, active_gpu_count in count_per_project.items():
-            try:
-                allocation = project_id_to_allocation[project_id]
-            except KeyError:
-                msg = (
-                    f"No active allocation found in ColdFront for project"
-                    f" {project_id} containing {active_gpu_count} GPU instances."
+            allocation = project_id_to_allocation.get(project_id)
+            allowed = (
+                allowed_quotas.get((allocation.pk, attributes.QUOTA_GPU), 0)
+                if allocation
+                else None
+            )
+            usage.append(
+                self.get_usage(
+                    project_id,
+                    allocation,
+                    attributes.QUOTA_GPU,
+                    active_gpu_count,
+                    allowed,
                 )
-                logger.error(msg)
-                continue
+            )
+        return usage
 
-            allowed = allocation.get_attribute(attributes.QUOTA_GPU)
-            if active_gpu_count > allowed:
-                msg = (
-                    f'Allocation ID {allocation.pk} of project "{allocation.project.title}"'
-                    f" is using {active_gpu_count} GPU instances. (Allowed {allowed})."
+    def handle_openshift(self, resource):
+        allocator = openshift.OpenShiftResourceAllocator(resource, None)
+
+        # Map the cluster-side quota label of each GPU quota to its attribute
+        gpu_quotas = {
+            quotaspec.quota_label: attr
+            for attr, quotaspec in allocator.resource_quotaspecs.root.items()
+            if attr in OPENSHIFT_GPU_QUOTA_ATTRIBUTES
+        }
+        if not gpu_quotas:
+            logger.critical(f"No GPU quotas defined for resource {resource.name}!")
+            sys.exit(1)
+
+        project_id_to_allocation = self.get_project_id_to_allocation(
+            self.get_active_allocations(resource)
+        )
+        allowed_quotas = self.get_allowed_quotas(
+            project_id_to_allocation.values(), gpu_quotas.values()
+        )
+
+        usage = []
+        for namespace, used in allocator.get_resource_quota_usage().items():
+            allocation = project_id_to_allocation.get(namespace)
+            for label, attr in gpu_quotas.items():
+                active_gpu_count = openshift.parse_quota_value(used.get(label), attr)
+                if not active_gpu_count:
+                    continue
+                allowed = (
+                    allowed_quotas.get((allocation.pk, attr), 0) if allocation else None
                 )
-                logger.warning(msg)
+                usage.append(
+                    self.get_usage(
+                        namespace, allocation, attr, active_gpu_count, allowed
+                    )
+                )
+        return usage
@@ -5,22 +5,24 @@ import functools
 import logging
 import os
 import tempfile
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
 from coldfront_plugin_cloud import attributes
 from coldfront.core.utils.common import import_from_settings
 from coldfront_plugin_cloud.models import usage_models
 from coldfront_plugin_cloud.models.usage_models import UsageInfo, validate_date_str
-from coldfront_plugin_cloud import utils
+from coldfront_plugin_cloud import profiling, utils
+from coldfront_plugin_cloud.management import mixins
 
-import boto3
 from django.core.management.base import BaseCommand
 from coldfront.core.resource.models import Resource
 from coldfront.core.allocation.models import Allocation
 from coldfront.core.utils import mail
-import pandas
-import pyarrow
-from pandas.core.groupby.generic import DataFrameGroupBy
+
+# boto3, pandas and pyarrow take a while to import, so they are only imported
+# when an invoice is fetched rather than whenever commands are loaded.
+if TYPE_CHECKING:
+    from pandas.core.groupby.generic import DataFrameGroupBy
 
 
 logging.basicConfig(level=logging.INFO)
@@ -70,7 +72,7 @@ class TotalByDate(object):
         return f"{self.date}: {self.total} USD"
 
 
-class Command(BaseCommand):
+class Command(mixins.ProfileMixin, mixins.DebugSqlMixin, BaseCommand):
     help = "Fetch daily billable usage."
 
     @property
@@ -179,6 +181,8 @@ class Command(BaseCommand):
                 " S3_INVOICING_SECRET_ACCESS_KEY environment variables."
             )
 
+        import boto3
+
         s3 = boto3.client(
             "s3",
             endpoint_url=S3_ENDPOINT,
@@ -189,7 +193,10 @@ class Command(BaseCommand):
 
     @staticmethod
     @functools.cache
-    def load_csv(location) -> DataFrameGroupBy:
+    def load_csv(location) -> "DataFrameGroupBy":
+        import pandas
+        import pyarrow
+
         df = pandas.read_csv(
             location,
             engine="pyarrow",
@@ -199,7 +206,7 @@ class Command(BaseCommand):
         return df.groupby(INVOICE_COLUMN_ALLOCATION_ID)
 
     @functools.cache
-    def load_service_invoice(self, resource: str, date_str: str) -> DataFrameGroupBy:
+    def load_service_invoice(self, resource: str, date_str: str) -> "DataFrameGroupBy":
         """Fetches the dataframe of an invoice from S3."""
         if resource in RESOURCE_NAME_TO_FILE:
             resource = RESOURCE_NAME_TO_FILE[resource]
@@ -209,8 +216,9 @@ class Command(BaseCommand):
             filename = os.path.basename(key)
             download_location = os.path.join(tmpdir, filename)
             logger.info(f"Downloading invoice {key} to {download_location}.")
-            self.s3_client.download_file(S3_BUCKET, key, download_location)
-            return self.load_csv(download_location)
+            with profiling.phase(profiling.IO):
+                self.s3_client.download_file(S3_BUCKET, key, download_location)
+                return self.load_csv(download_location)
 
     def get_allocation_usage(
         self, resource: str, date_str: str, allocation_id
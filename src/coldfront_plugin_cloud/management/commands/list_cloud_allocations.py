@@ -1,20 +1,44 @@
 import sys
 import csv
+import itertools
 import json
 import logging
 
 from django.core.management.base import BaseCommand
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Collate
 
 from coldfront_plugin_cloud import attributes
+from coldfront_plugin_cloud.management import mixins
 from coldfront.core.resource.models import Resource, ResourceType
-from coldfront.core.allocation.models import Allocation, AllocationStatusChoice
+from coldfront.core.allocation.models import (
+    Allocation,
+    AllocationAttribute,
+    AllocationStatusChoice,
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+CHUNK_SIZE = 2000
 
-class Command(BaseCommand):
+# Collations ordering strings by code point, the way Python sorts them
+BINARY_COLLATIONS = {
+    "postgresql": "C",
+    "mysql": "utf8mb4_bin",
+    "sqlite": "BINARY",
+}
+
+
+def binary_order(field):
+    if collation := BINARY_COLLATIONS.get(connection.vendor):
+        return Collate(field, collation)
+    return F(field)
+
+
+class Command(mixins.ProfileMixin, BaseCommand):
     help = "Show cloud allocations (OpenShift and OpenStack)"
 
     def add_arguments(self, parser):
@@ -26,7 +50,10 @@ class Command(BaseCommand):
         )
         parser.add_argument("--project-id", help="limit scope to project id")
         parser.add_argument(
-            "--format", choices=["json", "csv"], default="json", help="output format"
+            "--format",
+            choices=["json", "ndjson", "csv"],
+            default="json",
+            help="output format, ndjson and csv are written as rows are read",
         )
 
     def get_cloud_attrs(self, cloud_type):
@@ -36,6 +63,18 @@ class Command(BaseCommand):
         return attrs
 
     def get_allocations(self, cloud_type, project_id=None):
+        return list(self.iter_allocations(cloud_type, project_id=project_id))
+
+    def iter_allocations(self, cloud_type, project_id=None):
+        """Yields a row for each active allocation of cloud_type.
+
+        Projects, PIs and all quota attributes are fetched by the same query
+        and rows are read from the database in chunks, so the number of
+        queries and the memory used do not grow with the number of
+        allocations. Rows are ordered by PI email, project ID, project title
+        and allocation ID, comparing strings the way Python does rather than
+        by the collation of the database.
+        """
         try:
             resources = Resource.objects.filter(
                 resource_type=ResourceType.objects.get(
@@ -44,47 +83,62 @@ class Command(BaseCommand):
             )
         except ObjectDoesNotExist:
             logger.error(f"{cloud_type} resource type does not exist")
-            return 1
+            return
 
         filter_kwargs = {}
 
         if project_id:
             filter_kwargs["project_id"] = project_id
 
-        allocations = Allocation.objects.filter(
-            resources__in=resources,
-            status=AllocationStatusChoice.objects.get(name="Active"),
-            **filter_kwargs,
-        )
-
-        cloud_allocations = []
-
         cloud_attrs = self.get_cloud_attrs(cloud_type)
+        # Pivot the quota attributes into one column per attribute.
+        attr_columns = {
+            f"cloud_attr_{i}": Subquery(
+                AllocationAttribute.objects.filter(
+                    allocation=OuterRef("pk"),
+                    allocation_attribute_type__name=attr.name,
+                ).values("value")[:1]
+            )
+            for i, attr in enumerate(cloud_attrs)
+        }
+
+        allocations = (
+            Allocation.objects.filter(
+                resources__in=resources,
+                status=AllocationStatusChoice.objects.get(name="Active"),
+                **filter_kwargs,
+            )
+            .select_related("project__pi")
+            .annotate(**attr_columns)
+            .order_by(
+                binary_order("project__pi__email"),
+                "project_id",
+                binary_order("project__title"),
+                "id",
+            )
+        )
 
-        for allocation in allocations:
-            alloc_info = []
-            project_id = allocation.project_id
-            project_title = allocation.project.title
-            allocation.project.description
-            pi_email = allocation.project.pi.email
+        for allocation in allocations.iterator(chunk_size=CHUNK_SIZE):
             alloc_id = allocation.id
             alloc_attrs = []
-            for attr in cloud_attrs:
+            for column, attr in zip(attr_columns, cloud_attrs):
                 try:
-                    alloc_attrs.append(float(allocation.get_attribute(attr.name)))
+                    alloc_attrs.append(float(getattr(allocation, column)))
                 except TypeError:
                     logger.debug(
                         f"!!! TYPE ERROR FOR ATTR {attr} (ALLOCATION: {alloc_id})"
                     )
                     alloc_attrs.append(0)
                     continue
-            alloc_info = [pi_email, cloud_type, project_id, project_title, alloc_id]
+            alloc_info = [
+                allocation.project.pi.email,
+                cloud_type,
+                allocation.project_id,
+                allocation.project.title,
+                alloc_id,
+            ]
             alloc_info.extend(alloc_attrs)
-            cloud_allocations.append(alloc_info)
-
-        cloud_allocations.sort(key=lambda x: x[0:5])
-
-        return cloud_allocations
+            yield alloc_info
 
     def render_csv(self, allocations, cloud_type):
         headers = ["pi_email", "cloud_type", "project_id", "project_title", "alloc_id"]
@@ -92,11 +146,16 @@ class Command(BaseCommand):
             i.name.replace(" ", "_") for i in self.get_cloud_attrs(cloud_type)
         ]
         f = csv.writer(sys.stdout)
-        allocations.insert(0, headers)
-        f.writerows(allocations)
+        f.writerow(headers)
+        for allocation in allocations:
+            f.writerow(allocation)
 
     def render_json(self, allocations):
-        print(json.dumps(allocations, indent=4))
+        print(json.dumps(list(allocations), indent=4))
+
+    def render_ndjson(self, allocations):
+        for allocation in allocations:
+            sys.stdout.write(json.dumps(allocation) + "\n")
 
     def handle(self, *args, **options):
         fmt = options["format"]
@@ -107,15 +166,17 @@ class Command(BaseCommand):
             logger.error("csv output requires a single cloud type (ie not all)")
             exit(1)
 
-        allocations = []
-
         if cloud_type != "all":
-            allocations = self.get_allocations(cloud_type, project_id=project_id)
+            allocations = self.iter_allocations(cloud_type, project_id=project_id)
         else:
-            allocations = self.get_allocations("OpenStack", project_id=project_id)
-            allocations.extend(self.get_allocations("OpenShift", project_id=project_id))
+            allocations = itertools.chain(
+                self.iter_allocations("OpenStack", project_id=project_id),
+                self.iter_allocations("OpenShift", project_id=project_id),
+            )
 
         if fmt == "json":
             self.render_json(allocations)
+        elif fmt == "ndjson":
+            self.render_ndjson(allocations)
         elif fmt == "csv":
             self.render_csv(allocations, cloud_type)
@@ -1,24 +1,77 @@
+import argparse
+import json
 import logging
+import os
+import time
+import uuid
+import zlib
 
 from coldfront_plugin_cloud import attributes
-from coldfront_plugin_cloud import utils
 from coldfront_plugin_cloud import tasks
+from coldfront_plugin_cloud.management import mixins
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django_q.tasks import async_task, count_group, fetch_group
 from coldfront.core.resource.models import Resource
 from coldfront.core.allocation.models import (
     Allocation,
+    AllocationAttribute,
+    AllocationUser,
 )
-from keystoneauth1.exceptions import http
-from kubernetes.dynamic import exceptions as k8s_exceptions
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-STATES_TO_VALIDATE = ["Active", "Active (Needs Renewal)"]
+STATES_TO_VALIDATE = tasks.STATES_TO_VALIDATE
 
+FAN_OUT_POLL_SECONDS = 5
 
-class Command(BaseCommand):
+
+def parse_shard(value):
+    try:
+        index, count = (int(x) for x in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard {value} is not in the form i/N.")
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Shard {value} must have 0 <= i < N.")
+    return index, count
+
+
+def get_shard(allocation_pk, count):
+    """Returns the shard of an allocation, stable across runs and hosts."""
+    return zlib.crc32(str(allocation_pk).encode()) % count
+
+
+def get_coldfront_watermarks(allocations):
+    """Returns the time of the latest change to each allocation in ColdFront.
+
+    Changes to an allocation, its attributes and its users are all recorded
+    in their history tables, so this takes one aggregate query per table.
+    """
+    watermarks = {}
+    allocation_pks = allocations.values("pk")
+    for history, field in [
+        (Allocation.history, "id"),
+        (AllocationAttribute.history, "allocation_id"),
+        (AllocationUser.history, "allocation_id"),
+    ]:
+        latest_changes = (
+            history.filter(**{f"{field}__in": allocation_pks})
+            .order_by()
+            .values(field)
+            .annotate(latest=Max("history_date"))
+            .values_list(field, "latest")
+        )
+        for pk, latest in latest_changes:
+            watermarks[pk] = max(watermarks.get(pk, latest), latest)
+
+    return {pk: latest.isoformat() for pk, latest in watermarks.items()}
+
+
+class Command(
+    mixins.ApiMetricsMixin, mixins.ProfileMixin, mixins.DebugSqlMixin, BaseCommand
+):
     help = "Validates quotas and users in resource allocations."
 
     PLUGIN_RESOURCE_NAMES = [
@@ -34,50 +87,190 @@ class Command(BaseCommand):
             action="store_true",
             help="Apply expected state if validation fails.",
         )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only validate allocations that changed since the last incremental"
+            " run, plus a rotating slice of the remaining ones.",
+        )
+        parser.add_argument(
+            "--state-file",
+            type=str,
+            default=os.getenv("VALIDATE_ALLOCATIONS_STATE_FILE"),
+            help="File where incremental runs store what they have validated"
+            " (default: $VALIDATE_ALLOCATIONS_STATE_FILE).",
+        )
+        parser.add_argument(
+            "--full-coverage-runs",
+            type=int,
+            default=7,
+            help="Number of incremental runs within which every allocation is"
+            " validated at least once, changed or not (default: 7).",
+        )
+        parser.add_argument(
+            "--shard",
+            type=parse_shard,
+            help="Only validate the allocations of shard i out of N, given as i/N"
+            " with 0 <= i < N. Incremental runs of each shard need their own"
+            " --state-file.",
+        )
+        parser.add_argument(
+            "--fan-out",
+            action="store_true",
+            help="Enqueue the validations as Django-Q tasks and wait for their"
+            " results instead of validating in this process.",
+        )
+        parser.add_argument(
+            "--fan-out-chunk-size",
+            type=int,
+            default=10,
+            help="Number of allocations validated by each task (default: 10).",
+        )
+        parser.add_argument(
+            "--fan-out-timeout",
+            type=int,
+            default=3600,
+            help="Seconds to wait for the tasks to finish (default: 3600).",
+        )
+
+    @staticmethod
+    def load_state(state_file):
+        try:
+            with open(state_file) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"run": 0, "allocations": {}}
+
+    @staticmethod
+    def save_state(state_file, state):
+        tmp_file = f"{state_file}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_file, state_file)
+
+    def fan_out(self, allocation_pks, apply, chunk_size, timeout):
+        """Validates allocations with one Django-Q task per chunk, waiting up
+        to timeout seconds for all of them to finish.
 
-    def check_institution_specific_code(self, allocation, apply):
-        attr = attributes.ALLOCATION_INSTITUTION_SPECIFIC_CODE
-        isc = allocation.get_attribute(attr)
-        if not isc:
-            alloc_str = f'{allocation.pk} of project "{allocation.project.title}"'
-            msg = f'Attribute "{attr}" missing on allocation {alloc_str}'
-            logger.warning(msg)
-            if apply:
-                utils.set_attribute_on_allocation(allocation, attr, "N/A")
-                logger.warning(f'Attribute "{attr}" added to allocation {alloc_str}')
+        Returns {allocation pk: validated} for the tasks that finished."""
+        group = f"validate_allocations-{uuid.uuid4().hex}"
+        chunks = [
+            allocation_pks[i : i + chunk_size]
+            for i in range(0, len(allocation_pks), chunk_size)
+        ]
+        for chunk in chunks:
+            async_task(tasks.validate_allocations, chunk, apply, group=group)
+        logger.info(f"Enqueued {len(chunks)} validation tasks in group {group}.")
+
+        # Counts failed tasks too, failures=True would count only those
+        deadline = time.monotonic() + timeout
+        while count_group(group) < len(chunks):
+            if time.monotonic() > deadline:
+                break
+            time.sleep(FAN_OUT_POLL_SECONDS)
+
+        results = {}
+        failed_tasks = 0
+        finished_tasks = fetch_group(group, failures=True) or []
+        for task in finished_tasks:
+            if task.success:
+                results.update(task.result)
+            else:
+                failed_tasks += 1
+                logger.error(f"Validation task {task.name} failed: {task.result}")
+
+        logger.info(
+            f"Validated {sum(results.values())} of {len(allocation_pks)} allocations."
+            f" {len(results) - sum(results.values())} could not be validated,"
+            f" {failed_tasks} tasks failed and"
+            f" {len(chunks) - len(finished_tasks)} tasks did not finish"
+            f" within {timeout} seconds."
+        )
+        return results
 
     def handle(self, *args, **options):
+        incremental = options["incremental"]
+        if incremental:
+            if not options["state_file"]:
+                raise CommandError(
+                    "--incremental requires --state-file or"
+                    " VALIDATE_ALLOCATIONS_STATE_FILE to be set."
+                )
+            state_file = os.path.abspath(options["state_file"])
+            logger.info(f"Incremental validation state is kept in {state_file}.")
+            state = self.load_state(state_file)
+            runs = options["full_coverage_runs"]
+            # Project versions of each coldfront resource, keyed by its pk
+            project_versions = {}
+        shard = options["shard"]
+        fan_out = options["fan_out"]
+        # Watermarks of the allocations enqueued for validation, by their pk
+        fanned_out = {}
+
         for resource_name in self.PLUGIN_RESOURCE_NAMES:
             resource = Resource.objects.filter(resource_type__name=resource_name)
             allocations = Allocation.objects.filter(
                 resources__in=resource,
                 status__name__in=STATES_TO_VALIDATE,
             )
+            if incremental:
+                coldfront_watermarks = get_coldfront_watermarks(allocations)
 
             for allocation in allocations:
-                allocator = tasks.find_allocator(allocation)
-                logger.debug(
-                    f"Starting resource validation for {allocator.allocation_str}."
-                )
-                self.check_institution_specific_code(allocation, options["apply"])
-
-                project_id = allocation.get_attribute(attributes.ALLOCATION_PROJECT_ID)
-
-                # Check project ID is set
-                if not project_id:
-                    logger.error(
-                        f"{allocator.allocation_str} is active but has no Project ID set."
-                    )
+                if shard and get_shard(allocation.pk, shard[1]) != shard[0]:
                     continue
 
-                # Check project exists in remote cluster
-                try:
-                    allocator.get_project(project_id)
-                except (http.NotFound, k8s_exceptions.NotFoundError):
-                    logger.error(
-                        f"{allocator.allocation_str} has Project ID {project_id}. But"
-                        f" no project found in {resource_name}."
+                allocator = None
+                watermark = None
+                if incremental:
+                    allocator = tasks.find_allocator(allocation)
+                    if allocator.resource.pk not in project_versions:
+                        project_versions[allocator.resource.pk] = (
+                            allocator.get_project_versions()
+                        )
+                    project_id = allocation.get_attribute(
+                        attributes.ALLOCATION_PROJECT_ID
+                    )
+                    watermark = [
+                        coldfront_watermarks.get(allocation.pk),
+                        project_versions[allocator.resource.pk].get(project_id),
+                    ]
+                    unchanged = (
+                        state["allocations"].get(str(allocation.pk)) == watermark
                     )
+                    if unchanged and allocation.pk % runs != state["run"] % runs:
+                        logger.debug(
+                            f"Skipping {allocator.allocation_str}, unchanged since"
+                            " last validated."
+                        )
+                        continue
+
+                if fan_out:
+                    fanned_out[allocation.pk] = watermark
                     continue
 
-                allocator.set_project_configuration(project_id, apply=options["apply"])
+                validated = tasks.validate_project(
+                    allocator or tasks.find_allocator(allocation),
+                    allocation,
+                    apply=options["apply"],
+                )
+                if incremental and validated:
+                    state["allocations"][str(allocation.pk)] = watermark
+
+        if fan_out:
+            results = self.fan_out(
+                list(fanned_out),
+                options["apply"],
+                options["fan_out_chunk_size"],
+                options["fan_out_timeout"],
+            )
+            if incremental:
+                for allocation_pk, validated in results.items():
+                    if validated:
+                        state["allocations"][str(allocation_pk)] = fanned_out[
+                            allocation_pk
+                        ]
+
+        if incremental:
+            state["run"] += 1
+            self.save_state(state_file, state)
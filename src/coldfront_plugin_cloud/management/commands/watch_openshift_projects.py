@@ -0,0 +1,203 @@
+import hashlib
+import json
+import logging
+import queue
+import threading
+import time
+
+from coldfront_plugin_cloud import attributes
+from coldfront_plugin_cloud import openshift
+from coldfront_plugin_cloud import signals
+from coldfront_plugin_cloud import tasks
+from coldfront_plugin_cloud.management import mixins
+
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+from coldfront.core.resource.models import Resource
+from coldfront.core.allocation.models import Allocation, AllocationAttribute
+from kubernetes.client.rest import ApiException
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Events of the other kinds are only acted on when the fields validated in
+# them change, as the status of quotas is updated with every workload change.
+WATCHED_RESOURCES = [
+    (openshift.API_CORE, "Namespace", None),
+    *openshift.VERSIONED_KINDS,
+]
+PROJECT_LABEL_SELECTOR = "nerc.mghpcc.org/project=true"
+
+WATCH_TIMEOUT_SECONDS = 300
+RECONNECT_DELAY_SECONDS = 5
+# Minimum time between reloads of the namespace to allocation index
+INDEX_REFRESH_SECONDS = 60
+
+
+class Command(mixins.ApiMetricsMixin, BaseCommand):
+    help = (
+        "Watch the projects of an OpenShift resource and validate the allocation"
+        " of any project whose quotas, limit ranges, role bindings or namespace"
+        " change."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--resource",
+            type=str,
+            required=True,
+            help="Name of OpenShift Resource.",
+        )
+        parser.add_argument(
+            "--apply",
+            action="store_true",
+            help="Apply expected state if validation fails.",
+        )
+
+    def get_namespace_index(self):
+        """Returns {namespace: allocation pk} for allocations to validate."""
+        project_ids = AllocationAttribute.objects.filter(
+            allocation=OuterRef("pk"),
+            allocation_attribute_type__name=attributes.ALLOCATION_PROJECT_ID,
+        ).values("value")[:1]
+        allocations = (
+            Allocation.objects.filter(
+                resources=self.resource,
+                status__name__in=tasks.STATES_TO_VALIDATE,
+            )
+            .annotate(cloud_project_id=Subquery(project_ids))
+            .values_list("cloud_project_id", "pk")
+        )
+        return {project_id: pk for project_id, pk in allocations if project_id}
+
+    def get_allocation_pk(self, namespace):
+        if namespace not in self.namespace_index and (
+            time.monotonic() - self.index_loaded_at > INDEX_REFRESH_SECONDS
+        ):
+            self.namespace_index = self.get_namespace_index()
+            self.index_loaded_at = time.monotonic()
+        return self.namespace_index.get(namespace)
+
+    @staticmethod
+    def get_digest(obj, fields):
+        values = [obj.get(field) for field in fields]
+        return hashlib.sha256(json.dumps(values, sort_keys=True).encode()).hexdigest()
+
+    def watch(self, api_version, kind, fields=None):
+        """Watches kind across all namespaces until self.stopped is set,
+        queueing the namespace of events in the namespaces of allocations.
+        With fields, events that do not change those fields of the object
+        are skipped.
+
+        The watch resumes from the last resourceVersion seen after it times
+        out or the connection drops. If that version has expired, the
+        objects are listed again to get a current one.
+        """
+        api = self.allocator.get_resource_api(api_version, kind)
+        kwargs = {}
+        if kind == "Namespace":
+            kwargs["label_selector"] = PROJECT_LABEL_SELECTOR
+
+        resource_version = None
+        while not self.stopped.is_set():
+            try:
+                if resource_version is None:
+                    res = api.get(limit=1, **kwargs).to_dict()
+                    resource_version = res["metadata"]["resourceVersion"]
+
+                for event in api.watch(
+                    resource_version=resource_version,
+                    timeout=WATCH_TIMEOUT_SECONDS,
+                    **kwargs,
+                ):
+                    metadata = event["raw_object"]["metadata"]
+                    resource_version = metadata["resourceVersion"]
+                    if event["type"] == "BOOKMARK":
+                        continue
+
+                    if kind == "Namespace":
+                        # Namespaces of new allocations are not indexed yet
+                        namespace = metadata["name"]
+                    else:
+                        namespace = metadata.get("namespace")
+                        if namespace not in self.namespace_index:
+                            continue
+
+                    if fields:
+                        key = (kind, namespace, metadata["name"])
+                        if event["type"] == "DELETED":
+                            self.digests.pop(key, None)
+                        else:
+                            digest = self.get_digest(event["raw_object"], fields)
+                            if self.digests.get(key) == digest:
+                                continue
+                            self.digests[key] = digest
+
+                    self.events.put(
+                        (namespace, f"{kind} {metadata['name']} {event['type']}")
+                    )
+            except ApiException as e:
+                if e.status != 410:
+                    logger.error(f"Watch on {kind} failed: {e}")
+                    self.stopped.wait(RECONNECT_DELAY_SECONDS)
+                    continue
+                logger.warning(
+                    f"Watch on {kind} expired at resourceVersion {resource_version},"
+                    f" listing again."
+                )
+                resource_version = None
+            except Exception as e:
+                logger.error(f"Watch on {kind} failed: {e}")
+                self.stopped.wait(RECONNECT_DELAY_SECONDS)
+
+    def reconcile(self, namespace, reason):
+        if not (allocation_pk := self.get_allocation_pk(namespace)):
+            return
+
+        logger.info(f"{reason} in {namespace}, validating allocation {allocation_pk}.")
+        if signals.is_async():
+            # Events tend to come in bursts, a single validation catches all.
+            signals.async_task_coalesced(
+                f"validate_allocation-{allocation_pk}",
+                tasks.validate_allocation,
+                allocation_pk,
+                self.apply,
+                allocation_pk=allocation_pk,
+            )
+        else:
+            # A failure to validate one allocation must not stop the watcher.
+            try:
+                tasks.validate_allocation(allocation_pk, apply=self.apply)
+            except Exception as e:
+                logger.error(f"Failed to validate allocation {allocation_pk}: {e}")
+
+    def handle(self, *args, **options):
+        self.resource = Resource.objects.get(
+            resource_type__name__in=["OpenShift", "OpenShift Virtualization"],
+            name=options["resource"],
+        )
+        self.allocator = openshift.OpenShiftResourceAllocator(self.resource, None)
+        self.apply = options["apply"]
+        self.namespace_index = self.get_namespace_index()
+        self.index_loaded_at = time.monotonic()
+        self.digests = {}
+        self.events = queue.Queue()
+        self.stopped = threading.Event()
+
+        watchers = [
+            threading.Thread(
+                target=self.watch,
+                args=(api_version, kind, fields),
+                name=kind,
+                daemon=True,
+            )
+            for api_version, kind, fields in WATCHED_RESOURCES
+        ]
+        for watcher in watchers:
+            watcher.start()
+
+        try:
+            while True:
+                self.reconcile(*self.events.get())
+        finally:
+            self.stopped.set()
@@ -0,0 +1,165 @@
+import collections
+import cProfile
+import os
+import pstats
+import re
+import time
+
+from django.db import connection
+
+from coldfront_plugin_cloud import metrics, profiling
+
+
+class ApiMetricsMixin:
+    """Adds --api-metrics to a management command.
+
+    When metrics are enabled, either by the option or the CLOUD_API_METRICS
+    env variable, a summary of the cloud API requests made is written to
+    stderr once the command ends. If CLOUD_API_METRICS_PROMETHEUS_FILE is set,
+    the metrics are also written there in the Prometheus text format.
+    """
+
+    def create_parser(self, prog_name, subcommand, **kwargs):
+        parser = super().create_parser(prog_name, subcommand, **kwargs)
+        parser.add_argument(
+            "--api-metrics",
+            action="store_true",
+            help="Summarize the cloud API requests made once done.",
+        )
+        return parser
+
+    def execute(self, *args, **options):
+        if options.get("api_metrics"):
+            metrics.enable()
+        if not (registry := metrics.get_registry()):
+            return super().execute(*args, **options)
+
+        try:
+            return super().execute(*args, **options)
+        finally:
+            self.stderr.write(registry.format_summary())
+            if path := os.getenv("CLOUD_API_METRICS_PROMETHEUS_FILE"):
+                registry.write_prometheus_file(path)
+
+
+# Literals and lists of placeholders, so that statements differing only by
+# their parameters are counted together
+_SQL_LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)"), "(...)"),
+]
+
+
+def normalize_sql(sql: str) -> str:
+    for pattern, replacement in _SQL_LITERALS:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+class QueryCounter:
+    """Database execute wrapper counting the queries made by statement,
+    ignoring their parameters.
+
+    Unlike CaptureQueriesContext, which keeps at most 9000 queries, it counts
+    every query made however long the command runs.
+    """
+
+    def __init__(self):
+        self.counts = collections.Counter()
+        self.seconds = collections.Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            statement = normalize_sql(sql)
+            self.counts[statement] += 1
+            self.seconds[statement] += time.perf_counter() - start
+
+    def __len__(self):
+        return self.counts.total()
+
+    def format_summary(self, top=10) -> str:
+        """Summarizes the statements that were repeated the most."""
+        lines = [f"{len(self)} SQL queries, {len(self.counts)} distinct statements."]
+        for statement, count in self.counts.most_common(top):
+            if count < 2:
+                break
+            lines.append(f"{count:6d} {self.seconds[statement]:8.3f}s  {statement}")
+        return "\n".join(lines) + "\n"
+
+
+class DebugSqlMixin:
+    """Adds --debug-sql to a management command.
+
+    The SQL queries made by the command are counted and, once it ends, the
+    statements repeated the most are written to stderr with how many times
+    they ran, ignoring their parameters.
+    """
+
+    def create_parser(self, prog_name, subcommand, **kwargs):
+        parser = super().create_parser(prog_name, subcommand, **kwargs)
+        parser.add_argument(
+            "--debug-sql",
+            action="store_true",
+            help="Print the SQL statements repeated the most once done.",
+        )
+        return parser
+
+    def execute(self, *args, **options):
+        if not options.get("debug_sql"):
+            return super().execute(*args, **options)
+
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            try:
+                return super().execute(*args, **options)
+            finally:
+                self.stderr.write(queries.format_summary())
+
+
+class ProfileMixin:
+    """Adds --profile to a management command.
+
+    The command is run under cProfile, and its stats are written to the given
+    file, in the pstats format or as collapsed stacks for flame graphs if the
+    file name ends with .collapsed or .folded. A breakdown of the time spent
+    in database queries, cloud API requests, other I/O and compute is written
+    to stderr once the command ends.
+
+    Only the main thread is profiled, though the phases also include time
+    spent by worker threads.
+    """
+
+    def create_parser(self, prog_name, subcommand, **kwargs):
+        parser = super().create_parser(prog_name, subcommand, **kwargs)
+        parser.add_argument(
+            "--profile",
+            metavar="FILE",
+            help="Profile the command, writing the stats to FILE.",
+        )
+        return parser
+
+    def execute(self, *args, **options):
+        if not (path := options.get("profile")):
+            return super().execute(*args, **options)
+
+        timings = profiling.enable()
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(profiling.db_execute_wrapper):
+                return profiler.runcall(super().execute, *args, **options)
+        finally:
+            seconds = time.perf_counter() - start
+            profiling.disable()
+
+            stats = pstats.Stats(profiler)
+            if path.endswith((".collapsed", ".folded")):
+                profiling.write_collapsed_stacks(stats, path)
+            else:
+                stats.dump_stats(path)
+            self.stderr.write(f"Profile written to {path}.")
+            self.stderr.write(timings.format_summary(seconds))
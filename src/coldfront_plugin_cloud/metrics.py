@@ -0,0 +1,292 @@
+import bisect
+import collections
+import contextvars
+import functools
+import logging
+import os
+import re
+import socket
+import threading
+import time
+import urllib.parse
+
+from coldfront_plugin_cloud import profiling
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the request latency histogram buckets, in seconds
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+PROMETHEUS_PREFIX = "coldfront_cloud_api"
+STATSD_PREFIX = "coldfront.cloud_api"
+
+# Path segments that identify an object rather than a kind of request
+# Ids, including the project ids of Swift account paths such as AUTH_<id>
+_ID_SEGMENT = re.compile(r"^(AUTH_)?(\d+|[0-9a-fA-F]{32}|[0-9a-fA-F-]{36})$")
+_STATSD_UNSAFE = re.compile(r"[^A-Za-z0-9_-]+")
+
+_registry = None
+_statsd = None
+_operation = contextvars.ContextVar("operation", default=None)
+
+
+class CallStats:
+    """Requests made for an operation on a resource."""
+
+    __slots__ = ("count", "seconds", "max_seconds", "buckets", "statuses", "bytes")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.statuses = collections.Counter()
+        self.bytes = 0
+
+    def add(self, seconds, status, nbytes):
+        self.count += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.statuses[status] += 1
+        self.bytes += nbytes
+
+    @property
+    def errors(self):
+        return sum(
+            count
+            for status, count in self.statuses.items()
+            if not (isinstance(status, int) and status < 400)
+        )
+
+    def quantile(self, q):
+        """Estimates a latency quantile as the upper bound of its bucket."""
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max_seconds)
+        return self.max_seconds
+
+
+class Registry:
+    def __init__(self):
+        self.stats = collections.defaultdict(CallStats)
+        self._lock = threading.Lock()
+
+    def record(self, resource, operation, seconds, status, nbytes):
+        with self._lock:
+            self.stats[(resource, operation)].add(seconds, status, nbytes)
+
+    def snapshot(self) -> dict[tuple[str, str], CallStats]:
+        with self._lock:
+            return dict(self.stats)
+
+    def format_summary(self) -> str:
+        rows = [
+            (
+                resource,
+                operation,
+                str(stats.count),
+                str(stats.errors),
+                f"{stats.seconds / stats.count * 1000:.1f}",
+                f"{stats.quantile(0.95) * 1000:.1f}",
+                f"{stats.max_seconds * 1000:.1f}",
+                f"{stats.bytes / 1024:.1f}",
+            )
+            for (resource, operation), stats in sorted(
+                self.snapshot().items(), key=lambda item: -item[1].seconds
+            )
+        ]
+        header = (
+            "Resource",
+            "Operation",
+            "Calls",
+            "Errors",
+            "Avg ms",
+            "p95 ms",
+            "Max ms",
+            "KiB",
+        )
+        widths = [max(len(row[i]) for row in [header] + rows) for i in range(8)]
+        return "\n".join(
+            "  ".join(
+                cell.ljust(width) if i < 2 else cell.rjust(width)
+                for i, (cell, width) in enumerate(zip(row, widths))
+            ).rstrip()
+            for row in [header] + rows
+        )
+
+    def format_prometheus(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format."""
+        requests = [
+            f"# TYPE {PROMETHEUS_PREFIX}_requests_total counter",
+        ]
+        latency = [
+            f"# TYPE {PROMETHEUS_PREFIX}_request_duration_seconds histogram",
+        ]
+        received = [
+            f"# TYPE {PROMETHEUS_PREFIX}_response_bytes_total counter",
+        ]
+        for (resource, operation), stats in sorted(self.snapshot().items()):
+            labels = (
+                f'resource="{_escape_label(resource)}",'
+                f'operation="{_escape_label(operation)}"'
+            )
+            for status, count in sorted(stats.statuses.items(), key=str):
+                requests.append(
+                    f"{PROMETHEUS_PREFIX}_requests_total"
+                    f'{{{labels},status="{status}"}} {count}'
+                )
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ["+Inf"], stats.buckets):
+                cumulative += count
+                latency.append(
+                    f"{PROMETHEUS_PREFIX}_request_duration_seconds_bucket"
+                    f'{{{labels},le="{bound}"}} {cumulative}'
+                )
+            latency.append(
+                f"{PROMETHEUS_PREFIX}_request_duration_seconds_sum{{{labels}}}"
+                f" {stats.seconds}"
+            )
+            latency.append(
+                f"{PROMETHEUS_PREFIX}_request_duration_seconds_count{{{labels}}}"
+                f" {stats.count}"
+            )
+            received.append(
+                f"{PROMETHEUS_PREFIX}_response_bytes_total{{{labels}}} {stats.bytes}"
+            )
+        return "\n".join(requests + latency + received) + "\n"
+
+    def write_prometheus_file(self, path):
+        """Writes the metrics for the node exporter textfile collector."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.format_prometheus())
+        os.replace(tmp_path, path)
+
+
+class StatsdClient:
+    """Sends a timing, status and size metric per request over UDP."""
+
+    def __init__(self, host, port):
+        self.address = (host, port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, resource, operation, seconds, status, nbytes):
+        name = (
+            f"{STATSD_PREFIX}.{_STATSD_UNSAFE.sub('_', resource)}"
+            f".{_STATSD_UNSAFE.sub('_', operation)}"
+        )
+        payload = (
+            f"{name}.requests:1|c\n"
+            f"{name}.status.{status}:1|c\n"
+            f"{name}.latency:{seconds * 1000:.3f}|ms\n"
+            f"{name}.bytes:{nbytes}|c"
+        )
+        try:
+            self.socket.sendto(payload.encode(), self.address)
+        except OSError as e:
+            logger.debug(f"Unable to send metrics to statsd: {e}")
+
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def enable():
+    """Starts recording cloud API requests, if not already.
+
+    Requests are also sent to statsd when CLOUD_API_METRICS_STATSD_HOST is set.
+    """
+    global _registry, _statsd
+    if _registry is not None:
+        return
+    if host := os.getenv("CLOUD_API_METRICS_STATSD_HOST"):
+        _statsd = StatsdClient(
+            host, int(os.getenv("CLOUD_API_METRICS_STATSD_PORT", 8125))
+        )
+    _registry = Registry()
+
+
+def disable():
+    global _registry, _statsd
+    _registry = _statsd = None
+
+
+def get_registry() -> Registry | None:
+    """Returns the registry of recorded requests, None if disabled."""
+    return _registry
+
+
+def instrumented(func):
+    """Labels the API requests made by func with its name."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _registry is None:
+            return func(*args, **kwargs)
+        token = _operation.set(func.__name__)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _operation.reset(token)
+
+    return wrapper
+
+
+def instrument_methods(prefix):
+    """Class decorator applying instrumented to methods starting with prefix."""
+
+    def decorator(cls):
+        for name, value in list(vars(cls).items()):
+            if name.startswith(prefix) and callable(value):
+                setattr(cls, name, instrumented(value))
+        return cls
+
+    return decorator
+
+
+def get_operation(method, url, service=None):
+    """Names a request by its method and path, with ids and namespaces
+    replaced by placeholders."""
+    segments = urllib.parse.urlsplit(url).path.strip("/").split("/")
+    for i, segment in enumerate(segments):
+        if i and segments[i - 1] == "namespaces":
+            segments[i] = "{namespace}"
+        elif _ID_SEGMENT.match(segment):
+            segments[i] = "{id}"
+    path = "/" + "/".join(segments)
+    return f"{service} {method} {path}" if service else f"{method} {path}"
+
+
+def measure(resource, method, url, func, describe, service=None):
+    """Calls func, recording how the request went when metrics are enabled,
+    and its duration when profiling is.
+
+    describe(result, exception) returns the status and size of the response.
+    """
+    if _registry is None and not profiling.is_enabled():
+        return func()
+
+    status, nbytes = "error", 0
+    start = time.perf_counter()
+    try:
+        result = func()
+        status, nbytes = describe(result, None)
+        return result
+    except Exception as e:
+        status, nbytes = describe(None, e)
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        profiling.record(profiling.BACKEND, seconds)
+        if _registry is not None:
+            operation = _operation.get() or get_operation(method, url, service)
+            _registry.record(resource, operation, seconds, status, nbytes)
+            if _statsd:
+                _statsd.send(resource, operation, seconds, status, nbytes)
+
+
+if os.getenv("CLOUD_API_METRICS", "").lower() in ("1", "true", "yes"):
+    enable()
@@ -1,17 +1,27 @@
 import functools
+import hashlib
 import json
 import logging
 import os
+import random
 import time
 import re
 import copy
 from collections import namedtuple
 
 import kubernetes
+import urllib3
 import kubernetes.dynamic.exceptions as kexc
 from openshift.dynamic import DynamicClient
 
-from coldfront_plugin_cloud import attributes, base, utils
+from coldfront_plugin_cloud import (
+    attributes,
+    base,
+    metrics,
+    ratelimit,
+    resilience,
+    utils,
+)
 
 
 logger = logging.getLogger(__name__)
@@ -21,6 +31,14 @@ API_PROJECT = "project.openshift.io/v1"
 API_USER = "user.openshift.io/v1"
 API_RBAC = "rbac.authorization.k8s.io/v1"
 API_CORE = "v1"
+
+# Kinds validated in each namespace, with the fields that are validated
+VERSIONED_KINDS = [
+    (API_CORE, "ResourceQuota", ["spec"]),
+    (API_CORE, "LimitRange", ["spec"]),
+    (API_RBAC, "RoleBinding", ["roleRef", "subjects"]),
+]
+
 IGNORED_ATTRIBUTES = [
     "resourceVersion",
     "creationTimestamp",
@@ -46,6 +64,10 @@ LIMITRANGE_DEFAULTS = [
 
 OPENSHIFT_ROLES = ["admin", "edit", "view"]
 
+# Retries of conflicting RoleBinding updates, with jittered exponential backoff
+ROLEBINDING_UPDATE_ATTEMPTS = 8
+ROLEBINDING_RETRY_BACKOFF = 0.05
+
 
 def clean_openshift_metadata(obj):
     if "metadata" in obj:
@@ -155,11 +177,68 @@ class NotFound(ApiException):
     pass
 
 
+def classify_response(result, exception) -> resilience.Outcome:
+    if exception is None:
+        return resilience.outcome_for_status(result.status)
+    if isinstance(exception, kubernetes.client.exceptions.ApiException):
+        return resilience.outcome_for_status(exception.status)
+    if isinstance(exception, urllib3.exceptions.HTTPError):
+        reason = getattr(exception, "reason", None) or exception
+        sent = not isinstance(
+            reason,
+            (
+                urllib3.exceptions.NewConnectionError,
+                urllib3.exceptions.ConnectTimeoutError,
+            ),
+        )
+        return resilience.Outcome(retriable=True, sent=sent, unhealthy=True)
+    return resilience.SUCCESS
+
+
+def discard_response(result):
+    # Responses are not preloaded, read it for the connection to be reused.
+    result.read()
+
+
+def describe_response(result, exception):
+    if exception is None:
+        return result.status, int(result.getheader("Content-Length") or 0)
+    return getattr(exception, "status", None) or type(exception).__name__, 0
+
+
+class ResourceApiClient(kubernetes.client.ApiClient):
+    """ApiClient sending every request through the rate limiter and retry
+    policy of the resource it talks to, and recording it in metrics."""
+
+    def __init__(self, configuration, rate_limiter, retry_policy=None, name=""):
+        super().__init__(configuration=configuration)
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy or resilience.RetryPolicy(attempts=1)
+        self.name = name
+
+    def call_api(self, method, url, *args, **kwargs):
+        def request():
+            return super(ResourceApiClient, self).call_api(method, url, *args, **kwargs)
+
+        def attempt():
+            with self.rate_limiter:
+                return metrics.measure(
+                    self.name, method, url, request, describe_response
+                )
+
+        return self.retry_policy.call(
+            method, attempt, classify_response, discard_response
+        )
+
+
+@metrics.instrument_methods("_openshift_")
 class OpenShiftResourceAllocator(base.ResourceAllocator):
     resource_type = "openshift"
 
     project_name_max_length = 45
 
+    project_not_found_errors = (kexc.NotFoundError,)
+
     def __init__(self, resource, allocation):
         super().__init__(resource, allocation)
         self.safe_resource_name = utils.env_safe_name(resource.name)
@@ -187,7 +266,12 @@ class OpenShiftResourceAllocator(base.ResourceAllocator):
         else:
             k8_config.verify_ssl = True
 
-        k8s_client = kubernetes.client.ApiClient(configuration=k8_config)
+        k8s_client = ResourceApiClient(
+            k8_config,
+            ratelimit.get_rate_limiter("OPENSHIFT", self.resource),
+            resilience.get_retry_policy("OPENSHIFT", self.resource),
+            self.resource.name,
+        )
         return DynamicClient(k8s_client)
 
     @staticmethod
@@ -207,10 +291,11 @@ class OpenShiftResourceAllocator(base.ResourceAllocator):
         return api
 
     def set_project_configuration(self, project_id, apply=True):
-        self.set_users(project_id, apply)
-        self.set_limitranges(project_id, apply)
-        self.set_project_labels(project_id, apply)
-        self.set_quota_config(project_id, apply)
+        failed_validation = self.set_users(project_id, apply)
+        failed_validation |= self.set_limitranges(project_id, apply)
+        failed_validation |= self.set_project_labels(project_id, apply)
+        failed_validation |= self.set_quota_config(project_id, apply)
+        return failed_validation
 
     def set_limitranges(self, project_id, apply=True):
         def _recreate_limitrange():
@@ -220,6 +305,7 @@ class OpenShiftResourceAllocator(base.ResourceAllocator):
             logger.info(f"Recreated LimitRanges for namespace {project_id}.")
 
         limits = self._openshift_get_limits(project_id).get("items", [])
+        failed_validation = len(limits) != 1
 
         if not limits:
             if apply:
@@ -238,14 +324,18 @@ class OpenShiftResourceAllocator(base.ResourceAllocator):
                 logger.info(
                     f"LimitRange for more than one object type found for namespace {project_id}."
                 )
+                failed_validation = True
                 _recreate_limitrange()
             elif differences := limit_ranges_diff(LIMITRANGE_DEFAULTS, actual_limits):
                 for difference in differences:
                     logger.info(
                         f"LimitRange for {project_id} differs {difference.key}: expected {difference.expected} but found {difference.actual}"
                     )
+                failed_validation = True
                 _recreate_limitrange()
 
+        return failed_validation
+
     def set_project_labels(self, project_id, apply=True):
         cloud_namespace_obj = self._openshift_get_namespace(project_id)
         cloud_namespace_obj_labels = cloud_namespace_obj["metadata"]["labels"]
@@ -263,6 +353,8 @@ class OpenShiftResourceAllocator(base.ResourceAllocator):
                 logger.warning(
                     f"Labels updated for Openshift project {project_id}: {', '.join(missing_or_incorrect_labels)}"
                 )
+            return True
+        return False
 
     def set_quota_config(self, project_id, apply=True):
         failed_validation = False
@@ -283,7 +375,8 @@ class OpenShiftResourceAllocator(base.ResourceAllocator):
                 logger.info(f"Quota for {project_id} was out of date. Reapplied!")
             except Exception as e:
                 logger.info(f"setting cluster-side quota failed: {e}")
-                return
+
+        return failed_validation
 
     def create_project(self, suggested_project_name):
         sanitized_project_name = utils.get_sanitized_project_name(
@@ -386,50 +479,105 @@ class OpenShiftResourceAllocator(base.ResourceAllocator):
 
     def assign_role_on_user(self, username, project_id):
         """Assign a role to a user in a project using direct OpenShift API calls"""
-        try:
-            # Try to get existing rolebindings with same name
-            # as the role name in project's namespace
-            rolebinding = self._openshift_get_rolebindings(
-                project_id, self.member_role_name
-            )
-
-            if not self._user_in_rolebinding(username, rolebinding):
-                # Add user to existing rolebinding
-                if "subjects" not in rolebinding:
-                    rolebinding["subjects"] = []
-                rolebinding["subjects"].append({"kind": "User", "name": username})
-                self._openshift_update_rolebindings(project_id, rolebinding)
-
-        except kexc.NotFoundError:
-            # Create new rolebinding if it doesn't exist
-            self._openshift_create_rolebindings(
-                project_id, username, self.member_role_name
-            )
-        except kexc.ConflictError:
-            # Role already exists, ignore
-            pass
+        self.assign_roles_bulk([username], project_id)
+
+    def assign_roles_bulk(self, usernames, project_id):
+        """Assign a role to users in a project with a single RoleBinding update"""
+        usernames = list(dict.fromkeys(usernames))
+        if not usernames:
+            return
+
+        def _add_missing_subjects(rolebinding):
+            new_subjects = [
+                {"kind": "User", "name": username}
+                for username in usernames
+                if not self._user_in_rolebinding(username, rolebinding)
+            ]
+            if not new_subjects:
+                return []
+            if not rolebinding["subjects"]:
+                # Note: JSON patch can't append to a list that doesn't exist
+                return [{"op": "add", "path": "/subjects", "value": new_subjects}]
+            return [
+                {"op": "add", "path": "/subjects/-", "value": subject}
+                for subject in new_subjects
+            ]
+
+        self._update_rolebinding_subjects(
+            project_id, _add_missing_subjects, create_usernames=usernames
+        )
 
     def remove_role_from_user(self, username, project_id):
         """Remove a role from a user in a project using direct OpenShift API calls"""
-        try:
-            rolebinding = self._openshift_get_rolebindings(
-                project_id, self.member_role_name
-            )
-
-            if "subjects" in rolebinding:
-                rolebinding["subjects"] = [
-                    subject
-                    for subject in rolebinding["subjects"]
-                    if not (
-                        subject.get("kind") == "User"
-                        and subject.get("name") == username
+        self.remove_roles_bulk([username], project_id)
+
+    def remove_roles_bulk(self, usernames, project_id):
+        """Remove a role from users in a project with a single RoleBinding update"""
+        usernames = set(usernames)
+
+        def _remove_subjects(rolebinding):
+            # Removing from the end keeps the indices of earlier subjects valid
+            return [
+                {"op": "remove", "path": f"/subjects/{index}"}
+                for index, subject in reversed(list(enumerate(rolebinding["subjects"])))
+                if subject.get("kind") == "User" and subject.get("name") in usernames
+            ]
+
+        self._update_rolebinding_subjects(project_id, _remove_subjects)
+
+    def _update_rolebinding_subjects(
+        self, project_id, get_operations, create_usernames=None
+    ):
+        """Update the subjects of the member RoleBinding of a project.
+
+        get_operations is called with the current RoleBinding and returns the
+        JSON patch operations to apply, or an empty list if there is nothing to
+        change. The patch is only accepted by the API server if the RoleBinding
+        was not modified since it was read, otherwise it is read again and the
+        operations recomputed after a jittered backoff. This allows tasks for
+        the same project to update the RoleBinding concurrently without
+        overwriting each other.
+
+        If the RoleBinding doesn't exist it is created with create_usernames
+        as subjects, or left alone if no usernames are given.
+        """
+        role = self.member_role_name
+        for attempt in range(ROLEBINDING_UPDATE_ATTEMPTS):
+            try:
+                rolebinding = self._openshift_get_rolebindings(project_id, role)
+                if operations := get_operations(rolebinding):
+                    self._openshift_patch_rolebindings(
+                        project_id,
+                        role,
+                        operations,
+                        rolebinding.get("metadata", {}).get("resourceVersion"),
+                    )
+                return
+            except kexc.NotFoundError:
+                if not create_usernames:
+                    # Rolebinding doesn't exist, nothing to remove
+                    return
+                try:
+                    # Create new rolebinding if it doesn't exist
+                    self._openshift_create_rolebindings(
+                        project_id, create_usernames, role
                     )
-                ]
-                self._openshift_update_rolebindings(project_id, rolebinding)
+                    return
+                except kexc.ConflictError:
+                    # Created concurrently by another task, patch it instead
+                    pass
+            except kexc.ConflictError:
+                logger.debug(
+                    f"RoleBinding {role} in {project_id} was modified concurrently,"
+                    f" retrying (attempt {attempt + 1}/{ROLEBINDING_UPDATE_ATTEMPTS})."
+                )
 
-        except kexc.NotFoundError:
-            # Rolebinding doesn't exist, nothing to remove
-            pass
+            time.sleep(random.uniform(0, ROLEBINDING_RETRY_BACKOFF * 2**attempt))
+
+        raise ApiException(
+            f"Unable to update RoleBinding {role} in {project_id} after"
+            f" {ROLEBINDING_UPDATE_ATTEMPTS} attempts due to concurrent updates."
+        )
 
     def _create_project(self, project_name, project_id):
         pi_username = self.allocation.project.pi.username
@@ -627,6 +775,59 @@ class OpenShiftResourceAllocator(base.ResourceAllocator):
 
         return res["items"]
 
+    def get_resource_quota_usage(self, page_size=500):
+        """Returns the used amounts of the resourcequotas of all namespaces.
+
+        Resourcequotas are read with a single paginated LIST across the
+        cluster rather than one request per namespace. The result maps a
+        namespace to the combined `status.used` of its resourcequotas.
+        """
+        usage = {}
+        for resourcequota in self._list_all(API_CORE, "ResourceQuota", page_size):
+            namespace = resourcequota["metadata"]["namespace"]
+            used = (resourcequota.get("status") or {}).get("used") or {}
+            usage.setdefault(namespace, {}).update(used)
+        return usage
+
+    def _list_all(self, api_version, kind, page_size):
+        """Yields every object of kind in the cluster, read with a single
+        paginated LIST."""
+        api = self.get_resource_api(api_version, kind)
+        continue_token = None
+        while True:
+            res = api.get(limit=page_size, _continue=continue_token).to_dict()
+            yield from res["items"]
+
+            if not (continue_token := res["metadata"].get("continue")):
+                return
+
+    def get_project_versions(self, page_size=500):
+        """Returns a version of every namespace in the cluster, changing
+        when the namespace or the objects validated in it do.
+
+        The objects are read with one paginated LIST per kind. They are
+        versioned by the fields that are validated rather than by their
+        resourceVersion, which for resourcequotas also changes with usage.
+        """
+        objects = {
+            namespace["metadata"]["name"]: [namespace["metadata"]["resourceVersion"]]
+            for namespace in self._list_all(API_CORE, "Namespace", page_size)
+        }
+        for api_version, kind, fields in VERSIONED_KINDS:
+            for obj in self._list_all(api_version, kind, page_size):
+                metadata = obj["metadata"]
+                if metadata["namespace"] in objects:
+                    objects[metadata["namespace"]].append(
+                        [kind, metadata["name"], *(obj.get(x) for x in fields)]
+                    )
+
+        return {
+            namespace: hashlib.sha256(
+                json.dumps(sorted(versions, key=json.dumps), sort_keys=True).encode()
+            ).hexdigest()
+            for namespace, versions in objects.items()
+        }
+
     def _wait_for_quota_to_settle(self, project_id, resource_quota):
         """Wait for quota on resourcequotas to settle.
 
@@ -673,10 +874,10 @@ class OpenShiftResourceAllocator(base.ResourceAllocator):
         )
 
     def _openshift_get_rolebindings(self, project_name, role):
+        # Note: metadata is not cleaned so the resourceVersion can be used as
+        # a precondition for updates.
         api = self.get_resource_api(API_RBAC, "RoleBinding")
-        result = clean_openshift_metadata(
-            api.get(namespace=project_name, name=role).to_dict()
-        )
+        result = api.get(namespace=project_name, name=role).to_dict()
 
         # Ensure subjects is a list
         if not result.get("subjects"):
@@ -684,21 +885,41 @@ class OpenShiftResourceAllocator(base.ResourceAllocator):
 
         return result
 
-    def _openshift_create_rolebindings(self, project_name, username, role):
+    def _openshift_create_rolebindings(self, project_name, usernames, role):
         api = self.get_resource_api(API_RBAC, "RoleBinding")
         payload = {
             "metadata": {"name": role, "namespace": project_name},
-            "subjects": [{"name": username, "kind": "User"}],
+            "subjects": [{"name": username, "kind": "User"} for username in usernames],
             "roleRef": {"name": role, "kind": "ClusterRole"},
         }
         return clean_openshift_metadata(
             api.create(body=payload, namespace=project_name).to_dict()
         )
 
-    def _openshift_update_rolebindings(self, project_name, rolebinding):
+    def _openshift_patch_rolebindings(
+        self, project_name, role, operations, resource_version=None
+    ):
+        """Apply JSON patch operations to a rolebinding.
+
+        If resource_version is given the API server rejects the patch with a
+        409 Conflict when the rolebinding has been modified since."""
+        if resource_version:
+            operations = [
+                {
+                    "op": "replace",
+                    "path": "/metadata/resourceVersion",
+                    "value": resource_version,
+                },
+                *operations,
+            ]
         api = self.get_resource_api(API_RBAC, "RoleBinding")
         return clean_openshift_metadata(
-            api.patch(body=rolebinding, namespace=project_name).to_dict()
+            api.patch(
+                body=operations,
+                name=role,
+                namespace=project_name,
+                content_type="application/json-patch+json",
+            ).to_dict()
         )
 
     def _openshift_list_rolebindings(self, project_name):
@@ -1,10 +1,15 @@
+import concurrent.futures
+import contextvars
 import hashlib
 import functools
 import logging
 import os
+import threading
 import urllib.parse
 
+import requests
 import swiftclient
+import urllib3
 from keystoneauth1.identity import v3
 from keystoneauth1 import session
 from keystoneauth1 import exceptions as ksa_exceptions
@@ -13,7 +18,14 @@ from cinderclient import client as cinderclient
 from neutronclient.v2_0 import client as neutronclient
 from novaclient import client as novaclient
 
-from coldfront_plugin_cloud import attributes, base, utils
+from coldfront_plugin_cloud import (
+    attributes,
+    base,
+    metrics,
+    ratelimit,
+    resilience,
+    utils,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +36,133 @@ COLDFRONT_RGW_SWIFT_INIT_USER = "coldfront-swift-init"
 
 OPENSTACK_OBJ_KEY = "x-account-meta-quota-bytes"
 
+# Keystone lookups are cached per resource. Users that are not found are
+# cached for a shorter time so they are picked up soon after being created
+# out of band.
+KEYSTONE_CACHE_TTL = 600
+KEYSTONE_NEGATIVE_CACHE_TTL = 30
+
+_role_id_cache = utils.TTLCache(ttl=KEYSTONE_CACHE_TTL)
+_user_cache = utils.TTLCache(ttl=KEYSTONE_CACHE_TTL, maxsize=10000)
+
+# Swift connections are pooled per resource and keyed by project
+SWIFT_CONNECTION_TTL = 300
+SWIFT_POOL_SIZE = 64
+# HTTP methods of the Swift account methods called
+SWIFT_ACCOUNT_METHODS = {"head_account": "HEAD", "post_account": "POST"}
+
+_swift_connection_pools = {}
+_swift_connection_pools_lock = threading.Lock()
+
+# Projects are tagged in Keystone once their RGW Swift account is initialized
+RGW_INITIALIZED_TAG = "coldfront-rgw-initialized"
+
+_rgw_initialized_projects = utils.TTLCache(ttl=24 * 60 * 60, maxsize=100000)
+
+# Set while a ResourceSession sends a request
+_sending = contextvars.ContextVar("sending", default=False)
+
+
+def classify_response(result, exception) -> resilience.Outcome:
+    if exception is None:
+        return resilience.outcome_for_status(result.status_code)
+    if isinstance(exception, ksa_exceptions.HttpError):
+        return resilience.outcome_for_status(exception.http_status)
+    if isinstance(exception, ksa_exceptions.ConnectionError):
+        return resilience.Outcome(
+            retriable=True, sent=not is_unsent(exception), unhealthy=True
+        )
+    return resilience.SUCCESS
+
+
+def classify_swift_response(result, exception) -> resilience.Outcome:
+    if isinstance(exception, swiftclient.exceptions.ClientException):
+        return resilience.outcome_for_status(exception.http_status)
+    if isinstance(exception, requests.exceptions.ConnectionError):
+        return resilience.Outcome(
+            retriable=True, sent=not is_unsent(exception), unhealthy=True
+        )
+    return resilience.SUCCESS
+
+
+def is_unsent(exception) -> bool:
+    """Whether a connection error happened before the request was sent, as
+    the host could not be resolved, refused the connection or didn't accept
+    it in time. Other errors, such as a connection reset, can happen after
+    the request reached the server."""
+    cause = exception
+    if isinstance(exception, ksa_exceptions.ConnectionError):
+        # keystoneauth raises its own exceptions while handling those of requests
+        cause = exception.__cause__ or exception.__context__
+    if isinstance(cause, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(cause, requests.exceptions.ConnectionError) and cause.args:
+        reason = getattr(cause.args[0], "reason", cause.args[0])
+        return isinstance(
+            reason,
+            (
+                urllib3.exceptions.NewConnectionError,
+                urllib3.exceptions.ConnectTimeoutError,
+            ),
+        )
+    return False
+
+
+def describe_response(result, exception):
+    if exception is None:
+        return result.status_code, int(result.headers.get("Content-Length") or 0)
+    return getattr(exception, "http_status", None) or type(exception).__name__, 0
+
+
+def describe_swift_response(result, exception):
+    if exception is None:
+        # swiftclient only returns the headers of successful responses
+        return 200, 0
+    return getattr(exception, "http_status", None) or type(exception).__name__, 0
+
+
+class ResourceSession(session.Session):
+    """Session sending every request through the rate limiter and retry
+    policy of the resource it talks to, and recording it in metrics."""
+
+    def __init__(self, auth, rate_limiter, retry_policy=None, name="", **kwargs):
+        super().__init__(auth, **kwargs)
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy or resilience.RetryPolicy(attempts=1)
+        self.name = name
+
+    def request(self, url, method, *args, **kwargs):
+        def request():
+            return super(ResourceSession, self).request(url, method, *args, **kwargs)
+
+        service = (kwargs.get("endpoint_filter") or {}).get("service_type")
+        return self.call(
+            method, url, request, describe_response, classify_response, service
+        )
+
+    def call(self, method, url, func, describe, classify, service=None):
+        """Calls func, sending a request to url, through the rate limiter,
+        retry policy and metrics of the session.
+
+        Clients that only use the session to authenticate, such as
+        swiftclient, send their other requests through this."""
+        if _sending.get():
+            # Requests made while sending another, such as the auth plugin
+            # fetching a token, are part of the attempt of that request.
+            return metrics.measure(self.name, method, url, func, describe, service)
+
+        def attempt():
+            with self.rate_limiter:
+                token = _sending.set(True)
+                try:
+                    return metrics.measure(
+                        self.name, method, url, func, describe, service
+                    )
+                finally:
+                    _sending.reset(token)
+
+        return self.retry_policy.call(method, attempt, classify)
+
 
 def get_session_for_resource_via_password(resource, username, password, project_id):
     auth_url = resource.get_attribute(attributes.RESOURCE_AUTH_URL)
@@ -35,8 +174,12 @@ def get_session_for_resource_via_password(resource, username, password, project_
         project_id=project_id,
         user_domain_name=user_domain,
     )
-    sesh = session.Session(
-        auth, verify=os.environ.get("FUNCTIONAL_TESTS", "") != "True"
+    sesh = ResourceSession(
+        auth,
+        ratelimit.get_rate_limiter("OPENSTACK", resource),
+        resilience.get_retry_policy("OPENSTACK", resource),
+        resource.name,
+        verify=os.environ.get("FUNCTIONAL_TESTS", "") != "True",
     )
     return sesh
 
@@ -60,16 +203,84 @@ def get_session_for_resource(resource):
             f"OPENSTACK_{var_name}_APPLICATION_CREDENTIAL_SECRET"
         ),
     )
-    return session.Session(
-        auth, verify=os.environ.get("FUNCTIONAL_TESTS", "") != "True"
+    return ResourceSession(
+        auth,
+        ratelimit.get_rate_limiter("OPENSTACK", resource),
+        resilience.get_retry_policy("OPENSTACK", resource),
+        resource.name,
+        verify=os.environ.get("FUNCTIONAL_TESTS", "") != "True",
+    )
+
+
+def create_swift_connection(sesh, project_id=None) -> swiftclient.Connection:
+    preauth_url = None
+    if project_id:
+        swift_endpoint = sesh.get_endpoint(
+            service_type="object-store",
+            interface="public",
+        )
+        preauth_url = swift_endpoint.replace(
+            sesh.get_project_id(),
+            project_id,
+        )
+    logger.debug(f"creating swift client: preauthurl={preauth_url}")
+    # Requests are retried by the retry policy of the session instead
+    return swiftclient.Connection(
+        session=sesh,
+        preauthurl=preauth_url,
+        retries=0,
     )
 
 
+def call_swift_account(connection: swiftclient.Connection, method, **kwargs):
+    """Calls a Swift account method of connection through its session.
+
+    swiftclient only uses the session for the token and endpoint, sending
+    requests with its own HTTP connection."""
+    func = functools.partial(getattr(connection, method), **kwargs)
+    if not isinstance(connection.session, ResourceSession):
+        return func()
+    return connection.session.call(
+        SWIFT_ACCOUNT_METHODS[method],
+        connection.url or "",
+        func,
+        describe_swift_response,
+        classify_swift_response,
+        "object-store",
+    )
+
+
+def get_swift_connection_pool(resource) -> utils.TTLCache:
+    """Returns the pool of Swift connections of a resource, keyed by project."""
+    with _swift_connection_pools_lock:
+        return _swift_connection_pools.setdefault(
+            resource.pk,
+            utils.TTLCache(ttl=SWIFT_CONNECTION_TTL, maxsize=SWIFT_POOL_SIZE),
+        )
+
+
+def clear_caches():
+    """Clears the Keystone lookups, RGW state and Swift connections cached
+    by resource.
+
+    They are keyed by the primary key of the resource, which is only reused
+    when resources are deleted, such as between tests."""
+    for cache in (_role_id_cache, _user_cache, _rgw_initialized_projects):
+        cache.clear()
+    with _swift_connection_pools_lock:
+        _swift_connection_pools.clear()
+
+
 class OpenStackResourceAllocator(base.ResourceAllocator):
     resource_type = "openstack"
 
     project_name_max_length = 64
 
+    project_not_found_errors = (ksa_exceptions.NotFound,)
+
+    # Maximum number of concurrent Keystone requests for bulk operations.
+    bulk_concurrency = 8
+
     @functools.cached_property
     def session(self) -> session.Session:
         return get_session_for_resource(self.resource)
@@ -78,6 +289,10 @@ class OpenStackResourceAllocator(base.ResourceAllocator):
     def identity(self) -> ks_client.Client:
         return ks_client.Client(session=self.session)
 
+    @functools.cached_property
+    def user_domain(self):
+        return self.resource.get_attribute(attributes.RESOURCE_USER_DOMAIN)
+
     @functools.cached_property
     def compute(self) -> novaclient.Client:
         return novaclient.Client(session=self.session, version=2)
@@ -90,44 +305,44 @@ class OpenStackResourceAllocator(base.ResourceAllocator):
     def network(self):
         return neutronclient.Client(session=self.session)
 
-    @functools.lru_cache()
     def object(self, project_id=None, session=None) -> swiftclient.Connection:
-        preauth_url = None
-        session = session or self.session
-        if project_id:
-            swift_endpoint = session.get_endpoint(
-                service_type="object-store",
-                interface="public",
-            )
-            preauth_url = swift_endpoint.replace(
-                session.get_project_id(),
-                project_id,
-            )
-        logger.debug(f"creating swift client: preauthurl={preauth_url}")
-        return swiftclient.Connection(
-            session=session,
-            preauthurl=preauth_url,
-        )
+        """Returns a Swift connection, scoped to project_id if given.
+
+        Connections using the allocator's session are pooled per resource
+        and project, so they are shared between allocators and expire after
+        SWIFT_CONNECTION_TTL seconds. Connections for another session are
+        not pooled."""
+        if session is not None:
+            return create_swift_connection(session, project_id)
+
+        pool = get_swift_connection_pool(self.resource)
+        if not (connection := pool.get(project_id)):
+            connection = create_swift_connection(self.session, project_id)
+            pool.set(project_id, connection)
+        return connection
 
     def _extract_quota_label(self, quotaspec) -> list[str]:
         """Returns [service_name, quota_label] for a given quotaspec"""
         return quotaspec.quota_label.split(".", 1)
 
-    @functools.lru_cache()
+    @functools.cached_property
+    def _resource_quota_labels_by_service(self) -> dict[str, list[str]]:
+        quota_labels = {}
+        for quotaspec in self.resource_quotaspecs.root.values():
+            service_name, quota_label = self._extract_quota_label(quotaspec)
+            quota_labels.setdefault(service_name, []).append(quota_label)
+        return quota_labels
+
     def _get_resource_quota_labels_by_service(
         self, requested_service_name
     ) -> list[str]:
         """Returns a list of quota labels for a given service name (i.e "compute")"""
-        quota_labels = []
-        for quotaspec in self.resource_quotaspecs.root.values():
-            service_name, quota_label = self._extract_quota_label(quotaspec)
-            if service_name == requested_service_name:
-                quota_labels.append(quota_label)
-        return quota_labels
+        return self._resource_quota_labels_by_service.get(requested_service_name, [])
 
     def set_project_configuration(self, project_id, apply=True):
-        self.set_users(project_id, apply)
-        self.set_quota_config(project_id, apply)
+        failed_validation = self.set_users(project_id, apply)
+        failed_validation |= self.set_quota_config(project_id, apply)
+        return failed_validation
 
     def set_quota_config(self, project_id, apply=True):
         failed_validation = False
@@ -148,9 +363,9 @@ class OpenStackResourceAllocator(base.ResourceAllocator):
                 and expected_value <= 0
             ):
                 expected_value = 1
-                object_quota_value = (
-                    self.object(project_id).head_account().get(OPENSTACK_OBJ_KEY)
-                )
+                object_quota_value = self._call_swift_account(
+                    project_id, "head_account"
+                ).get(OPENSTACK_OBJ_KEY)
                 current_value = (
                     int(object_quota_value) if object_quota_value is not None else None
                 )
@@ -165,7 +380,8 @@ class OpenStackResourceAllocator(base.ResourceAllocator):
                 logger.info(f"Quota for {project_id} was out of date. Reapplied!")
             except Exception as e:
                 logger.info(f"setting cluster-side quota failed: {e}")
-                return
+
+        return failed_validation
 
     def get_project(self, project_id):
         return self.identity.projects.get(project_id)
@@ -228,48 +444,89 @@ class OpenStackResourceAllocator(base.ResourceAllocator):
             payload[obj_q_mapping] *= GB_IN_BYTES
             if payload[obj_q_mapping] <= 0:
                 payload[obj_q_mapping] = 1
-            self.object(project_id).post_account(headers=payload)
+            self._call_swift_account(project_id, "post_account", headers=payload)
         except ksa_exceptions.catalog.EndpointNotFound:
             logger.debug("No swift available, skipping its quota.")
+
+    def _call_swift_account(self, project_id, method, **kwargs):
+        """Call a Swift account method, initializing RGW for the project on 403."""
+        try:
+            return call_swift_account(self.object(project_id), method, **kwargs)
         except swiftclient.exceptions.ClientException as e:
-            if e.http_status == 403:
-                self._init_rgw_for_project(project_id)
-                self.object(project_id).post_account(headers=payload)
-            else:
+            if e.http_status != 403:
                 raise
 
-    def _init_rgw_for_project(self, project_id):
+        self._init_rgw_for_project(project_id)
+        return call_swift_account(self.object(project_id), method, **kwargs)
+
+    @property
+    def _rgw_init_password(self):
         var_name = utils.env_safe_name(self.resource.name)
         phash = hashlib.sha512(
             os.environ.get(
                 f"OPENSTACK_{var_name}_APPLICATION_CREDENTIAL_SECRET"
             ).encode("utf-8")
         )
+        return phash.hexdigest()[0 : int(phash.block_size / 2)]
 
-        password = phash.hexdigest()[0 : int(phash.block_size / 2)]
+    def _ensure_rgw_init_user(self):
+        if _user_cache.get((self.resource.pk, COLDFRONT_RGW_SWIFT_INIT_USER)):
+            return
 
         try:
             self.identity.users.create(
                 name=COLDFRONT_RGW_SWIFT_INIT_USER,
-                password=password,
+                password=self._rgw_init_password,
             )
         except ksa_exceptions.http.Conflict:
             logger.debug(
                 f"rgw swift init user already exists: {COLDFRONT_RGW_SWIFT_INIT_USER}"
             )
+        # The user may have been looked up before it was created
+        _user_cache.pop((self.resource.pk, COLDFRONT_RGW_SWIFT_INIT_USER))
+
+    def _is_rgw_initialized(self, project_id):
+        cache_key = (self.resource.pk, project_id)
+        if cache_key in _rgw_initialized_projects:
+            return True
+        if self.identity.projects.check_tag(project_id, RGW_INITIALIZED_TAG):
+            _rgw_initialized_projects.set(cache_key, True)
+            return True
+        return False
 
+    def _init_rgw_for_project(self, project_id):
+        """Create the RGW Swift account of a project.
+
+        RGW only creates the account of a project once a user with a role in
+        that project accesses it, until then requests from the admin
+        credentials are denied with 403. Once done, the project is tagged in
+        Keystone. A 403 for a tagged project means RGW lost its account, such
+        as when it was purged, so the account is created again.
+        """
+        if self._is_rgw_initialized(project_id):
+            logger.warning(
+                f"rgw swift returned 403 for {project_id} which is already"
+                f" initialized, initializing it again."
+            )
+            _rgw_initialized_projects.pop((self.resource.pk, project_id))
+
+        self._ensure_rgw_init_user()
         self.assign_role_on_user(COLDFRONT_RGW_SWIFT_INIT_USER, project_id)
+        try:
+            usesh = get_session_for_resource_via_password(
+                resource=self.resource,
+                username=COLDFRONT_RGW_SWIFT_INIT_USER,
+                password=self._rgw_init_password,
+                project_id=project_id,
+            )
+            sw = self.object(session=usesh, project_id=project_id)
+            stat = call_swift_account(sw, "head_account")
+            logger.debug(f"rgw swift stat for {project_id}:\n{stat}")
+        finally:
+            self.remove_role_from_user(COLDFRONT_RGW_SWIFT_INIT_USER, project_id)
 
-        usesh = get_session_for_resource_via_password(
-            resource=self.resource,
-            username=COLDFRONT_RGW_SWIFT_INIT_USER,
-            password=password,
-            project_id=project_id,
-        )
-        sw = self.object(session=usesh, project_id=project_id)
-        stat = sw.head_account()
-        logger.debug(f"rgw swift stat for {project_id}:\n{stat}")
-        self.remove_role_from_user(COLDFRONT_RGW_SWIFT_INIT_USER, project_id)
+        self.identity.projects.add_tag(project_id, RGW_INITIALIZED_TAG)
+        _rgw_initialized_projects.set((self.resource.pk, project_id), True)
 
     def _get_network_quota(self, quotas, project_id):
         network_quota = self.network.show_quota(project_id)["quota"]
@@ -296,25 +553,17 @@ class OpenStackResourceAllocator(base.ResourceAllocator):
         ):
             _, key = self._extract_quota_label(object_quotaspec)
             try:
-                swift = self.object(project_id).head_account()
+                swift = self._call_swift_account(project_id, "head_account")
+                quotas[key] = int(int(swift.get(key)) / GB_IN_BYTES)
             except ksa_exceptions.catalog.EndpointNotFound:
                 logger.debug("No swift available, skipping its quota.")
-            except swiftclient.exceptions.ClientException as e:
-                if e.http_status == 403:
-                    self._init_rgw_for_project(project_id)
-                else:
-                    raise
-
-            try:
-                swift = self.object(project_id).head_account()
-                quotas[key] = int(int(swift.get(key)) / GB_IN_BYTES)
-            except (ValueError, TypeError, ksa_exceptions.catalog.EndpointNotFound):
+            except (ValueError, TypeError):
                 logger.info("No swift quota set.")
 
         return quotas
 
     def get_user_payload_for_resource(self, username):
-        domain_id = self.resource.get_attribute(attributes.RESOURCE_USER_DOMAIN)
+        domain_id = self.user_domain
         idp_id = self.resource.get_attribute(attributes.RESOURCE_IDP)
         protocol = (
             self.resource.get_attribute(attributes.RESOURCE_FEDERATION_PROTOCOL)
@@ -341,63 +590,151 @@ class OpenStackResourceAllocator(base.ResourceAllocator):
         }
 
     def get_federated_user(self, username):
-        # Query by unique_id
-        query_response = (
-            get_session_for_resource(self.resource)
-            .get(
-                f"{self.resource.get_attribute(attributes.RESOURCE_AUTH_URL)}/v3/users?unique_id={username}"
-            )
-            .json()
+        cache_key = (self.resource.pk, username)
+        if (user := _user_cache.get(cache_key, False)) is not False:
+            return user
+
+        user = self._query_federated_user(username)
+        _user_cache.set(
+            cache_key, user, ttl=None if user else KEYSTONE_NEGATIVE_CACHE_TTL
         )
+        return user
+
+    def _query_federated_user(self, username):
+        # Query by unique_id
+        query_response = self.session.get(
+            f"{self.auth_url}/v3/users?unique_id={username}"
+        ).json()
         if query_response["users"]:
             return query_response["users"][0]
 
         # Query by name as a fallback (this might return a non-federated user)
-        query_response = (
-            get_session_for_resource(self.resource)
-            .get(
-                f"{self.resource.get_attribute(attributes.RESOURCE_AUTH_URL)}/v3/users?"
-                f"name={username}&domain_id={self.resource.get_attribute(attributes.RESOURCE_USER_DOMAIN)}"
-            )
-            .json()
-        )
+        query_response = self.session.get(
+            f"{self.auth_url}/v3/users?name={username}&domain_id={self.user_domain}"
+        ).json()
         if query_response["users"]:
             return query_response["users"][0]
 
     def create_federated_user(self, unique_id):
+        _user_cache.pop((self.resource.pk, unique_id))
         try:
-            create_response = get_session_for_resource(self.resource).post(
-                f"{self.resource.get_attribute(attributes.RESOURCE_AUTH_URL)}/v3/users",
+            create_response = self.session.post(
+                f"{self.auth_url}/v3/users",
                 json=self.get_user_payload_for_resource(unique_id),
             )
-            return create_response.json()["user"]
+            user = create_response.json()["user"]
+            _user_cache.set((self.resource.pk, unique_id), user)
+            return user
         except ksa_exceptions.Conflict:
             return self.get_federated_user(unique_id)
 
-    def assign_role_on_user(self, username, project_id):
-        role = self.identity.roles.find(name=self.member_role_name)
+    def _get_role_id(self, role_name):
+        cache_key = (self.resource.pk, role_name)
+        if not (role_id := _role_id_cache.get(cache_key)):
+            role_id = self.identity.roles.find(name=role_name).id
+            _role_id_cache.set(cache_key, role_id)
+        return role_id
 
-        user = self.get_federated_user(username)
-        self.identity.roles.grant(user=user["id"], project=project_id, role=role)
+    def assign_role_on_user(self, username, project_id):
+        role = self._get_role_id(self.member_role_name)
+        self._grant_role(role, username, project_id)
 
     def remove_role_from_user(self, username, project_id):
-        role = self.identity.roles.find(name=self.member_role_name)
+        role = self._get_role_id(self.member_role_name)
+        self._revoke_role(role, username, project_id)
+
+    def _read_user_attributes(self, usernames):
+        """Reads the resource attributes used to look up users that are not
+        cached, so that the worker threads of bulk operations do not each
+        open a database connection to read them."""
+        if any((self.resource.pk, x) not in _user_cache for x in usernames):
+            return self.auth_url, self.user_domain
+
+    def assign_roles_bulk(self, usernames, project_id):
+        role = self._get_role_id(self.member_role_name)
+        self._read_user_attributes(usernames)
+        self._map_concurrently(
+            lambda username: self._grant_role(role, username, project_id), usernames
+        )
 
+    def remove_roles_bulk(self, usernames, project_id):
+        role = self._get_role_id(self.member_role_name)
+        self._read_user_attributes(usernames)
+        self._map_concurrently(
+            lambda username: self._revoke_role(role, username, project_id), usernames
+        )
+
+    def _grant_role(self, role, username, project_id):
+        user = self.get_federated_user(username)
+        try:
+            self.identity.roles.grant(user=user["id"], project=project_id, role=role)
+        except ksa_exceptions.NotFound:
+            # The cached user or role may have been deleted since
+            _user_cache.pop((self.resource.pk, username))
+            _role_id_cache.pop((self.resource.pk, self.member_role_name))
+            raise
+
+    def _revoke_role(self, role, username, project_id):
         if user := self.get_federated_user(username):
             self.identity.roles.revoke(user=user["id"], project=project_id, role=role)
 
+    def _map_concurrently(self, func, items):
+        """Call func on each item using a bounded thread pool.
+
+        Exceptions raised by any of the calls are re-raised."""
+        items = list(items)
+        if len(items) <= 1:
+            return [func(item) for item in items]
+
+        max_workers = min(self.bulk_concurrency, len(items))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(func, items))
+
     def create_default_network(self, project_id):
-        neutron = neutronclient.Client(session=get_session_for_resource(self.resource))
+        """Get or create the default network, subnet and router of a project.
+
+        Existing objects are discovered with concurrent list queries. Missing
+        ones are then created, with the network and router created in
+        parallel as only the subnet and router interface depend on them.
+        """
+        neutron = self.network
+        # Read before fanning out, so worker threads don't query the database
+        public_network_id = self.resource.get_attribute(
+            attributes.RESOURCE_DEFAULT_PUBLIC_NETWORK
+        )
+        network_cidr = (
+            self.resource.get_attribute(attributes.RESOURCE_DEFAULT_NETWORK_CIDR)
+            or "192.168.0.0/24"
+        )
+
+        networks, subnets, routers, router_ports = self._map_concurrently(
+            lambda list_query: list_query(),
+            [
+                lambda: neutron.list_networks(
+                    project_id=project_id, name="default_network"
+                )["networks"],
+                lambda: neutron.list_subnets(
+                    project_id=project_id, name="default_subnet"
+                )["subnets"],
+                lambda: neutron.list_routers(
+                    project_id=project_id, name="default_router"
+                )["routers"],
+                lambda: neutron.list_ports(
+                    project_id=project_id, device_owner="network:router_interface"
+                )["ports"],
+            ],
+        )
 
         # Get or create default network
-        networks = neutron.list_networks(project_id=project_id, name="default_network")
-        if networks := networks["networks"]:
-            network = networks[0]
-            logger.info(
-                f"Default network with ID {network['network']['id']} "
-                f"already exists for project {project_id}."
-            )
-        else:
+        def _get_or_create_network():
+            if networks:
+                network = networks[0]
+                logger.info(
+                    f"Default network with ID {network['id']} "
+                    f"already exists for project {project_id}."
+                )
+                return network
+
             default_network_payload = {
                 "network": {
                     "name": "default_network",
@@ -406,70 +743,68 @@ class OpenStackResourceAllocator(base.ResourceAllocator):
                     "description": "Default network created during provisioning.",
                 }
             }
-            network = neutron.create_network(body=default_network_payload)
+            network = neutron.create_network(body=default_network_payload)["network"]
             logger.info(
-                f"Default network with ID {network['network']['id']} "
+                f"Default network with ID {network['id']} "
                 f"created for project {project_id}."
             )
+            return network
+
+        # Get or create default router
+        def _get_or_create_router():
+            if routers:
+                return routers[0]
+
+            default_router_payload = {
+                "router": {
+                    "name": "default_router",
+                    "external_gateway_info": {"network_id": public_network_id},
+                    "project_id": project_id,
+                    "admin_state_up": True,
+                    "description": "Default router created during provisioning.",
+                }
+            }
+            return neutron.create_router(body=default_router_payload)["router"]
+
+        network, router = self._map_concurrently(
+            lambda get_or_create: get_or_create(),
+            [_get_or_create_network, _get_or_create_router],
+        )
 
         # Get or create default subnet
-        subnets = neutron.list_subnets(project_id=project_id, name="default_subnet")
-        if subnets := subnets["subnets"]:
+        if subnets:
             subnet = subnets[0]
             logger.info(
-                f"Default subnet with ID {subnet['subnet']['id']} "
+                f"Default subnet with ID {subnet['id']} "
                 f"already exists for project {project_id}."
             )
         else:
             default_subnet_payload = {
                 "subnet": {
-                    "network_id": network["network"]["id"],
+                    "network_id": network["id"],
                     "name": "default_subnet",
                     "ip_version": 4,
                     "project_id": project_id,
-                    "cidr": self.resource.get_attribute(
-                        attributes.RESOURCE_DEFAULT_NETWORK_CIDR
-                    )
-                    or "192.168.0.0/24",
+                    "cidr": network_cidr,
                     "dns_nameservers": ["8.8.8.8", "8.8.4.4"],
                     "description": "Default subnet created during provisioning.",
                 }
             }
-            subnet = neutron.create_subnet(body=default_subnet_payload)
+            subnet = neutron.create_subnet(body=default_subnet_payload)["subnet"]
             logger.info(
-                f"Default subnet with ID {subnet['subnet']['id']} "
+                f"Default subnet with ID {subnet['id']} "
                 f"created for project {project_id}."
             )
 
-        # Get or create default router
-        routers = neutron.list_routers(project_id=project_id, name="default_router")
-        if routers := routers["routers"]:
-            router = routers[0]
-        else:
-            default_router_payload = {
-                "router": {
-                    "name": "default_router",
-                    "external_gateway_info": {
-                        "network_id": self.resource.get_attribute(
-                            attributes.RESOURCE_DEFAULT_PUBLIC_NETWORK
-                        )
-                    },
-                    "project_id": project_id,
-                    "admin_state_up": True,
-                    "description": "Default router created during provisioning.",
-                }
-            }
-            router = neutron.create_router(body=default_router_payload)
-
         # Get or create port on router
-        router_id = router["router"]["id"]
-        network_id = network["network"]["id"]
-        subnet_id = subnet["subnet"]["id"]
+        router_id = router["id"]
+        network_id = network["id"]
+        subnet_id = subnet["id"]
 
-        ports = neutron.list_ports(
-            project_id=project_id, device_id=router_id, network_id=network_id
-        )
-        if ports["ports"]:
+        if any(
+            port["device_id"] == router_id and port["network_id"] == network_id
+            for port in router_ports
+        ):
             logger.info(
                 f"Router {router_id} already connected to network {network_id} for "
                 f"project {project_id}."
@@ -497,9 +832,8 @@ class OpenStackResourceAllocator(base.ResourceAllocator):
     def get_users(self, project_id):
         """Return users with a role in a project"""
         role_name = self.resource.get_attribute(attributes.RESOURCE_ROLE)
-        role = self.identity.roles.find(name=role_name)
         role_assignments = self.identity.role_assignments.list(
-            role=role.id, project=project_id, include_names=True
+            role=self._get_role_id(role_name), project=project_id, include_names=True
         )
         user_names = set(
             role_assignment.user["name"] for role_assignment in role_assignments
@@ -0,0 +1,138 @@
+import collections
+import contextlib
+import pstats
+import threading
+import time
+
+# Phases time is broken down into, compute being whatever is left
+DB = "db"
+BACKEND = "backend"
+IO = "io"
+COMPUTE = "compute"
+
+# Paths taking less time are left out of collapsed stacks
+MIN_STACK_SECONDS = 0.000001
+
+_timings = None
+
+
+class PhaseTimings:
+    """Time spent in each phase of a run.
+
+    Phases are timed by wall clock, so requests made concurrently by worker
+    threads can add up to more than the duration of the run.
+    """
+
+    def __init__(self):
+        self.seconds = collections.Counter()
+        self.counts = collections.Counter()
+        self._lock = threading.Lock()
+
+    def record(self, phase, seconds):
+        with self._lock:
+            self.seconds[phase] += seconds
+            self.counts[phase] += 1
+
+    def format_summary(self, total_seconds) -> str:
+        seconds = dict(self.seconds)
+        seconds[COMPUTE] = max(total_seconds - sum(seconds.values()), 0)
+        lines = [f"{'PHASE':<10} {'SECONDS':>9} {'SHARE':>6} {'CALLS':>7}"]
+        for phase in (DB, BACKEND, IO, COMPUTE):
+            share = seconds.get(phase, 0) / total_seconds if total_seconds else 0
+            calls = self.counts[phase] if phase != COMPUTE else ""
+            lines.append(
+                f"{phase:<10} {seconds.get(phase, 0):9.3f} {share:6.1%} {calls:>7}"
+            )
+        lines.append(f"{'total':<10} {total_seconds:9.3f}")
+        return "\n".join(lines) + "\n"
+
+
+def enable() -> PhaseTimings:
+    """Starts timing phases, returning the timings recorded from now on."""
+    global _timings
+    _timings = PhaseTimings()
+    return _timings
+
+
+def disable():
+    global _timings
+    _timings = None
+
+
+def is_enabled():
+    return _timings is not None
+
+
+def record(phase, seconds):
+    if _timings is not None:
+        _timings.record(phase, seconds)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Times the enclosed block as part of phase name, when enabled."""
+    if _timings is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _timings.record(name, time.perf_counter() - start)
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    """Database execute wrapper timing queries as the db phase."""
+    with phase(DB):
+        return execute(sql, params, many, context)
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == "~":
+        # Builtins, such as <built-in method time.sleep>
+        return name
+    return f"{filename}:{line}:{name}"
+
+
+def write_collapsed_stacks(stats: pstats.Stats, path, max_depth=64):
+    """Writes stats as collapsed stacks, the input format of flamegraph.pl
+    and speedscope.
+
+    cProfile only records callers one level up, so a function's time is
+    split between its callers in proportion to the time of each call site,
+    the way flameprof and gprof2dot do.
+    """
+    callees = collections.defaultdict(dict)
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, (_, _, _, cumulative) in callers.items():
+            callees[caller][func] = cumulative
+
+    stacks = collections.Counter()
+
+    def walk(func, stack, share):
+        _, _, own, cumulative, _ = stats.stats[func]
+        if cumulative * share < MIN_STACK_SECONDS:
+            return
+        stack = stack + (func,)
+        stacks[stack] += own * share
+        if len(stack) >= max_depth:
+            return
+        for callee, call_cumulative in callees[func].items():
+            callee_cumulative = stats.stats[callee][3]
+            if callee in stack or not callee_cumulative:
+                continue
+            callee_share = share * call_cumulative / callee_cumulative
+            walk(callee, stack, min(callee_share, 1.0))
+
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        if not callers:
+            walk(func, (), 1.0)
+
+    with open(path, "w") as f:
+        for stack, seconds in stacks.items():
+            # Sample counts are in microseconds
+            if samples := round(seconds * 1_000_000):
+                f.write(";".join(_label(func) for func in stack))
+                f.write(f" {samples}\n")
@@ -0,0 +1,238 @@
+import logging
+import os
+import threading
+import time
+import uuid
+
+from django.core.exceptions import ImproperlyConfigured
+
+from coldfront_plugin_cloud import utils
+
+logger = logging.getLogger(__name__)
+
+# Lease of a concurrency slot held in Redis, in case its holder dies.
+REDIS_SLOT_LEASE_SECONDS = 300
+REDIS_KEY_PREFIX = "coldfront_plugin_cloud:ratelimit"
+
+# Takes a token from the bucket in KEYS[1], with ARGV = [rate, burst].
+# Returns 0 if a token was taken, otherwise the seconds until one is available.
+REDIS_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = redis.call("TIME")
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + (now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tokens, "updated", now)
+redis.call("EXPIRE", KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+# Takes a slot ARGV[1] out of ARGV[2] in KEYS[1], leased for ARGV[3] seconds.
+REDIS_SEMAPHORE_SCRIPT = """
+local now = redis.call("TIME")
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", now)
+if redis.call("ZCARD", KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call("ZADD", KEYS[1], now + tonumber(ARGV[3]), ARGV[1])
+    redis.call("EXPIRE", KEYS[1], tonumber(ARGV[3]))
+    return 1
+end
+return 0
+"""
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, in bursts of up to
+    `burst`, across the threads of this process."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        while wait := self._take():
+            time.sleep(wait)
+
+
+class RedisTokenBucket(TokenBucket):
+    """Token bucket shared by every process using the same Redis key."""
+
+    def __init__(self, rate: float, burst: int, redis_client, key: str):
+        self.rate = rate
+        self.burst = burst
+        self.key = key
+        self._script = redis_client.register_script(REDIS_TOKEN_BUCKET_SCRIPT)
+
+    def _take(self) -> float:
+        return float(self._script(keys=[self.key], args=[self.rate, self.burst]))
+
+
+class ConcurrencyLimiter:
+    """Allows up to `limit` concurrent holders across the threads of this
+    process."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphore = threading.BoundedSemaphore(limit)
+
+    def acquire(self):
+        self._semaphore.acquire()
+
+    def release(self):
+        self._semaphore.release()
+
+
+class RedisConcurrencyLimiter(ConcurrencyLimiter):
+    """Allows up to `limit` concurrent holders across every process using the
+    same Redis key. Slots are leased, so those of a crashed process are
+    eventually reclaimed."""
+
+    poll_interval = 0.05
+
+    def __init__(self, limit: int, redis_client, key: str):
+        self.limit = limit
+        self.key = key
+        self._redis = redis_client
+        self._script = redis_client.register_script(REDIS_SEMAPHORE_SCRIPT)
+        self._local = threading.local()
+
+    def acquire(self):
+        slot = uuid.uuid4().hex
+        while not self._script(
+            keys=[self.key], args=[slot, self.limit, REDIS_SLOT_LEASE_SECONDS]
+        ):
+            time.sleep(self.poll_interval)
+        self._local.__dict__.setdefault("slots", []).append(slot)
+
+    def release(self):
+        self._redis.zrem(self.key, self._local.slots.pop())
+
+
+class RateLimiter:
+    """Context manager limiting the rate and concurrency of the requests made
+    within it. Either limit may be None to leave it unbounded.
+
+    Nested use within a thread is not limited again, as a request may need to
+    make another one first, e.g. to fetch a token.
+    """
+
+    def __init__(
+        self,
+        bucket: TokenBucket | None = None,
+        concurrency: ConcurrencyLimiter | None = None,
+    ):
+        self.bucket = bucket
+        self.concurrency = concurrency
+        self._local = threading.local()
+
+    def __enter__(self):
+        depth = self._local.depth = getattr(self._local, "depth", 0) + 1
+        if depth > 1:
+            return self
+
+        if self.concurrency:
+            self.concurrency.acquire()
+        if self.bucket:
+            try:
+                self.bucket.acquire()
+            except BaseException:
+                self._local.depth -= 1
+                if self.concurrency:
+                    self.concurrency.release()
+                raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._local.depth -= 1
+        if self._local.depth == 0 and self.concurrency:
+            self.concurrency.release()
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_redis_client():
+    # Note: redis is only required when a Django Q cluster is configured,
+    # which is signified by the presence of REDIS_HOST.
+    try:
+        import redis
+    except ImportError as e:
+        raise ImproperlyConfigured(
+            "Rate limits are enforced in Redis when REDIS_HOST is set, which"
+            " requires the redis package: pip install coldfront_plugin_cloud[redis]"
+        ) from e
+
+    return redis.Redis(
+        host=os.getenv("REDIS_HOST"),
+        port=int(os.getenv("REDIS_PORT", 6379)),
+        password=os.getenv("REDIS_PASSWORD"),
+    )
+
+
+def get_rate_limiter(prefix: str, resource) -> RateLimiter:
+    """Returns the rate limiter for requests to a resource.
+
+    Limits are read from the env variables {prefix}_{RESOURCE_NAME}_RATE_LIMIT
+    (requests per second), {prefix}_{RESOURCE_NAME}_RATE_LIMIT_BURST (defaults
+    to one second worth of requests) and
+    {prefix}_{RESOURCE_NAME}_MAX_CONCURRENT_REQUESTS. Unset limits are
+    unbounded. When REDIS_HOST is set, limits are shared by every process
+    talking to the resource rather than enforced per process.
+    """
+    var_name = f"{prefix}_{utils.env_safe_name(resource.name)}"
+    with _rate_limiters_lock:
+        if var_name in _rate_limiters:
+            return _rate_limiters[var_name]
+
+        rate = float(os.getenv(f"{var_name}_RATE_LIMIT", 0))
+        burst = int(os.getenv(f"{var_name}_RATE_LIMIT_BURST", 0)) or max(int(rate), 1)
+        max_concurrent = int(os.getenv(f"{var_name}_MAX_CONCURRENT_REQUESTS", 0))
+
+        bucket = concurrency = None
+        if os.getenv("REDIS_HOST") and (rate or max_concurrent):
+            redis_client = get_redis_client()
+            key = f"{REDIS_KEY_PREFIX}:{var_name}"
+            if rate:
+                bucket = RedisTokenBucket(rate, burst, redis_client, f"{key}:bucket")
+            if max_concurrent:
+                concurrency = RedisConcurrencyLimiter(
+                    max_concurrent, redis_client, f"{key}:concurrency"
+                )
+        else:
+            if rate:
+                bucket = TokenBucket(rate, burst)
+            if max_concurrent:
+                concurrency = ConcurrencyLimiter(max_concurrent)
+
+        if bucket or concurrency:
+            logger.info(
+                f"Limiting requests to {resource.name} to {rate or 'unlimited'}/s"
+                f" and {max_concurrent or 'unlimited'} concurrent."
+            )
+        rate_limiter = _rate_limiters[var_name] = RateLimiter(bucket, concurrency)
+        return rate_limiter
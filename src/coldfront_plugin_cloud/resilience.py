@@ -0,0 +1,221 @@
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, NamedTuple
+
+from coldfront_plugin_cloud import utils
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETRY_ATTEMPTS = 3
+DEFAULT_RETRY_BACKOFF_SECONDS = 0.5
+MAX_RETRY_BACKOFF_SECONDS = 30
+DEFAULT_CIRCUIT_BREAKER_THRESHOLD = 5
+DEFAULT_CIRCUIT_BREAKER_RESET_SECONDS = 30
+
+# Methods that can be repeated without changing the outcome
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+TOO_MANY_REQUESTS = 429
+TRANSIENT_SERVER_ERRORS = {500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class Outcome(NamedTuple):
+    """How a request went, as far as retrying it is concerned."""
+
+    # Whether trying again may succeed.
+    retriable: bool = False
+    # Whether the request may have reached the server. Requests that did not
+    # are safe to retry whatever their method.
+    sent: bool = True
+    # Whether the failure indicates the resource is unhealthy.
+    unhealthy: bool = False
+
+
+SUCCESS = Outcome()
+
+
+def outcome_for_status(status: int | None) -> Outcome:
+    if status == TOO_MANY_REQUESTS:
+        # The request was rejected before being processed, the server is
+        # fine and just needs us to slow down.
+        return Outcome(retriable=True, sent=False)
+    if status in TRANSIENT_SERVER_ERRORS:
+        return Outcome(retriable=True, unhealthy=True)
+    return SUCCESS
+
+
+class CircuitBreaker:
+    """Fails fast once `failure_threshold` consecutive requests to a resource
+    have failed, until `reset_timeout` seconds have passed. A single request
+    is then let through, and closes the circuit again if it succeeds."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if (
+                self.state == self.OPEN
+                and time.monotonic() - self._opened_at >= self.reset_timeout
+            ):
+                self.state = self.HALF_OPEN
+                return
+        raise CircuitOpenError(
+            f"Requests to {self.name} are suspended after"
+            f" {self._failures} consecutive failures."
+        )
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Requests to {self.name} are succeeding again.")
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED and self._failures >= self.failure_threshold
+            ):
+                logger.error(
+                    f"Suspending requests to {self.name} for {self.reset_timeout}s"
+                    f" after {self._failures} consecutive failures."
+                )
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class RetryPolicy:
+    """Retries transient failures of requests to a resource with jittered
+    exponential backoff, and trips its circuit breaker when they persist.
+
+    Requests with a non idempotent method are only retried if they never
+    reached the server, as repeating them could e.g. create a duplicate.
+    """
+
+    def __init__(
+        self,
+        breaker: CircuitBreaker | None = None,
+        attempts: int = DEFAULT_RETRY_ATTEMPTS,
+        backoff: float = DEFAULT_RETRY_BACKOFF_SECONDS,
+    ):
+        self.breaker = breaker
+        self.attempts = attempts
+        self.backoff = backoff
+
+    def get_delay(self, attempt: int) -> float:
+        # Full jitter, so that clients failing together don't retry together.
+        return random.uniform(
+            0, min(MAX_RETRY_BACKOFF_SECONDS, self.backoff * 2 ** (attempt - 1))
+        )
+
+    def call(
+        self,
+        method: str,
+        func: Callable,
+        classify: Callable[[object, Exception | None], Outcome],
+        discard: Callable[[object], None] | None = None,
+    ):
+        """Calls func, retrying according to classify(result, exception).
+
+        discard is called with results that are thrown away to be retried.
+        """
+        if self.breaker:
+            self.breaker.before_call()
+
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            attempt += 1
+            result = exception = None
+            try:
+                result = func()
+            except Exception as e:
+                exception = e
+            outcome = classify(result, exception)
+
+            if (
+                not outcome.retriable
+                or attempt >= self.attempts
+                or (outcome.sent and not idempotent)
+            ):
+                break
+
+            if discard and exception is None:
+                discard(result)
+            delay = self.get_delay(attempt)
+            reason = exception if exception is not None else "a transient error"
+            logger.warning(
+                f"{method} request failed with {reason}, retrying in {delay:.2f}s"
+                f" (attempt {attempt}/{self.attempts})."
+            )
+            time.sleep(delay)
+
+        if self.breaker:
+            if outcome.unhealthy:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+
+        if exception is not None:
+            raise exception
+        return result
+
+
+_retry_policies = {}
+_retry_policies_lock = threading.Lock()
+
+
+def get_retry_policy(prefix: str, resource) -> RetryPolicy:
+    """Returns the retry policy for requests to a resource.
+
+    Settings are read from the env variables
+    {prefix}_{RESOURCE_NAME}_RETRY_ATTEMPTS (attempts per request, including
+    the first), {prefix}_{RESOURCE_NAME}_CIRCUIT_BREAKER_THRESHOLD (consecutive
+    failures after which requests fail fast, 0 to disable) and
+    {prefix}_{RESOURCE_NAME}_CIRCUIT_BREAKER_RESET_SECONDS (time until a
+    request is let through again).
+    """
+    var_name = f"{prefix}_{utils.env_safe_name(resource.name)}"
+    with _retry_policies_lock:
+        if var_name in _retry_policies:
+            return _retry_policies[var_name]
+
+        attempts = int(os.getenv(f"{var_name}_RETRY_ATTEMPTS", DEFAULT_RETRY_ATTEMPTS))
+        threshold = int(
+            os.getenv(
+                f"{var_name}_CIRCUIT_BREAKER_THRESHOLD",
+                DEFAULT_CIRCUIT_BREAKER_THRESHOLD,
+            )
+        )
+        reset_timeout = float(
+            os.getenv(
+                f"{var_name}_CIRCUIT_BREAKER_RESET_SECONDS",
+                DEFAULT_CIRCUIT_BREAKER_RESET_SECONDS,
+            )
+        )
+
+        breaker = None
+        if threshold:
+            breaker = CircuitBreaker(resource.name, threshold, reset_timeout)
+        policy = _retry_policies[var_name] = RetryPolicy(breaker, max(attempts, 1))
+        return policy
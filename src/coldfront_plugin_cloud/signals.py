@@ -1,14 +1,21 @@
+import ast
+import datetime
 import os
 
+from django.db import transaction
 from django.dispatch import receiver
-from django_q.tasks import async_task
+from django.utils import timezone
+from django_q.models import Schedule
+from django_q.tasks import async_task, schedule
 
 from coldfront_plugin_cloud.tasks import (
     activate_allocation,
     add_user_to_allocation,
     disable_allocation,
     remove_user_from_allocation,
+    remove_users_from_allocation,
 )
+from coldfront.core.allocation.models import Allocation, AllocationUser
 from coldfront.core.allocation.signals import (
     allocation_activate,
     allocation_activate_user,
@@ -25,6 +32,94 @@ def is_async():
     return os.getenv("REDIS_HOST")
 
 
+def get_debounce_seconds():
+    return int(os.getenv("ALLOCATION_TASK_DEBOUNCE_SECONDS", 10))
+
+
+def get_max_delay_seconds():
+    return int(os.getenv("ALLOCATION_TASK_MAX_DELAY_SECONDS", 60))
+
+
+def _lock_allocation(allocation_pk):
+    """Serializes changes to the pending tasks of an allocation until the end
+    of the transaction. Pending tasks can't be locked before they exist."""
+    list(Allocation.objects.select_for_update().filter(pk=allocation_pk).values("pk"))
+
+
+def async_task_coalesced(name, func, *args, allocation_pk, merge_args=None):
+    """Enqueue func(*args) under name, merging with an already pending call.
+
+    Pending calls are stored as one-off Django-Q schedules. While one with
+    the same name is pending, further calls replace its function and
+    arguments (or combine the arguments with merge_args) and push its start
+    time back by the debounce window, up to the max delay from the first
+    call. A burst of signals for the same allocation therefore results in a
+    single task that reflects the last request and reads the latest state
+    from the database when it runs. Once the scheduler has handed the task
+    to a worker the schedule is deleted and the next call enqueues anew.
+    """
+    func_path = f"{func.__module__}.{func.__name__}"
+    now = timezone.now()
+    next_run = now + datetime.timedelta(seconds=get_debounce_seconds())
+
+    with transaction.atomic():
+        _lock_allocation(allocation_pk)
+        # Note: The scheduler locks the rows it is about to run, so holding
+        # this lock guarantees the arguments we merge into are not in flight.
+        if pending := Schedule.objects.select_for_update().filter(name=name).first():
+            if merge_args:
+                args = merge_args(ast.literal_eval(pending.args), args)
+            pending.func = func_path
+            pending.args = repr(args)
+            pending.next_run = next_run
+            # Note: Django-Q ignores the q_options it doesn't know.
+            q_options = ast.literal_eval(pending.kwargs or "{}").get("q_options", {})
+            if deadline := q_options.get("coalesced_until"):
+                pending.next_run = min(
+                    next_run, datetime.datetime.fromisoformat(deadline)
+                )
+            pending.save()
+            return
+
+        deadline = now + datetime.timedelta(seconds=get_max_delay_seconds())
+        schedule(
+            func_path,
+            *args,
+            name=name,
+            schedule_type=Schedule.ONCE,
+            next_run=min(next_run, deadline),
+            q_options={"coalesced_until": deadline.isoformat()},
+        )
+
+
+def _merge_allocation_user_pks(pending_args, args):
+    (pending_pks,), (new_pks,) = pending_args, args
+    return (sorted(set(pending_pks) | set(new_pks)),)
+
+
+def _get_allocation_pk(allocation_user_pk):
+    return AllocationUser.objects.values_list("allocation_id", flat=True).get(
+        pk=allocation_user_pk
+    )
+
+
+def _discard_pending_user_removal(allocation_pk, allocation_user_pk):
+    """Drop a user from a pending batched removal, if there is one."""
+    name = f"remove_users_from_allocation-{allocation_pk}"
+    with transaction.atomic():
+        _lock_allocation(allocation_pk)
+        if pending := Schedule.objects.select_for_update().filter(name=name).first():
+            (pks,) = ast.literal_eval(pending.args)
+            if allocation_user_pk not in pks:
+                return
+            pks.remove(allocation_user_pk)
+            if pks:
+                pending.args = repr((pks,))
+                pending.save()
+            else:
+                pending.delete()
+
+
 @receiver(allocation_activate)
 @receiver(allocation_change_approved)
 def activate_allocation_receiver(sender, **kwargs):
@@ -32,7 +127,12 @@ def activate_allocation_receiver(sender, **kwargs):
     # Note(knikolla): Only run this task using Django-Q if a qcluster has
     # been configured.
     if is_async():
-        async_task(activate_allocation, allocation_pk)
+        async_task_coalesced(
+            f"allocation-{allocation_pk}",
+            activate_allocation,
+            allocation_pk,
+            allocation_pk=allocation_pk,
+        )
     else:
         activate_allocation(allocation_pk)
 
@@ -40,13 +140,28 @@ def activate_allocation_receiver(sender, **kwargs):
 @receiver(allocation_disable)
 def allocation_disable_receiver(sender, **kwargs):
     allocation_pk = kwargs.get("allocation_pk")
-    disable_allocation(allocation_pk)
+    # Note: Activation and disabling of an allocation share a pending task,
+    # so whichever was requested last is the one that runs.
+    if is_async():
+        async_task_coalesced(
+            f"allocation-{allocation_pk}",
+            disable_allocation,
+            allocation_pk,
+            allocation_pk=allocation_pk,
+        )
+    else:
+        disable_allocation(allocation_pk)
 
 
 @receiver(allocation_activate_user)
 def activate_allocation_user_receiver(sender, **kwargs):
     allocation_user_pk = kwargs.get("allocation_user_pk")
     if is_async():
+        # A removal of this user that is still waiting to be batched would
+        # otherwise run after, and undo, this addition.
+        _discard_pending_user_removal(
+            _get_allocation_pk(allocation_user_pk), allocation_user_pk
+        )
         async_task(add_user_to_allocation, allocation_user_pk)
     else:
         add_user_to_allocation(allocation_user_pk)
@@ -55,4 +170,15 @@ def activate_allocation_user_receiver(sender, **kwargs):
 @receiver(allocation_remove_user)
 def allocation_remove_user_receiver(sender, **kwargs):
     allocation_user_pk = kwargs.get("allocation_user_pk")
-    remove_user_from_allocation(allocation_user_pk)
+    if is_async():
+        # Removals for the same allocation are batched into a single task.
+        allocation_pk = _get_allocation_pk(allocation_user_pk)
+        async_task_coalesced(
+            f"remove_users_from_allocation-{allocation_pk}",
+            remove_users_from_allocation,
+            [allocation_user_pk],
+            allocation_pk=allocation_pk,
+            merge_args=_merge_allocation_user_pks,
+        )
+    else:
+        remove_user_from_allocation(allocation_user_pk)
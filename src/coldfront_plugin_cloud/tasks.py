@@ -1,4 +1,6 @@
 import datetime
+import functools
+import importlib
 import logging
 import time
 
@@ -7,28 +9,40 @@ from coldfront.core.allocation.models import Allocation, AllocationUser
 from coldfront_plugin_cloud import (
     attributes,
     base,
-    openstack,
-    openshift,
-    esi,
-    openshift_vm,
     utils,
 )
 
 logger = logging.getLogger(__name__)
 
+STATES_TO_VALIDATE = ["Active", "Active (Needs Renewal)"]
+
+# Allocators by resource type name, as "module:class". Their modules import the
+# cloud clients, so they are only imported once an allocation needs them.
+ALLOCATORS = {
+    "openstack": "coldfront_plugin_cloud.openstack:OpenStackResourceAllocator",
+    "openshift": "coldfront_plugin_cloud.openshift:OpenShiftResourceAllocator",
+    "esi": "coldfront_plugin_cloud.esi:ESIResourceAllocator",
+    "openshift virtualization": (
+        "coldfront_plugin_cloud.openshift_vm:OpenShiftVMResourceAllocator"
+    ),
+}
+
+
+@functools.cache
+def get_allocator_class(resource_type) -> type[base.ResourceAllocator] | None:
+    """Returns the allocator of a resource type, importing it if needed."""
+    if not (path := ALLOCATORS.get(resource_type.lower())):
+        return None
+    module_name, class_name = path.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
 
 def find_allocator(allocation) -> base.ResourceAllocator:
-    allocators = {
-        "openstack": openstack.OpenStackResourceAllocator,
-        "openshift": openshift.OpenShiftResourceAllocator,
-        "esi": esi.ESIResourceAllocator,
-        "openshift virtualization": openshift_vm.OpenShiftVMResourceAllocator,
-    }
     # TODO(knikolla): It doesn't seem to be possible to select multiple resources
     # when requesting a new allocation, so why is this multivalued?
     # Does it have to do with linked resources?
     resource = allocation.resources.first()
-    if allocator_class := allocators.get(resource.resource_type.name.lower()):
+    if allocator_class := get_allocator_class(resource.resource_type.name):
         return allocator_class(resource, allocation)
 
 
@@ -119,12 +133,92 @@ def add_user_to_allocation(allocation_user_pk):
 
 
 def remove_user_from_allocation(allocation_user_pk):
-    allocation_user = AllocationUser.objects.get(pk=allocation_user_pk)
-    allocation = allocation_user.allocation
+    remove_users_from_allocation([allocation_user_pk])
+
+
+def remove_users_from_allocation(allocation_user_pks):
+    allocation_users = AllocationUser.objects.filter(
+        pk__in=allocation_user_pks
+    ).select_related("allocation", "user")
+
+    usernames_by_allocation = {}
+    for allocation_user in allocation_users:
+        usernames_by_allocation.setdefault(allocation_user.allocation, []).append(
+            allocation_user.user.username
+        )
+
+    for allocation, usernames in usernames_by_allocation.items():
+        if allocator := find_allocator(allocation):
+            if project_id := allocation.get_attribute(attributes.ALLOCATION_PROJECT_ID):
+                allocator.remove_roles_bulk(usernames, project_id)
+            else:
+                logger.warning("No project has been created. Nothing to disable.")
+
+
+def check_institution_specific_code(allocation, apply):
+    attr = attributes.ALLOCATION_INSTITUTION_SPECIFIC_CODE
+    isc = allocation.get_attribute(attr)
+    if not isc:
+        alloc_str = f'{allocation.pk} of project "{allocation.project.title}"'
+        msg = f'Attribute "{attr}" missing on allocation {alloc_str}'
+        logger.warning(msg)
+        if apply:
+            utils.set_attribute_on_allocation(allocation, attr, "N/A")
+            logger.warning(f'Attribute "{attr}" added to allocation {alloc_str}')
+
+
+def validate_project(allocator, allocation, apply=True) -> bool:
+    """Validates an allocation and its project against their expected state,
+    applying the expected state if apply is set.
+
+    Returns whether the project was found and is now in its expected state,
+    which it is not when it differed from it without apply set."""
+    logger.debug(f"Starting resource validation for {allocator.allocation_str}.")
+    check_institution_specific_code(allocation, apply)
+
+    project_id = allocation.get_attribute(attributes.ALLOCATION_PROJECT_ID)
+
+    # Check project ID is set
+    if not project_id:
+        logger.error(f"{allocator.allocation_str} is active but has no Project ID set.")
+        return False
+
+    # Check project exists in remote cluster
+    try:
+        allocator.get_project(project_id)
+    except allocator.project_not_found_errors:
+        logger.error(
+            f"{allocator.allocation_str} has Project ID {project_id}. But"
+            f" no project found in {allocator.resource.name}."
+        )
+        return False
+
+    failed_validation = allocator.set_project_configuration(project_id, apply=apply)
+    return apply or not failed_validation
+
+
+def validate_allocation(allocation_pk, apply=True) -> bool:
+    allocation = Allocation.objects.select_related("status").get(pk=allocation_pk)
+    if allocation.status.name not in STATES_TO_VALIDATE:
+        logger.info(
+            f"Allocation {allocation_pk} is {allocation.status.name}. Nothing to validate."
+        )
+        return False
 
     if allocator := find_allocator(allocation):
-        if project_id := allocation.get_attribute(attributes.ALLOCATION_PROJECT_ID):
-            username = allocation_user.user.username
-            allocator.remove_role_from_user(username, project_id)
-        else:
-            logger.warning("No project has been created. Nothing to disable.")
+        return validate_project(allocator, allocation, apply)
+    return False
+
+
+def validate_allocations(allocation_pks, apply=True) -> dict[int, bool]:
+    """Validates a chunk of allocations, returning {allocation pk: validated}.
+
+    A failure to validate one allocation does not stop the others."""
+    results = {}
+    for allocation_pk in allocation_pks:
+        try:
+            results[allocation_pk] = validate_allocation(allocation_pk, apply)
+        except Exception as e:
+            logger.error(f"Failed to validate allocation {allocation_pk}: {e}")
+            results[allocation_pk] = False
+    return results
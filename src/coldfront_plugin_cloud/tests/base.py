@@ -2,7 +2,9 @@ import os
 from os import devnull
 import sys
 import uuid
+from unittest import mock
 
+import freezegun
 from django.test import TestCase
 
 from coldfront.core.allocation.models import (
@@ -24,6 +26,15 @@ from coldfront.core.resource.models import Resource
 from coldfront.core.field_of_science.models import FieldOfScience
 from django.core.management import call_command
 
+from coldfront_plugin_cloud import openstack, tasks, utils
+from coldfront_plugin_cloud.tests.fakes.openshift import FakeOpenShiftServer
+from coldfront_plugin_cloud.tests.fakes.openstack import FakeOpenStackServer
+
+# The kubernetes client imports its models on first access, which freezegun
+# triggers when scanning modules, defining them with frozen datetimes and
+# leaving the time frozen when that fails.
+freezegun.configure(extend_ignore_list=["kubernetes"])
+
 
 class TestBase(TestCase):
     @classmethod
@@ -38,6 +49,11 @@ class TestBase(TestCase):
         # For testing we can validate allocations with this status
         AllocationStatusChoice.objects.get_or_create(name="Active (Needs Renewal)")
 
+    def setUp(self) -> None:
+        super().setUp()
+        # Resources of previous tests may share the primary key of new ones
+        openstack.clear_caches()
+
     @staticmethod
     def new_user(username=None) -> User:
         username = username or f"{uuid.uuid4().hex}@example.com"
@@ -155,3 +171,55 @@ class TestBase(TestCase):
             is_selectable=True, description=description
         )
         return fos
+
+    def patch_env(self, **env):
+        patcher = mock.patch.dict("os.environ", env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def new_fake_openstack_resource(self, **kwargs):
+        server = FakeOpenStackServer(**kwargs).start()
+        self.addCleanup(server.stop)
+        public_network = server.create_network_resource(
+            "networks", name="public", **{"router:external": True}
+        )
+        with mock.patch.dict(
+            "os.environ", {"OPENSTACK_PUBLIC_NETWORK_ID": public_network["id"]}
+        ):
+            resource = self.new_openstack_resource(auth_url=server.url)
+
+        var_name = utils.env_safe_name(resource.name)
+        self.patch_env(
+            **{
+                f"OPENSTACK_{var_name}_APPLICATION_CREDENTIAL_ID": "fake-id",
+                f"OPENSTACK_{var_name}_APPLICATION_CREDENTIAL_SECRET": "fake-secret",
+            }
+        )
+        call_command("register_default_quotas", apply=True)
+        return server, resource
+
+    def new_fake_openshift_resource(self, **kwargs):
+        server = FakeOpenShiftServer(**kwargs).start()
+        self.addCleanup(server.stop)
+        resource = self.new_openshift_resource(api_url=server.url)
+        var_name = utils.env_safe_name(resource.name)
+        self.patch_env(**{f"OPENSHIFT_{var_name}_TOKEN": "fake-token"})
+        call_command("register_default_quotas", apply=True)
+        return server, resource
+
+    def generate_allocations(self, resource, count, users_per_allocation=3):
+        """Creates count active allocations on resource, each with a PI and
+        users_per_allocation other users, and provisions them."""
+        allocations = []
+        for _ in range(count):
+            pi = self.new_user()
+            project = self.new_project(pi=pi)
+            allocation = self.new_allocation(project, resource, 1)
+            tasks.activate_allocation(allocation.pk)
+            for _ in range(users_per_allocation):
+                user = self.new_user()
+                self.new_project_user(user, project, role="User")
+                allocation_user = self.new_allocation_user(allocation, user)
+                tasks.add_user_to_allocation(allocation_user.pk)
+            allocations.append(allocation)
+        return allocations
@@ -0,0 +1,162 @@
+"""Helpers to benchmark the plugin against the fake OpenStack and OpenShift
+servers.
+
+The number of synthetic allocations is set with BENCHMARK_ALLOCATIONS
+(default 100). Results are compared against baseline.json, keyed by the
+benchmark name and number of allocations, and a benchmark fails when any of
+its metrics is worse than the baseline by more than the tolerance of that
+metric, or when there is no baseline for it. When CI=true, timings are only
+reported, as they vary too much between runners. Setting
+BENCHMARK_UPDATE_BASELINE=true records the results as the new baseline
+instead.
+"""
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import NamedTuple
+
+from django.db import connection
+
+from coldfront_plugin_cloud.management import mixins
+from coldfront_plugin_cloud.tests import base
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def get_allocation_count():
+    return int(os.getenv("BENCHMARK_ALLOCATIONS", 100))
+
+
+class Result(NamedTuple):
+    name: str
+    allocations: int
+    seconds: float
+    queries: int
+    backend_calls: int | None = None
+    peak_memory: int | None = None
+
+    @property
+    def key(self):
+        return f"{self.name}[{self.allocations}]"
+
+    @property
+    def metrics(self):
+        metrics = {
+            "allocations_per_second": self.allocations / self.seconds,
+            "queries_per_allocation": self.queries / self.allocations,
+        }
+        if self.backend_calls is not None:
+            metrics["backend_calls_per_allocation"] = (
+                self.backend_calls / self.allocations
+            )
+        if self.peak_memory is not None:
+            metrics["peak_memory_kib"] = self.peak_memory / 1024
+        return metrics
+
+
+# Metrics where higher is better, the others are better when lower
+HIGHER_IS_BETTER = {"allocations_per_second"}
+
+# Metrics measured by wall clock
+TIMING_METRICS = {"allocations_per_second"}
+
+
+def load_baseline():
+    with open(BASELINE_FILE) as f:
+        return json.load(f)
+
+
+def save_baseline(baseline):
+    with open(BASELINE_FILE, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def get_report_only_metrics():
+    """Wall clock timings vary too much between CI runners to gate on, so
+    there they are only reported."""
+    if os.getenv("CI", "false").lower() == "true":
+        return TIMING_METRICS
+    return set()
+
+
+def compare(result: Result, baseline) -> dict[str | None, str]:
+    """Returns a description of each metric of result that regressed, keyed
+    by the metric, or keyed by None when result has no baseline."""
+    expected = baseline["results"].get(result.key)
+    if expected is None:
+        return {
+            None: f"no baseline is recorded for {result.allocations} allocations,"
+            " record one with BENCHMARK_UPDATE_BASELINE=true"
+        }
+
+    regressions = {}
+    for metric, value in result.metrics.items():
+        if metric not in expected:
+            regressions[metric] = f"{metric} has no baseline"
+            continue
+
+        tolerance = baseline["tolerance"][metric]
+        if metric in HIGHER_IS_BETTER:
+            regressed = value < expected[metric] * (1 - tolerance)
+        else:
+            regressed = value > expected[metric] * (1 + tolerance)
+        if regressed:
+            regressions[metric] = (
+                f"{metric} is {value:.2f}, the baseline is {expected[metric]:.2f}"
+                f" with a tolerance of {tolerance:.0%}"
+            )
+    return regressions
+
+
+class BenchmarkBase(base.TestBase):
+    def measure(self, name, count, func, server=None, trace_memory=False) -> Result:
+        """Runs func, measuring its wall time and database queries, as well as
+        the calls to server and the peak of traced memory if requested."""
+        calls = len(server.requests) if server else None
+        if trace_memory:
+            tracemalloc.start()
+        try:
+            queries = mixins.QueryCounter()
+            with connection.execute_wrapper(queries):
+                start = time.perf_counter()
+                func()
+                seconds = time.perf_counter() - start
+            peak_memory = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+
+        return Result(
+            name,
+            count,
+            seconds,
+            len(queries),
+            backend_calls=len(server.requests) - calls if server else None,
+            peak_memory=peak_memory,
+        )
+
+    def check_result(self, result: Result):
+        metrics = ", ".join(f"{k}={v:.2f}" for k, v in result.metrics.items())
+        sys.stderr.write(f"\n{result.key}: {metrics}\n")
+
+        baseline = load_baseline()
+        if os.getenv("BENCHMARK_UPDATE_BASELINE", "false").lower() == "true":
+            baseline["results"][result.key] = {
+                k: round(v, 2) for k, v in result.metrics.items()
+            }
+            save_baseline(baseline)
+            return
+
+        regressions = compare(result, baseline)
+        report_only = get_report_only_metrics()
+        for metric in report_only & regressions.keys():
+            sys.stderr.write(
+                f"WARNING: {result.key} regressed: {regressions.pop(metric)}"
+                " (reported only)\n"
+            )
+        if regressions:
+            self.fail(f"{result.key} regressed: " + "; ".join(regressions.values()))
@@ -0,0 +1,66 @@
+import contextlib
+import datetime
+import io
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+import pytz
+from django.core.management import call_command
+
+from coldfront_plugin_cloud import attributes, utils
+from coldfront_plugin_cloud.tests.benchmarks import base
+from coldfront_plugin_cloud.tests.fakes import generators
+
+
+class TestStorageBillingBenchmark(base.BenchmarkBase):
+    start = pytz.utc.localize(datetime.datetime(2020, 3, 1))
+    end = pytz.utc.localize(datetime.datetime(2020, 4, 1))
+
+    def setUp(self) -> None:
+        super().setUp()
+        utils.load_outages_from_nerc_rates.cache_clear()
+        self.addCleanup(utils.load_outages_from_nerc_rates.cache_clear)
+
+    def test_storage_invoice(self):
+        count = base.get_allocation_count()
+        resources = [
+            self.new_openstack_resource(internal_name="stack"),
+            self.new_openshift_resource(internal_name="ocp-prod"),
+        ]
+        call_command("register_default_quotas", apply=True)
+        generator = generators.BillingHistoryGenerator(self.start, self.end)
+        for i, resource in enumerate(resources):
+            generator.generate(
+                resource, count // len(resources) + (i < count % len(resources))
+            )
+        outages = generator.generate_outages(
+            [r.get_attribute(attributes.RESOURCE_CLUSTER_NAME) for r in resources]
+        )
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "invoices.csv")
+
+            def run_invoice():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    call_command(
+                        "calculate_storage_gb_hours",
+                        start=self.start,
+                        end=self.end,
+                        invoice_month="2020-03",
+                        output=output,
+                        openstack_nese_gb_rate=Decimal("0.000009"),
+                        openshift_nese_gb_rate=Decimal("0.000009"),
+                        openshift_ibm_gb_rate=Decimal("0.000009"),
+                    )
+
+            with mock.patch.object(utils, "_OUTAGES_DATA", outages):
+                result = self.measure(
+                    "calculate_storage_gb_hours", count, run_invoice, trace_memory=True
+                )
+
+            with open(output) as f:
+                self.assertGreater(len(f.readlines()), 1)
+
+        self.check_result(result)
@@ -0,0 +1,26 @@
+from django.core.management import call_command
+
+from coldfront_plugin_cloud.tests.benchmarks import base
+
+
+class TestValidateAllocationsBenchmark(base.BenchmarkBase):
+    def run_benchmark(self, name, server, resource):
+        count = base.get_allocation_count()
+        self.generate_allocations(resource, count)
+
+        result = self.measure(
+            name,
+            count,
+            lambda: call_command("validate_allocations", apply=True),
+            server=server,
+        )
+
+        self.check_result(result)
+
+    def test_openstack(self):
+        server, resource = self.new_fake_openstack_resource()
+        self.run_benchmark("validate_allocations_openstack", server, resource)
+
+    def test_openshift(self):
+        server, resource = self.new_fake_openshift_resource()
+        self.run_benchmark("validate_allocations_openshift", server, resource)
@@ -0,0 +1,57 @@
+import abc
+import http.server
+import threading
+from typing import Callable
+
+
+class FakeServer(abc.ABC):
+    """HTTP server listening on localhost in a background thread.
+
+    latency is added to the handling of every request, either as seconds or
+    a function of the method and path returning seconds. Handled requests
+    are recorded in requests as (method, path) tuples.
+    """
+
+    name = "fake-server"
+
+    def __init__(self, latency: float | Callable[[str, str], float] = 0):
+        self.latency = latency
+        self.requests = []
+        self._server = None
+        self._thread = None
+
+    @abc.abstractmethod
+    def make_handler(self) -> type[http.server.BaseHTTPRequestHandler]:
+        pass
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._server = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", 0), self.make_handler()
+        )
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name=self.name, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def get_latency(self, method, path):
+        if callable(self.latency):
+            return self.latency(method, path)
+        return self.latency
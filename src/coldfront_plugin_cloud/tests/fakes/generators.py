@@ -0,0 +1,191 @@
+"""Generators of synthetic ColdFront data for benchmarks and tests."""
+
+import datetime
+import json
+import random
+import uuid
+
+from coldfront.core.allocation.models import (
+    Allocation,
+    AllocationAttribute,
+    AllocationAttributeChangeRequest,
+    AllocationAttributeType,
+    AllocationChangeRequest,
+    AllocationChangeStatusChoice,
+    AllocationStatusChoice,
+)
+from coldfront.core.project.models import Project, ProjectStatusChoice
+from django.contrib.auth.models import User
+
+from coldfront_plugin_cloud import attributes
+from coldfront_plugin_cloud.management.commands.register_default_quotas import (
+    STORAGE_RESOURCE_TYPE_NAME,
+)
+from coldfront_plugin_cloud.models.quota_models import QuotaSpecs
+
+# Storage quota sizes in GB, and how likely each one is
+STORAGE_SIZES = [0, 1, 5, 10, 20, 50, 100, 500, 1000]
+STORAGE_SIZE_WEIGHTS = [2, 10, 20, 25, 15, 12, 8, 5, 3]
+
+# How likely an allocation is to have 0 to 4 change requests in a month
+CHANGE_REQUEST_WEIGHTS = [60, 25, 10, 4, 1]
+
+MAX_APPROVAL_DELAY = datetime.timedelta(hours=48)
+MAX_OUTAGE_DURATION = datetime.timedelta(hours=12)
+
+
+class SyntheticOutages:
+    """Outages by service, standing in for the outages data of nerc-rates."""
+
+    def __init__(self, outages: dict[str, list[tuple]]):
+        self.outages = outages
+
+    def get_outages_during(self, start, end, affected_service):
+        start = datetime.datetime.fromisoformat(start)
+        end = datetime.datetime.fromisoformat(end)
+        return [
+            (outage_start, outage_end)
+            for outage_start, outage_end in self.outages.get(affected_service, [])
+            if outage_start < end and outage_end > start
+        ]
+
+
+class BillingHistoryGenerator:
+    """Generates allocations with a history of storage quota changes during
+    the billing period from start to end.
+
+    Each allocation has all the storage quotas of its resource. Most are
+    set before the period and some during it, some are changed through
+    approved change requests, increasing or decreasing them, and a few
+    allocations are revoked during the period. Histories are backdated, so
+    they can be generated at the current time.
+    """
+
+    def __init__(self, start, end, seed=0, revoked_ratio=0.05):
+        self.start = start
+        self.end = end
+        self.random = random.Random(seed)
+        self.revoked_ratio = revoked_ratio
+
+        self.active = AllocationStatusChoice.objects.get(name="Active")
+        self.revoked = AllocationStatusChoice.objects.get(name="Revoked")
+        self.approved = AllocationChangeStatusChoice.objects.get(name="Approved")
+        self.project_status = ProjectStatusChoice.objects.get(name="Active")
+        self.attribute_types = {
+            t.name: t for t in AllocationAttributeType.objects.all()
+        }
+
+    def random_time(self, start, end):
+        return start + (end - start) * self.random.random()
+
+    def random_size(self):
+        return self.random.choices(STORAGE_SIZES, STORAGE_SIZE_WEIGHTS)[0]
+
+    def generate(self, resource, count) -> list[Allocation]:
+        quotaspecs = QuotaSpecs.model_validate(
+            json.loads(resource.get_attribute(attributes.RESOURCE_QUOTA_RESOURCES))
+        )
+        storage_attributes = list(
+            quotaspecs.get_quotas_by_type(STORAGE_RESOURCE_TYPE_NAME)
+        )
+        return [
+            self.generate_allocation(resource, storage_attributes) for _ in range(count)
+        ]
+
+    def generate_allocation(self, resource, storage_attributes) -> Allocation:
+        name = uuid.uuid4().hex
+        pi = User.objects.create(
+            username=f"{name}@example.com", email=f"{name}@example.com"
+        )
+        project = Project.objects.create(title=name, pi=pi, status=self.project_status)
+        allocation = Allocation.objects.create(
+            project=project,
+            status=self.active,
+            quantity=1,
+            justification="Synthetic allocation for benchmarking",
+        )
+        allocation.resources.add(resource)
+        for attribute, value in [
+            (attributes.ALLOCATION_PROJECT_NAME, name),
+            (attributes.ALLOCATION_PROJECT_ID, name),
+            (attributes.ALLOCATION_INSTITUTION_SPECIFIC_CODE, "N/A"),
+        ]:
+            self.set_attribute(allocation, attribute, value, self.start)
+
+        for attribute in storage_attributes:
+            # Most quotas were set before the billing period
+            if self.random.random() < 0.7:
+                set_at = self.start - datetime.timedelta(
+                    days=self.random.randint(1, 365)
+                )
+            else:
+                set_at = self.random_time(self.start, self.end)
+            allocation_attribute = self.set_attribute(
+                allocation, attribute, self.random_size(), set_at
+            )
+
+            change_count = self.random.choices(
+                range(len(CHANGE_REQUEST_WEIGHTS)), CHANGE_REQUEST_WEIGHTS
+            )[0]
+            for requested_at in sorted(
+                self.random_time(max(set_at, self.start), self.end)
+                for _ in range(change_count)
+            ):
+                self.change_attribute(allocation_attribute, requested_at)
+
+        if self.random.random() < self.revoked_ratio:
+            allocation.status = self.revoked
+            allocation.save()
+            self.backdate(
+                allocation.history.first(), self.random_time(self.start, self.end)
+            )
+
+        return allocation
+
+    def set_attribute(self, allocation, attribute, value, at) -> AllocationAttribute:
+        allocation_attribute, _ = AllocationAttribute.objects.update_or_create(
+            allocation=allocation,
+            allocation_attribute_type=self.attribute_types[attribute],
+            defaults={"value": value},
+        )
+        self.backdate(allocation_attribute.history.first(), at)
+        return allocation_attribute
+
+    def change_attribute(self, allocation_attribute, requested_at):
+        """Requests a new value for an attribute and approves it."""
+        new_value = self.random_size()
+        change_request = AllocationChangeRequest.objects.create(
+            allocation=allocation_attribute.allocation,
+            status=self.approved,
+            justification="Synthetic change request for benchmarking",
+        )
+        AllocationAttributeChangeRequest.objects.create(
+            allocation_change_request=change_request,
+            allocation_attribute=allocation_attribute,
+            new_value=new_value,
+        )
+        self.backdate(change_request.history.first(), requested_at)
+
+        approved_at = min(
+            requested_at + MAX_APPROVAL_DELAY * self.random.random(), self.end
+        )
+        allocation_attribute.value = new_value
+        allocation_attribute.save()
+        self.backdate(allocation_attribute.history.first(), approved_at)
+
+    @staticmethod
+    def backdate(history_record, at):
+        # Updated through the queryset, as saving would set modified to now
+        type(history_record).objects.filter(pk=history_record.pk).update(
+            created=at, modified=at, history_date=at
+        )
+
+    def generate_outages(self, services, max_outages=3) -> SyntheticOutages:
+        outages = {}
+        for service in services:
+            outages[service] = []
+            for _ in range(self.random.randint(0, max_outages)):
+                outage_start = self.random_time(self.start, self.end)
+                outage_end = outage_start + MAX_OUTAGE_DURATION * self.random.random()
+                outages[service].append((outage_start, outage_end))
+        return SyntheticOutages(outages)
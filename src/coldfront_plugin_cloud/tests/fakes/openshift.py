@@ -0,0 +1,691 @@
+"""In-process fake of the Kubernetes and OpenShift APIs used by the plugin.
+
+The server implements discovery and the endpoints of the Namespace,
+ResourceQuota, LimitRange, Project, User, Identity, UserIdentityMapping and
+RoleBinding kinds, with paginated LISTs, watches and resourceVersion
+preconditions. It is plugged in by using its url as the OpenShift API URL of
+a resource:
+
+    with FakeOpenShiftServer(latency=0.01) as server:
+        resource = self.new_openshift_resource(api_url=server.url)
+"""
+
+import base64
+import copy
+import http.server
+import json
+import threading
+import time
+import urllib.parse
+import uuid
+from typing import Callable, NamedTuple
+
+from coldfront_plugin_cloud.tests.fakes import base
+
+
+class Kind(NamedTuple):
+    group: str
+    version: str
+    kind: str
+    plural: str
+    namespaced: bool
+
+    @property
+    def api_version(self):
+        return f"{self.group}/{self.version}" if self.group else self.version
+
+
+KINDS = [
+    Kind("", "v1", "Namespace", "namespaces", False),
+    Kind("", "v1", "ResourceQuota", "resourcequotas", True),
+    Kind("", "v1", "LimitRange", "limitranges", True),
+    Kind("project.openshift.io", "v1", "Project", "projects", False),
+    Kind("user.openshift.io", "v1", "User", "users", False),
+    Kind("user.openshift.io", "v1", "Identity", "identities", False),
+    Kind(
+        "user.openshift.io", "v1", "UserIdentityMapping", "useridentitymappings", False
+    ),
+    Kind("rbac.authorization.k8s.io", "v1", "RoleBinding", "rolebindings", True),
+]
+KINDS_BY_PATH = {(k.group, k.version, k.plural): k for k in KINDS}
+VERBS = ["create", "delete", "get", "list", "patch", "update", "watch"]
+
+# Number of past events a watch can resume from
+EVENT_HISTORY = 1000
+
+
+class ApiError(Exception):
+    def __init__(self, code, reason, message, name=None, kind=None):
+        super().__init__(message)
+        self.code = code
+        self.reason = reason
+        self.message = message
+        self.name = name
+        self.kind = kind
+
+    def to_status(self):
+        return {
+            "kind": "Status",
+            "apiVersion": "v1",
+            "metadata": {},
+            "status": "Failure",
+            "message": self.message,
+            "reason": self.reason,
+            "details": {"name": self.name, "kind": self.kind},
+            "code": self.code,
+        }
+
+
+def not_found(kind, name):
+    return ApiError(
+        404, "NotFound", f'{kind.plural} "{name}" not found', name, kind.plural
+    )
+
+
+def conflict(kind, name):
+    return ApiError(
+        409,
+        "Conflict",
+        f'Operation cannot be fulfilled on {kind.plural} "{name}": the object has'
+        f" been modified; please apply your changes to the latest version and"
+        f" try again",
+        name,
+        kind.plural,
+    )
+
+
+def _unescape_pointer(token):
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def apply_json_patch(obj, operations):
+    """Applies RFC 6902 add, remove, replace and test operations."""
+    for operation in operations:
+        *parents, last = [
+            _unescape_pointer(token) for token in operation["path"].split("/")[1:]
+        ]
+        target = obj
+        for token in parents:
+            target = target[int(token)] if isinstance(target, list) else target[token]
+
+        op = operation["op"]
+        if isinstance(target, list):
+            index = len(target) if last == "-" else int(last)
+            if op == "add":
+                target.insert(index, operation["value"])
+            elif op == "remove":
+                del target[index]
+            elif op == "replace":
+                target[index] = operation["value"]
+            elif op == "test" and target[index] != operation["value"]:
+                raise ApiError(422, "Invalid", f"test of {operation['path']} failed")
+        else:
+            if op in ("add", "replace"):
+                target[last] = operation["value"]
+            elif op == "remove":
+                del target[last]
+            elif op == "test" and target.get(last) != operation["value"]:
+                raise ApiError(422, "Invalid", f"test of {operation['path']} failed")
+    return obj
+
+
+def apply_merge_patch(obj, patch):
+    """Applies an RFC 7386 merge patch."""
+    if not isinstance(patch, dict):
+        return patch
+    if not isinstance(obj, dict):
+        obj = {}
+    for key, value in patch.items():
+        if value is None:
+            obj.pop(key, None)
+        else:
+            obj[key] = apply_merge_patch(obj.get(key), value)
+    return obj
+
+
+def match_labels(obj, label_selector):
+    labels = obj["metadata"].get("labels") or {}
+    for requirement in filter(None, (label_selector or "").split(",")):
+        if "!=" in requirement:
+            key, value = requirement.split("!=", 1)
+            if labels.get(key) == value:
+                return False
+        elif "=" in requirement:
+            key, value = requirement.replace("==", "=").split("=", 1)
+            if labels.get(key) != value:
+                return False
+        elif requirement.startswith("!"):
+            if requirement[1:] in labels:
+                return False
+        elif requirement not in labels:
+            return False
+    return True
+
+
+def match_fields(obj, field_selector):
+    for requirement in filter(None, (field_selector or "").split(",")):
+        key, value = requirement.split("=", 1)
+        if key == "metadata.name" and obj["metadata"]["name"] != value:
+            return False
+        if key == "metadata.namespace" and obj["metadata"].get("namespace") != value:
+            return False
+    return True
+
+
+class FakeOpenShiftServer(base.FakeServer):
+    """Fake Kubernetes and OpenShift API server, see FakeServer."""
+
+    name = "fake-openshift"
+
+    def __init__(self, latency: float | Callable[[str, str], float] = 0):
+        super().__init__(latency)
+        self._objects = {kind.plural: {} for kind in KINDS}
+        self._events = []
+        # "0" has a special meaning for watches, so it is never handed out
+        self._resource_version = 1
+        self._changed = threading.Condition()
+        self._stopped = False
+
+    def make_handler(self):
+        return _make_handler(self)
+
+    def stop(self):
+        with self._changed:
+            self._stopped = True
+            self._changed.notify_all()
+        super().stop()
+
+    # Storage
+
+    @property
+    def resource_version(self):
+        return str(self._resource_version)
+
+    def _record(self, kind, event_type, obj):
+        self._events.append((self._resource_version, kind.plural, event_type, obj))
+        del self._events[:-EVENT_HISTORY]
+        self._changed.notify_all()
+
+    def _store(self, kind, obj, event_type):
+        """Saves obj with a new resourceVersion. Requires self._changed."""
+        self._resource_version += 1
+        obj["metadata"]["resourceVersion"] = self.resource_version
+        key = (obj["metadata"].get("namespace"), obj["metadata"]["name"])
+        self._objects[kind.plural][key] = obj
+        self._record(kind, event_type, copy.deepcopy(obj))
+
+    def _delete(self, kind, key):
+        """Deletes an object, and the contents of namespaces. Requires
+        self._changed."""
+        obj = self._objects[kind.plural].pop(key)
+        self._resource_version += 1
+        obj["metadata"]["resourceVersion"] = self.resource_version
+        self._record(kind, "DELETED", obj)
+        if kind.plural == "namespaces":
+            for namespaced in filter(lambda k: k.namespaced, KINDS):
+                for child in [
+                    k for k in self._objects[namespaced.plural] if k[0] == key[1]
+                ]:
+                    self._delete(namespaced, child)
+        return obj
+
+    def get_object(self, plural, name, namespace=None):
+        """Returns a copy of a stored object, or None."""
+        with self._changed:
+            return copy.deepcopy(self._objects[plural].get((namespace, name)))
+
+    def put_object(self, plural, obj):
+        """Stores an object as is, e.g. to simulate a concurrent change."""
+        kind = next(k for k in KINDS if k.plural == plural)
+        obj = copy.deepcopy(obj)
+        obj.setdefault("apiVersion", kind.api_version)
+        obj.setdefault("kind", kind.kind)
+        with self._changed:
+            exists = (
+                obj["metadata"].get("namespace"),
+                obj["metadata"]["name"],
+            ) in self._objects[plural]
+            self._store(kind, obj, "MODIFIED" if exists else "ADDED")
+
+    def compact(self):
+        """Drops the event history, expiring the resourceVersion of watches."""
+        with self._changed:
+            self._events.clear()
+
+    # Discovery
+
+    def discovery(self, path):
+        if path == "/version":
+            return {"major": "1", "minor": "30", "gitVersion": "v1.30.0-fake"}
+        if path == "/api":
+            return {"kind": "APIVersions", "versions": ["v1"]}
+        if path == "/apis":
+            groups = sorted({(k.group, k.version) for k in KINDS if k.group})
+            return {
+                "kind": "APIGroupList",
+                "apiVersion": "v1",
+                "groups": [
+                    {
+                        "name": group,
+                        "versions": [
+                            {"groupVersion": f"{group}/{version}", "version": version}
+                        ],
+                        "preferredVersion": {
+                            "groupVersion": f"{group}/{version}",
+                            "version": version,
+                        },
+                    }
+                    for group, version in groups
+                ],
+            }
+
+        segments = path.strip("/").split("/")
+        if segments[0] == "api" and len(segments) == 2:
+            group, version = "", segments[1]
+        elif segments[0] == "apis" and len(segments) == 3:
+            group, version = segments[1:]
+        else:
+            return None
+        kinds = [k for k in KINDS if (k.group, k.version) == (group, version)]
+        if not kinds:
+            return None
+        return {
+            "kind": "APIResourceList",
+            "apiVersion": "v1",
+            "groupVersion": kinds[0].api_version,
+            "resources": [
+                {
+                    "name": k.plural,
+                    "singularName": k.kind.lower(),
+                    "namespaced": k.namespaced,
+                    "kind": k.kind,
+                    "verbs": VERBS,
+                }
+                for k in kinds
+            ],
+        }
+
+    # Resources
+
+    def parse_path(self, path):
+        """Returns (kind, namespace, name) of a resource path, or None."""
+        segments = path.strip("/").split("/")
+        if segments[0] == "api" and len(segments) >= 3:
+            group, version, rest = "", segments[1], segments[2:]
+        elif segments[0] == "apis" and len(segments) >= 4:
+            group, version, rest = segments[1], segments[2], segments[3:]
+        else:
+            return None
+
+        namespace = None
+        if rest[0] == "namespaces" and len(rest) >= 3:
+            namespace, rest = rest[1], rest[2:]
+        if len(rest) > 2 or not (kind := KINDS_BY_PATH.get((group, version, rest[0]))):
+            return None
+        return kind, namespace, rest[1] if len(rest) == 2 else None
+
+    def _to_project(self, namespace):
+        project = copy.deepcopy(namespace)
+        project["apiVersion"] = "project.openshift.io/v1"
+        project["kind"] = "Project"
+        return project
+
+    def _storage_kind(self, kind):
+        # Projects are a view of namespaces
+        if kind.plural == "projects":
+            return KINDS_BY_PATH[("", "v1", "namespaces")]
+        return kind
+
+    def _view(self, kind, obj):
+        return self._to_project(obj) if kind.plural == "projects" else obj
+
+    def list(self, kind, namespace, query):
+        limit = int(query.get("limit", 0))
+        start = None
+        if token := query.get("continue"):
+            start = tuple(json.loads(base64.urlsafe_b64decode(token)))
+
+        storage = self._storage_kind(kind)
+        with self._changed:
+            # Objects are listed in the order of their (namespace, name)
+            keys = sorted(
+                (key[0] or "", key[1])
+                for key in self._objects[storage.plural]
+                if namespace is None or key[0] == namespace
+            )
+            items = [
+                self._view(
+                    kind,
+                    copy.deepcopy(self._objects[storage.plural][(ns or None, name)]),
+                )
+                for ns, name in keys
+                if start is None or (ns, name) > start
+            ]
+            resource_version = self.resource_version
+
+        items = [
+            item
+            for item in items
+            if match_labels(item, query.get("labelSelector"))
+            and match_fields(item, query.get("fieldSelector"))
+        ]
+        metadata = {"resourceVersion": resource_version}
+        if limit and len(items) > limit:
+            items = items[:limit]
+            last = items[-1]["metadata"]
+            metadata["continue"] = base64.urlsafe_b64encode(
+                json.dumps([last.get("namespace") or "", last["name"]]).encode()
+            ).decode()
+        return {
+            "kind": f"{kind.kind}List",
+            "apiVersion": kind.api_version,
+            "metadata": metadata,
+            "items": items,
+        }
+
+    def get(self, kind, namespace, name):
+        storage = self._storage_kind(kind)
+        with self._changed:
+            obj = self._objects[storage.plural].get((namespace, name))
+            if obj is None:
+                raise not_found(kind, name)
+            return self._view(kind, copy.deepcopy(obj))
+
+    def create(self, kind, namespace, body):
+        body = copy.deepcopy(body)
+        metadata = body.setdefault("metadata", {})
+        if kind.plural == "identities":
+            metadata.setdefault(
+                "name", f"{body['providerName']}:{body['providerUserName']}"
+            )
+        if kind.plural == "useridentitymappings":
+            return self._create_useridentitymapping(kind, body)
+        name = metadata.get("name")
+        if not name:
+            raise ApiError(422, "Invalid", "metadata.name: Required value")
+
+        storage = self._storage_kind(kind)
+        with self._changed:
+            if kind.namespaced and (None, namespace) not in self._objects["namespaces"]:
+                raise not_found(KINDS_BY_PATH[("", "v1", "namespaces")], namespace)
+            if (namespace, name) in self._objects[storage.plural]:
+                raise ApiError(
+                    409,
+                    "AlreadyExists",
+                    f'{kind.plural} "{name}" already exists',
+                    name,
+                    kind.plural,
+                )
+
+            body["apiVersion"] = storage.api_version
+            body["kind"] = storage.kind
+            metadata.pop("resourceVersion", None)
+            metadata["uid"] = str(uuid.uuid4())
+            metadata["creationTimestamp"] = time.strftime(
+                "%Y-%m-%dT%H:%M:%SZ", time.gmtime()
+            )
+            if kind.namespaced:
+                metadata["namespace"] = namespace
+            if storage.plural == "namespaces":
+                body.setdefault("spec", {"finalizers": ["kubernetes"]})
+                body["status"] = {"phase": "Active"}
+            if kind.plural == "users":
+                body.setdefault("identities", [])
+            self._store(storage, body, "ADDED")
+            if kind.plural == "resourcequotas":
+                self._update_quota_status(namespace)
+            return self._view(kind, copy.deepcopy(body))
+
+    def _update_quota_status(self, namespace):
+        quotas = [key for key in self._objects["resourcequotas"] if key[0] == namespace]
+        kind = KINDS_BY_PATH[("", "v1", "resourcequotas")]
+        for key in quotas:
+            quota = copy.deepcopy(self._objects["resourcequotas"][key])
+            hard = quota.get("spec", {}).get("hard") or {}
+            used = {resource: "0" for resource in hard}
+            if "resourcequotas" in hard:
+                used["resourcequotas"] = str(len(quotas))
+            quota["status"] = {"hard": dict(hard), "used": used}
+            self._store(kind, quota, "MODIFIED")
+
+    def _create_useridentitymapping(self, kind, body):
+        users = KINDS_BY_PATH[("user.openshift.io", "v1", "users")]
+        identities = KINDS_BY_PATH[("user.openshift.io", "v1", "identities")]
+        username = body["user"]["name"]
+        identity_name = body["identity"]["name"]
+        with self._changed:
+            user = self._objects["users"].get((None, username))
+            identity = self._objects["identities"].get((None, identity_name))
+            if user is None:
+                raise not_found(users, username)
+            if identity is None:
+                raise not_found(identities, identity_name)
+            if identity.get("user"):
+                raise ApiError(
+                    409,
+                    "AlreadyExists",
+                    f'useridentitymappings "{identity_name}" already exists',
+                    identity_name,
+                    kind.plural,
+                )
+
+            identity = copy.deepcopy(identity)
+            identity["user"] = {"name": username, "uid": user["metadata"]["uid"]}
+            self._store(identities, identity, "MODIFIED")
+            user = copy.deepcopy(user)
+            user["identities"] = [*(user.get("identities") or []), identity_name]
+            self._store(users, user, "MODIFIED")
+
+        return {
+            "apiVersion": kind.api_version,
+            "kind": kind.kind,
+            "metadata": {"name": identity_name},
+            "identity": {"name": identity_name},
+            "user": {"name": username},
+        }
+
+    def update(self, kind, namespace, name, get_updated):
+        """Replaces an object with get_updated(current copy), rejecting the
+        update if its resourceVersion is not the current one."""
+        storage = self._storage_kind(kind)
+        with self._changed:
+            current = self._objects[storage.plural].get((namespace, name))
+            if current is None:
+                raise not_found(kind, name)
+            updated = get_updated(self._view(kind, copy.deepcopy(current)))
+            updated_version = updated.get("metadata", {}).get("resourceVersion")
+            if (
+                updated_version
+                and updated_version != current["metadata"]["resourceVersion"]
+            ):
+                raise conflict(kind, name)
+
+            updated["apiVersion"] = storage.api_version
+            updated["kind"] = storage.kind
+            for immutable in ("name", "namespace", "uid", "creationTimestamp"):
+                if immutable in current["metadata"]:
+                    updated["metadata"][immutable] = current["metadata"][immutable]
+            self._store(storage, updated, "MODIFIED")
+            if kind.plural == "resourcequotas":
+                self._update_quota_status(namespace)
+            return self._view(
+                kind, copy.deepcopy(self._objects[storage.plural][(namespace, name)])
+            )
+
+    def patch(self, kind, namespace, name, body, content_type):
+        if content_type.startswith("application/json-patch+json"):
+            return self.update(
+                kind, namespace, name, lambda obj: apply_json_patch(obj, body)
+            )
+        return self.update(
+            kind, namespace, name, lambda obj: apply_merge_patch(obj, body)
+        )
+
+    def delete(self, kind, namespace, name):
+        storage = self._storage_kind(kind)
+        with self._changed:
+            if (namespace, name) not in self._objects[storage.plural]:
+                raise not_found(kind, name)
+            self._delete(storage, (namespace, name))
+            if kind.plural == "resourcequotas":
+                self._update_quota_status(namespace)
+        return {
+            "kind": "Status",
+            "apiVersion": "v1",
+            "metadata": {},
+            "status": "Success",
+            "details": {"name": name, "kind": kind.plural},
+        }
+
+    def watch(self, kind, namespace, query, write_event):
+        """Calls write_event with the events of kind after the requested
+        resourceVersion until the watch times out or the server stops."""
+        storage = self._storage_kind(kind)
+        deadline = time.monotonic() + int(query.get("timeoutSeconds") or 1800)
+
+        def matches(obj):
+            return (
+                (namespace is None or obj["metadata"].get("namespace") == namespace)
+                and match_labels(obj, query.get("labelSelector"))
+                and match_fields(obj, query.get("fieldSelector"))
+            )
+
+        with self._changed:
+            resource_version = query.get("resourceVersion")
+            if resource_version in (None, "", "0"):
+                # Start with the current state of the objects
+                pending = [
+                    ("ADDED", self._view(kind, copy.deepcopy(obj)))
+                    for obj in self._objects[storage.plural].values()
+                    if matches(obj)
+                ]
+                last_seen = self._resource_version
+            else:
+                last_seen = int(resource_version)
+                oldest = (
+                    self._events[0][0] if self._events else self._resource_version + 1
+                )
+                if last_seen < self._resource_version and last_seen < oldest - 1:
+                    write_event(
+                        "ERROR",
+                        ApiError(
+                            410,
+                            "Expired",
+                            f"too old resource version: {last_seen}",
+                        ).to_status(),
+                    )
+                    return
+                pending = []
+
+        while True:
+            for event_type, obj in pending:
+                write_event(event_type, obj)
+
+            with self._changed:
+                while not self._stopped and (
+                    not self._events or self._events[-1][0] <= last_seen
+                ):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return
+                    self._changed.wait(remaining)
+                if self._stopped:
+                    return
+                pending = [
+                    (event_type, self._view(kind, copy.deepcopy(obj)))
+                    for version, plural, event_type, obj in self._events
+                    if version > last_seen and plural == storage.plural and matches(obj)
+                ]
+                last_seen = self._events[-1][0]
+
+
+def _make_handler(server: FakeOpenShiftServer):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, code, body):
+            payload = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def read_body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length)) if length else None
+
+        def handle_request(self, method):
+            url = urllib.parse.urlsplit(self.path)
+            query = dict(urllib.parse.parse_qsl(url.query))
+            body = self.read_body()
+            server.requests.append((method, url.path))
+            if latency := server.get_latency(method, url.path):
+                time.sleep(latency)
+
+            try:
+                if method == "GET" and (document := server.discovery(url.path)):
+                    return self.send_json(200, document)
+                if not (parsed := server.parse_path(url.path)):
+                    raise ApiError(404, "NotFound", f"{url.path} not found")
+                kind, namespace, name = parsed
+
+                if method == "GET" and query.get("watch") in ("true", "1"):
+                    return self.stream_watch(kind, namespace, query)
+                if method == "GET" and name:
+                    return self.send_json(200, server.get(kind, namespace, name))
+                if method == "GET":
+                    return self.send_json(200, server.list(kind, namespace, query))
+                if method == "POST" and not name:
+                    return self.send_json(201, server.create(kind, namespace, body))
+                if method == "PUT" and name:
+                    return self.send_json(
+                        200, server.update(kind, namespace, name, lambda _: body)
+                    )
+                if method == "PATCH" and name:
+                    content_type = self.headers.get("Content-Type", "")
+                    return self.send_json(
+                        200, server.patch(kind, namespace, name, body, content_type)
+                    )
+                if method == "DELETE" and name:
+                    return self.send_json(200, server.delete(kind, namespace, name))
+                raise ApiError(405, "MethodNotAllowed", f"{method} not allowed")
+            except ApiError as e:
+                self.send_json(e.code, e.to_status())
+
+        def stream_watch(self, kind, namespace, query):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def write_event(event_type, obj):
+                line = json.dumps({"type": event_type, "object": obj}).encode() + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+
+            try:
+                server.watch(kind, namespace, query, write_event)
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+
+        def do_GET(self):
+            self.handle_request("GET")
+
+        def do_POST(self):
+            self.handle_request("POST")
+
+        def do_PUT(self):
+            self.handle_request("PUT")
+
+        def do_PATCH(self):
+            self.handle_request("PATCH")
+
+        def do_DELETE(self):
+            self.handle_request("DELETE")
+
+    return Handler
@@ -0,0 +1,644 @@
+"""In-process fake of the OpenStack APIs used by the plugin.
+
+The server implements Keystone tokens with a service catalog, projects and
+their tags, users (including lookups by federated unique_id), roles and role
+assignments; Nova, Cinder and Neutron quotas; Neutron networks, subnets,
+routers and ports; and Swift account HEAD/POST. It is plugged in by using
+its url as the OpenStack Auth URL of a resource:
+
+    with FakeOpenStackServer(latency=0.01) as server:
+        resource = self.new_openstack_resource(auth_url=server.url)
+
+Any application credential is accepted and authenticates as the admin user
+in the admin project.
+"""
+
+import copy
+import datetime
+import http.server
+import json
+import re
+import threading
+import time
+import urllib.parse
+import uuid
+from typing import Callable, NamedTuple
+
+from coldfront_plugin_cloud.tests.fakes import base
+
+DEFAULT_DOMAIN = "default"
+TOKEN_LIFETIME = datetime.timedelta(hours=1)
+
+DEFAULT_QUOTAS = {
+    "compute": {
+        "instances": 10,
+        "cores": 20,
+        "ram": 51200,
+        "key_pairs": 100,
+        "metadata_items": 128,
+        "server_groups": 10,
+        "server_group_members": 10,
+    },
+    "volume": {
+        "volumes": 10,
+        "gigabytes": 1000,
+        "snapshots": 10,
+        "backups": 10,
+        "backup_gigabytes": 1000,
+        "per_volume_gigabytes": -1,
+        "groups": 10,
+    },
+    "network": {
+        "network": 100,
+        "subnet": 100,
+        "port": 500,
+        "router": 10,
+        "floatingip": 50,
+        "security_group": 10,
+        "security_group_rule": 100,
+    },
+}
+
+# Neutron collections and the key of their items in request and response bodies
+NETWORK_RESOURCES = {
+    "networks": "network",
+    "subnets": "subnet",
+    "routers": "router",
+    "ports": "port",
+}
+
+ID = "[^/]+"
+
+
+class ApiError(Exception):
+    def __init__(self, code, title, message):
+        super().__init__(message)
+        self.code = code
+        self.title = title
+        self.message = message
+
+    def to_body(self):
+        return {
+            "error": {"code": self.code, "title": self.title, "message": self.message}
+        }
+
+
+def not_found(kind, id):
+    return ApiError(404, "Not Found", f"Could not find {kind}: {id}.")
+
+
+def conflict(kind, name):
+    return ApiError(409, "Conflict", f"Duplicate {kind} with name {name}.")
+
+
+def unauthorized():
+    return ApiError(
+        401, "Unauthorized", "The request you have made requires authentication."
+    )
+
+
+def forbidden():
+    return ApiError(403, "Forbidden", "Access denied.")
+
+
+class Request(NamedTuple):
+    method: str
+    path: str
+    query: dict
+    headers: dict
+    body: dict | None
+    token: dict | None
+
+
+class Response(NamedTuple):
+    code: int
+    body: dict | None = None
+    headers: dict | None = None
+
+
+ROUTES = []
+
+
+def route(method, pattern, authenticated=True):
+    """Registers a handler for requests matching the path regex pattern. The
+    named groups of the pattern are passed as keyword arguments."""
+
+    def decorator(func):
+        ROUTES.append((method, re.compile(f"{pattern}/?"), authenticated, func))
+        return func
+
+    return decorator
+
+
+def _timestamp(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.000000Z")
+
+
+def _unique_ids(user):
+    for federated in user.get("federated") or []:
+        for protocol in federated.get("protocols") or []:
+            yield protocol.get("unique_id")
+
+
+def _filter(items, query, fields):
+    """Returns the items matching the values of fields present in query."""
+    return [
+        item
+        for item in items
+        if all(str(item.get(f)) == query[f] for f in fields if f in query)
+    ]
+
+
+class FakeOpenStackServer(base.FakeServer):
+    """Fake Keystone, Nova, Cinder, Neutron and Swift server, see FakeServer.
+
+    With rgw, the Swift account of a project is denied to the admin project
+    until a user with a role in that project has accessed it, like Ceph RGW.
+    """
+
+    name = "fake-openstack"
+
+    def __init__(
+        self, latency: float | Callable[[str, str], float] = 0, rgw: bool = False
+    ):
+        super().__init__(latency)
+        self.rgw = rgw
+        self._lock = threading.RLock()
+        self._tokens = {}
+        self.projects = {}
+        self.users = {}
+        self.roles = {}
+        self.role_assignments = set()
+        self.quotas = {service: {} for service in DEFAULT_QUOTAS}
+        self.network_resources = {collection: {} for collection in NETWORK_RESOURCES}
+        self.swift_accounts = {}
+
+        self.admin_project = self.create_project("admin")
+        self.admin_user = self.create_user("admin")
+        for role in ("admin", "member", "reader"):
+            self.create_role(role)
+
+    def make_handler(self):
+        return _make_handler(self)
+
+    # Storage, also used to seed and inspect the server from tests
+
+    def create_project(self, name, domain_id=DEFAULT_DOMAIN, **fields):
+        with self._lock:
+            if any(
+                p["name"] == name and p["domain_id"] == domain_id
+                for p in self.projects.values()
+            ):
+                raise conflict("project", name)
+            project = {
+                "id": uuid.uuid4().hex,
+                "name": name,
+                "domain_id": domain_id,
+                "enabled": True,
+                "description": "",
+                "tags": [],
+                **fields,
+            }
+            self.projects[project["id"]] = project
+            return copy.deepcopy(project)
+
+    def create_user(self, name, domain_id=DEFAULT_DOMAIN, **fields):
+        with self._lock:
+            if any(
+                u["name"] == name and u["domain_id"] == domain_id
+                for u in self.users.values()
+            ):
+                raise conflict("user", name)
+            user = {
+                "id": uuid.uuid4().hex,
+                "name": name,
+                "domain_id": domain_id,
+                "enabled": True,
+                **fields,
+            }
+            self.users[user["id"]] = user
+            return self._view_user(user)
+
+    def create_role(self, name):
+        with self._lock:
+            role = {"id": uuid.uuid4().hex, "name": name, "domain_id": None}
+            self.roles[role["id"]] = role
+            return copy.deepcopy(role)
+
+    def get_quota(self, service, project_id):
+        with self._lock:
+            return {
+                **DEFAULT_QUOTAS[service],
+                **self.quotas[service].get(project_id, {}),
+            }
+
+    def _get(self, collection, kind, id):
+        if id not in collection:
+            raise not_found(kind, id)
+        return collection[id]
+
+    def _view_user(self, user):
+        user = {k: v for k, v in user.items() if k != "password"}
+        return copy.deepcopy(user)
+
+    def _has_role(self, user_id, project_id):
+        return any(
+            (user_id, project_id) == assignment[:2]
+            for assignment in self.role_assignments
+        )
+
+    # Keystone
+
+    def catalog(self, project_id):
+        endpoints = [
+            ("identity", "keystone", f"{self.url}/v3"),
+            ("compute", "nova", f"{self.url}/compute/v2.1"),
+            ("volumev3", "cinderv3", f"{self.url}/volume/v3/{project_id}"),
+            ("network", "neutron", f"{self.url}/network"),
+            ("object-store", "swift", f"{self.url}/swift/v1/AUTH_{project_id}"),
+        ]
+        return [
+            {
+                "id": name,
+                "type": service_type,
+                "name": name,
+                "endpoints": [
+                    {
+                        "id": f"{name}-{interface}",
+                        "interface": interface,
+                        "region": "RegionOne",
+                        "region_id": "RegionOne",
+                        "url": url,
+                    }
+                    for interface in ("public", "internal", "admin")
+                ],
+            }
+            for service_type, name, url in endpoints
+        ]
+
+    def authenticate(self, request: Request):
+        return self._tokens.get(request.headers.get("X-Auth-Token"))
+
+    @route("GET", "/", authenticated=False)
+    @route("GET", "/v3", authenticated=False)
+    def discover_identity(self, request):
+        version = {
+            "id": "v3.14",
+            "status": "stable",
+            "updated": "2020-04-07T00:00:00Z",
+            "links": [{"rel": "self", "href": f"{self.url}/v3/"}],
+            "media-types": [
+                {
+                    "base": "application/json",
+                    "type": "application/vnd.openstack.identity-v3+json",
+                }
+            ],
+        }
+        if request.path.startswith("/v3"):
+            return Response(200, {"version": version})
+        return Response(300, {"versions": {"values": [version]}})
+
+    @route("POST", "/v3/auth/tokens", authenticated=False)
+    def issue_token(self, request):
+        auth = request.body["auth"]
+        methods = auth["identity"]["methods"]
+        with self._lock:
+            if "password" in methods:
+                credentials = auth["identity"]["password"]["user"]
+                user = next(
+                    (
+                        u
+                        for u in self.users.values()
+                        if u["name"] == credentials["name"]
+                        and u.get("password") == credentials["password"]
+                    ),
+                    None,
+                )
+                project_id = auth.get("scope", {}).get("project", {}).get("id")
+                if not user or not self._has_role(user["id"], project_id):
+                    raise unauthorized()
+                project = self.projects[project_id]
+            else:
+                user, project = self.admin_user, self.admin_project
+
+            now = datetime.datetime.now(datetime.timezone.utc)
+            token = {
+                "methods": methods,
+                "issued_at": _timestamp(now),
+                "expires_at": _timestamp(now + TOKEN_LIFETIME),
+                "user": {
+                    "id": user["id"],
+                    "name": user["name"],
+                    "domain": {"id": user["domain_id"], "name": user["domain_id"]},
+                },
+                "project": {
+                    "id": project["id"],
+                    "name": project["name"],
+                    "domain": {
+                        "id": project["domain_id"],
+                        "name": project["domain_id"],
+                    },
+                },
+                "roles": [{"id": "admin", "name": "admin"}],
+                "catalog": self.catalog(project["id"]),
+            }
+            token_id = uuid.uuid4().hex
+            self._tokens[token_id] = token
+        return Response(201, {"token": token}, {"X-Subject-Token": token_id})
+
+    @route("POST", "/v3/projects")
+    def post_project(self, request):
+        fields = dict(request.body["project"])
+        project = self.create_project(
+            fields.pop("name"), fields.pop("domain_id", DEFAULT_DOMAIN), **fields
+        )
+        return Response(201, {"project": project})
+
+    @route("GET", f"/v3/projects/(?P<project_id>{ID})")
+    def get_project(self, request, project_id):
+        with self._lock:
+            project = self._get(self.projects, "project", project_id)
+            return Response(200, {"project": copy.deepcopy(project)})
+
+    @route("PATCH", f"/v3/projects/(?P<project_id>{ID})")
+    def patch_project(self, request, project_id):
+        with self._lock:
+            project = self._get(self.projects, "project", project_id)
+            project.update(request.body["project"])
+            return Response(200, {"project": copy.deepcopy(project)})
+
+    @route("HEAD", f"/v3/projects/(?P<project_id>{ID})/tags/(?P<tag>{ID})")
+    def check_project_tag(self, request, project_id, tag):
+        with self._lock:
+            project = self._get(self.projects, "project", project_id)
+            if tag not in project["tags"]:
+                raise not_found("tag", tag)
+        return Response(204)
+
+    @route("PUT", f"/v3/projects/(?P<project_id>{ID})/tags/(?P<tag>{ID})")
+    def put_project_tag(self, request, project_id, tag):
+        with self._lock:
+            project = self._get(self.projects, "project", project_id)
+            if tag not in project["tags"]:
+                project["tags"].append(tag)
+        return Response(201, {"tags": [tag]})
+
+    @route("GET", "/v3/users")
+    def list_users(self, request):
+        with self._lock:
+            users = _filter(self.users.values(), request.query, ["name", "domain_id"])
+            if unique_id := request.query.get("unique_id"):
+                users = [u for u in users if unique_id in _unique_ids(u)]
+            return Response(200, {"users": [self._view_user(u) for u in users]})
+
+    @route("POST", "/v3/users")
+    def post_user(self, request):
+        fields = dict(request.body["user"])
+        user = self.create_user(
+            fields.pop("name"), fields.pop("domain_id", DEFAULT_DOMAIN), **fields
+        )
+        return Response(201, {"user": user})
+
+    @route("GET", "/v3/roles")
+    def list_roles(self, request):
+        with self._lock:
+            roles = _filter(self.roles.values(), request.query, ["name"])
+            return Response(200, {"roles": copy.deepcopy(roles)})
+
+    @route(
+        "PUT",
+        f"/v3/projects/(?P<project_id>{ID})/users/(?P<user_id>{ID})"
+        f"/roles/(?P<role_id>{ID})",
+    )
+    def grant_role(self, request, project_id, user_id, role_id):
+        with self._lock:
+            self._get(self.projects, "project", project_id)
+            self._get(self.users, "user", user_id)
+            self._get(self.roles, "role", role_id)
+            self.role_assignments.add((user_id, project_id, role_id))
+        return Response(204)
+
+    @route(
+        "DELETE",
+        f"/v3/projects/(?P<project_id>{ID})/users/(?P<user_id>{ID})"
+        f"/roles/(?P<role_id>{ID})",
+    )
+    def revoke_role(self, request, project_id, user_id, role_id):
+        with self._lock:
+            if (user_id, project_id, role_id) not in self.role_assignments:
+                raise not_found("role assignment", f"{user_id}/{project_id}")
+            self.role_assignments.remove((user_id, project_id, role_id))
+        return Response(204)
+
+    @route("GET", "/v3/role_assignments")
+    def list_role_assignments(self, request):
+        query = request.query
+        with self._lock:
+            assignments = []
+            for user_id, project_id, role_id in sorted(self.role_assignments):
+                if query.get("user.id", user_id) != user_id:
+                    continue
+                if query.get("scope.project.id", project_id) != project_id:
+                    continue
+                if query.get("role.id", role_id) != role_id:
+                    continue
+                user, role = self.users[user_id], self.roles[role_id]
+                project = self.projects[project_id]
+                assignments.append(
+                    {
+                        "user": {"id": user_id, "name": user["name"]},
+                        "role": {"id": role_id, "name": role["name"]},
+                        "scope": {
+                            "project": {"id": project_id, "name": project["name"]}
+                        },
+                        "links": {},
+                    }
+                )
+            return Response(200, {"role_assignments": assignments})
+
+    # Nova and Cinder
+
+    @route("GET", f"/compute/v2.1/os-quota-sets/(?P<project_id>{ID})")
+    def get_compute_quota(self, request, project_id):
+        return Response(200, {"quota_set": self._quota_set("compute", project_id)})
+
+    @route("PUT", f"/compute/v2.1/os-quota-sets/(?P<project_id>{ID})")
+    def put_compute_quota(self, request, project_id):
+        self._update_quota("compute", project_id, request.body["quota_set"])
+        return Response(200, {"quota_set": self._quota_set("compute", project_id)})
+
+    @route("GET", f"/volume/v3/{ID}/os-quota-sets/(?P<project_id>{ID})")
+    def get_volume_quota(self, request, project_id):
+        return Response(200, {"quota_set": self._quota_set("volume", project_id)})
+
+    @route("PUT", f"/volume/v3/{ID}/os-quota-sets/(?P<project_id>{ID})")
+    def put_volume_quota(self, request, project_id):
+        self._update_quota("volume", project_id, request.body["quota_set"])
+        return Response(200, {"quota_set": self._quota_set("volume", project_id)})
+
+    def _quota_set(self, service, project_id):
+        return {"id": project_id, **self.get_quota(service, project_id)}
+
+    def _update_quota(self, service, project_id, updates):
+        updates = {
+            k: int(v) for k, v in updates.items() if k in DEFAULT_QUOTAS[service]
+        }
+        with self._lock:
+            self.quotas[service].setdefault(project_id, {}).update(updates)
+
+    # Neutron
+
+    @route("GET", f"/network/v2.0/quotas/(?P<project_id>{ID})")
+    def get_network_quota(self, request, project_id):
+        return Response(200, {"quota": self.get_quota("network", project_id)})
+
+    @route("PUT", f"/network/v2.0/quotas/(?P<project_id>{ID})")
+    def put_network_quota(self, request, project_id):
+        self._update_quota("network", project_id, request.body["quota"])
+        return Response(200, {"quota": self.get_quota("network", project_id)})
+
+    @route("GET", "/network/v2.0/(?P<collection>networks|subnets|routers|ports)")
+    def list_network_resources(self, request, collection):
+        with self._lock:
+            items = _filter(
+                self.network_resources[collection].values(),
+                request.query,
+                ["project_id", "name", "device_owner", "device_id", "network_id"],
+            )
+            return Response(200, {collection: copy.deepcopy(items)})
+
+    @route("POST", "/network/v2.0/(?P<collection>networks|subnets|routers|ports)")
+    def post_network_resource(self, request, collection):
+        key = NETWORK_RESOURCES[collection]
+        item = self.create_network_resource(collection, **request.body[key])
+        return Response(201, {key: item})
+
+    def create_network_resource(self, collection, **fields):
+        item = {
+            "id": uuid.uuid4().hex,
+            "name": "",
+            "project_id": self.admin_project["id"],
+            **fields,
+        }
+        item["tenant_id"] = item["project_id"]
+        with self._lock:
+            if collection == "subnets":
+                self._get(
+                    self.network_resources["networks"], "network", item["network_id"]
+                )
+            self.network_resources[collection][item["id"]] = item
+        return copy.deepcopy(item)
+
+    @route("PUT", f"/network/v2.0/routers/(?P<router_id>{ID})/add_router_interface")
+    def add_router_interface(self, request, router_id):
+        with self._lock:
+            router = self._get(self.network_resources["routers"], "router", router_id)
+            subnet_id = request.body["subnet_id"]
+            subnet = self._get(self.network_resources["subnets"], "subnet", subnet_id)
+            port = self.create_network_resource(
+                "ports",
+                project_id=router["project_id"],
+                network_id=subnet["network_id"],
+                device_id=router_id,
+                device_owner="network:router_interface",
+                fixed_ips=[{"subnet_id": subnet_id}],
+            )
+        return Response(
+            200,
+            {
+                "id": router_id,
+                "tenant_id": router["project_id"],
+                "project_id": router["project_id"],
+                "port_id": port["id"],
+                "network_id": subnet["network_id"],
+                "subnet_id": subnet_id,
+                "subnet_ids": [subnet_id],
+            },
+        )
+
+    # Swift
+
+    @route("HEAD", f"/swift/v1/AUTH_(?P<project_id>{ID})")
+    def head_account(self, request, project_id):
+        return Response(204, headers=self._swift_account(request, project_id))
+
+    @route("POST", f"/swift/v1/AUTH_(?P<project_id>{ID})")
+    def post_account(self, request, project_id):
+        account = self._swift_account(request, project_id)
+        with self._lock:
+            account.update(
+                (k.title(), v)
+                for k, v in request.headers.items()
+                if k.lower().startswith("x-account-meta-")
+            )
+        return Response(204)
+
+    def _swift_account(self, request, project_id):
+        with self._lock:
+            self._get(self.projects, "project", project_id)
+            if project_id not in self.swift_accounts:
+                if self.rgw and request.token["project"]["id"] != project_id:
+                    raise forbidden()
+                self.swift_accounts[project_id] = {}
+            return self.swift_accounts[project_id]
+
+    # Dispatch
+
+    def handle(self, request: Request) -> Response:
+        for method, pattern, authenticated, func in ROUTES:
+            if method != request.method or not (
+                match := pattern.fullmatch(request.path)
+            ):
+                continue
+            if authenticated and not request.token:
+                raise unauthorized()
+            return func(self, request, **match.groupdict())
+        raise not_found("resource", request.path)
+
+
+def _make_handler(server: FakeOpenStackServer):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send(self, response: Response):
+            payload = (
+                b"" if response.body is None else json.dumps(response.body).encode()
+            )
+            self.send_response(response.code)
+            for key, value in (response.headers or {}).items():
+                self.send_header(key, value)
+            if response.body is not None:
+                self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(payload)
+
+        def handle_request(self):
+            url = urllib.parse.urlsplit(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            content = self.rfile.read(length) if length else b""
+            server.requests.append((self.command, url.path))
+            if latency := server.get_latency(self.command, url.path):
+                time.sleep(latency)
+
+            request = Request(
+                method=self.command,
+                path=url.path,
+                query=dict(urllib.parse.parse_qsl(url.query)),
+                headers={k.title(): v for k, v in self.headers.items()},
+                body=json.loads(content) if content.strip() else None,
+                token=None,
+            )
+            try:
+                request = request._replace(token=server.authenticate(request))
+                self.send(server.handle(request))
+            except ApiError as e:
+                self.send(Response(e.code, e.to_body()))
+
+        do_GET = do_HEAD = do_POST = do_PUT = do_PATCH = do_DELETE = handle_request
+
+    return Handler
@@ -0,0 +1,171 @@
+import threading
+import time
+from unittest import mock
+
+import kubernetes.dynamic.exceptions as kexc
+from kubernetes.client.rest import ApiException
+
+from coldfront_plugin_cloud import attributes, openshift, tasks
+from coldfront_plugin_cloud.tests import base
+
+
+class TestFakeOpenShiftServer(base.TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.server, self.resource = self.new_fake_openshift_resource()
+
+    def new_allocator(self, allocation=None):
+        return openshift.OpenShiftResourceAllocator(self.resource, allocation)
+
+    def test_activate_and_disable_allocation(self):
+        user = self.new_user()
+        project = self.new_project(pi=user)
+        allocation = self.new_allocation(project, self.resource, 1)
+        self.new_allocation_user(allocation, user)
+        allocator = self.new_allocator(allocation)
+
+        tasks.activate_allocation(allocation.pk)
+        allocation.refresh_from_db()
+        project_id = allocation.get_attribute(attributes.ALLOCATION_PROJECT_ID)
+
+        project = allocator.get_project(project_id)
+        self.assertEqual(project["kind"], "Project")
+        self.assertEqual(
+            project["metadata"]["labels"], openshift.PROJECT_DEFAULT_LABELS
+        )
+        self.assertEqual(len(allocator._openshift_get_limits(project_id)["items"]), 1)
+        self.assertEqual(
+            allocator.get_quota(project_id)["limits.cpu"],
+            str(allocation.get_attribute(attributes.QUOTA_LIMITS_CPU)),
+        )
+        self.assertEqual(
+            allocator.get_federated_user(user.username), {"username": user.username}
+        )
+        self.assertEqual(allocator.get_users(project_id), {user.username})
+
+        self.assertTrue(tasks.validate_project(allocator, allocation, apply=False))
+
+        allocator.disable_project(project_id)
+        with self.assertRaises(kexc.NotFoundError):
+            allocator.get_project(project_id)
+        # The contents of the namespace are deleted with it
+        self.assertIsNone(
+            self.server.get_object(
+                "rolebindings", allocator.member_role_name, project_id
+            )
+        )
+
+    def test_list_pagination(self):
+        for i in range(5):
+            self.server.put_object("namespaces", {"metadata": {"name": f"project-{i}"}})
+
+        versions = self.new_allocator().get_project_versions(page_size=2)
+
+        self.assertEqual(set(versions), {f"project-{i}" for i in range(5)})
+        self.assertEqual(self.server.requests.count(("GET", "/api/v1/namespaces")), 3)
+
+    def test_project_versions(self):
+        allocator = self.new_allocator()
+        self.server.put_object("namespaces", {"metadata": {"name": "project"}})
+        allocator._openshift_create_limits("project")
+        allocator._openshift_create_rolebindings(
+            "project", ["user-1"], allocator.member_role_name
+        )
+        versions = [allocator.get_project_versions()["project"]]
+
+        allocator._openshift_create_resourcequota(
+            "project",
+            {"metadata": {"name": "quota"}, "spec": {"hard": {"pods": "1"}}},
+        )
+        versions.append(allocator.get_project_versions()["project"])
+
+        # Usage is not validated
+        quota = self.server.get_object("resourcequotas", "quota", "project")
+        quota["status"]["used"] = {"pods": "1"}
+        self.server.put_object("resourcequotas", quota)
+        self.assertEqual(allocator.get_project_versions()["project"], versions[-1])
+
+        allocator._openshift_delete_limits("project")
+        versions.append(allocator.get_project_versions()["project"])
+
+        allocator._openshift_patch_rolebindings(
+            "project",
+            allocator.member_role_name,
+            [{"op": "add", "path": "/subjects/-", "value": {"kind": "User"}}],
+        )
+        versions.append(allocator.get_project_versions()["project"])
+
+        self.assertEqual(len(set(versions)), len(versions))
+
+    def test_resource_version_conflict(self):
+        allocator = self.new_allocator()
+        self.server.put_object("namespaces", {"metadata": {"name": "project"}})
+        allocator._openshift_create_rolebindings(
+            "project", ["user-1"], allocator.member_role_name
+        )
+        rolebinding = allocator._openshift_get_rolebindings(
+            "project", allocator.member_role_name
+        )
+
+        # Modified by someone else since it was read
+        current = self.server.get_object(
+            "rolebindings", allocator.member_role_name, "project"
+        )
+        self.server.put_object("rolebindings", current)
+
+        with self.assertRaises(kexc.ConflictError):
+            allocator._openshift_patch_rolebindings(
+                "project",
+                allocator.member_role_name,
+                [{"op": "add", "path": "/subjects/-", "value": {"kind": "User"}}],
+                rolebinding["metadata"]["resourceVersion"],
+            )
+
+        # Updates read the rolebinding again when they conflict
+        get_rolebindings = allocator._openshift_get_rolebindings
+        conflicts = [current]
+
+        def get_then_modify(*args):
+            rolebinding = get_rolebindings(*args)
+            if conflicts:
+                self.server.put_object("rolebindings", conflicts.pop())
+            return rolebinding
+
+        with mock.patch.object(
+            allocator, "_openshift_get_rolebindings", side_effect=get_then_modify
+        ):
+            allocator.assign_roles_bulk(["user-2"], "project")
+        self.assertEqual(allocator.get_users("project"), {"user-1", "user-2"})
+
+    def test_watch(self):
+        allocator = self.new_allocator()
+        api = allocator.get_resource_api(openshift.API_CORE, "Namespace")
+        resource_version = api.get(limit=1).to_dict()["metadata"]["resourceVersion"]
+
+        def create_namespace():
+            time.sleep(0.1)
+            self.server.put_object("namespaces", {"metadata": {"name": "project"}})
+
+        threading.Thread(target=create_namespace).start()
+        for event in api.watch(resource_version=resource_version, timeout=5):
+            self.assertEqual(event["type"], "ADDED")
+            self.assertEqual(event["raw_object"]["metadata"]["name"], "project")
+            break
+        else:
+            self.fail("No event received.")
+
+        self.server.compact()
+        with self.assertRaises(ApiException) as cm:
+            for _ in api.watch(resource_version=resource_version, timeout=5):
+                pass
+        self.assertEqual(cm.exception.status, 410)
+
+    def test_latency(self):
+        allocator = self.new_allocator()
+        allocator.get_resource_api(openshift.API_CORE, "Namespace")
+        self.server.latency = lambda method, path: 0.2 if method == "POST" else 0
+
+        start = time.monotonic()
+        allocator._openshift_create_project({"metadata": {"name": "project"}})
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
@@ -101,3 +101,46 @@ class TestOpenshiftQuota(base.TestUnitOpenshiftBase):
         ]
         res = self.allocator.get_quota("fake-project")
         self.assertEqual(res, expected_quota)
+
+    def test_get_resource_quota_usage_paginated(self):
+        pages = [
+            {
+                "metadata": {"continue": "next-page"},
+                "items": [
+                    {
+                        "metadata": {"namespace": "project-a"},
+                        "status": {"used": {"requests.nvidia.com/gpu": "1"}},
+                    },
+                    {"metadata": {"namespace": "project-b"}, "status": {}},
+                ],
+            },
+            {
+                "metadata": {},
+                "items": [
+                    {
+                        "metadata": {"namespace": "project-a"},
+                        "status": {"used": {"limits.cpu": "2"}},
+                    },
+                ],
+            },
+        ]
+        fake_api = self.allocator.k8_client.resources.get.return_value
+        fake_api.get.side_effect = [
+            mock.Mock(**{"to_dict.return_value": page}) for page in pages
+        ]
+
+        usage = self.allocator.get_resource_quota_usage(page_size=2)
+
+        self.assertEqual(
+            usage,
+            {
+                "project-a": {"requests.nvidia.com/gpu": "1", "limits.cpu": "2"},
+                "project-b": {},
+            },
+        )
+        fake_api.get.assert_has_calls(
+            [
+                mock.call(limit=2, _continue=None),
+                mock.call(limit=2, _continue="next-page"),
+            ]
+        )
@@ -2,6 +2,7 @@ from unittest import mock
 
 import kubernetes.dynamic.exceptions as kexc
 
+from coldfront_plugin_cloud import openshift
 from coldfront_plugin_cloud.tests.unit.openshift import base
 
 
@@ -34,15 +35,25 @@ class TestMocOpenShiftRBAC(base.TestUnitOpenshiftBase):
         "coldfront_plugin_cloud.openshift.OpenShiftResourceAllocator._openshift_get_rolebindings"
     )
     @mock.patch(
-        "coldfront_plugin_cloud.openshift.OpenShiftResourceAllocator._openshift_update_rolebindings"
+        "coldfront_plugin_cloud.openshift.OpenShiftResourceAllocator._openshift_patch_rolebindings"
     )
-    def test_add_user_to_role(self, fake_update_rb, fake_get_rb):
+    def test_add_user_to_role(self, fake_patch_rb, fake_get_rb):
         fake_get_rb.return_value = {
+            "metadata": {"resourceVersion": "1"},
             "subjects": [],
         }
         self.allocator.assign_role_on_user("fake-user", "fake-project")
-        fake_update_rb.assert_called_with(
-            "fake-project", {"subjects": [{"kind": "User", "name": "fake-user"}]}
+        fake_patch_rb.assert_called_with(
+            "fake-project",
+            "admin",
+            [
+                {
+                    "op": "add",
+                    "path": "/subjects",
+                    "value": [{"kind": "User", "name": "fake-user"}],
+                }
+            ],
+            "1",
         )
 
     @mock.patch(
@@ -55,19 +66,213 @@ class TestMocOpenShiftRBAC(base.TestUnitOpenshiftBase):
         fake_error = kexc.NotFoundError(mock.Mock())
         fake_get_rb.side_effect = fake_error
         self.allocator.assign_role_on_user("fake-user", "fake-project")
-        fake_create_rb.assert_called_with("fake-project", "fake-user", "admin")
+        fake_create_rb.assert_called_with("fake-project", ["fake-user"], "admin")
 
     @mock.patch(
         "coldfront_plugin_cloud.openshift.OpenShiftResourceAllocator._openshift_get_rolebindings"
     )
-    def test_remove_user_from_role(self, fake_get_rb):
+    @mock.patch(
+        "coldfront_plugin_cloud.openshift.OpenShiftResourceAllocator._openshift_patch_rolebindings"
+    )
+    def test_assign_roles_bulk(self, fake_patch_rb, fake_get_rb):
         fake_get_rb.return_value = {
+            "metadata": {"resourceVersion": "1"},
+            "subjects": [{"kind": "User", "name": "fake-user-1"}],
+        }
+        self.allocator.assign_roles_bulk(
+            ["fake-user-1", "fake-user-2", "fake-user-3", "fake-user-2"],
+            "fake-project",
+        )
+        fake_get_rb.assert_called_once_with("fake-project", "admin")
+        fake_patch_rb.assert_called_once_with(
+            "fake-project",
+            "admin",
+            [
+                {
+                    "op": "add",
+                    "path": "/subjects/-",
+                    "value": {"kind": "User", "name": "fake-user-2"},
+                },
+                {
+                    "op": "add",
+                    "path": "/subjects/-",
+                    "value": {"kind": "User", "name": "fake-user-3"},
+                },
+            ],
+            "1",
+        )
+
+    @mock.patch(
+        "coldfront_plugin_cloud.openshift.OpenShiftResourceAllocator._openshift_get_rolebindings"
+    )
+    @mock.patch(
+        "coldfront_plugin_cloud.openshift.OpenShiftResourceAllocator._openshift_create_rolebindings"
+    )
+    def test_assign_roles_bulk_not_exists(self, fake_create_rb, fake_get_rb):
+        fake_get_rb.side_effect = kexc.NotFoundError(mock.Mock())
+        self.allocator.assign_roles_bulk(["fake-user-1", "fake-user-2"], "fake-project")
+        fake_create_rb.assert_called_once_with(
+            "fake-project", ["fake-user-1", "fake-user-2"], "admin"
+        )
+
+    @mock.patch("coldfront_plugin_cloud.openshift.time.sleep")
+    @mock.patch(
+        "coldfront_plugin_cloud.openshift.OpenShiftResourceAllocator._openshift_get_rolebindings"
+    )
+    @mock.patch(
+        "coldfront_plugin_cloud.openshift.OpenShiftResourceAllocator._openshift_patch_rolebindings"
+    )
+    def test_assign_roles_bulk_conflict_retried(
+        self, fake_patch_rb, fake_get_rb, fake_sleep
+    ):
+        fake_get_rb.side_effect = [
+            {
+                "metadata": {"resourceVersion": "1"},
+                "subjects": [{"kind": "User", "name": "fake-user-1"}],
+            },
+            {
+                "metadata": {"resourceVersion": "2"},
+                "subjects": [
+                    {"kind": "User", "name": "fake-user-1"},
+                    {"kind": "User", "name": "fake-user-2"},
+                ],
+            },
+        ]
+        fake_patch_rb.side_effect = [kexc.ConflictError(mock.Mock()), {}]
+
+        self.allocator.assign_roles_bulk(["fake-user-2", "fake-user-3"], "fake-project")
+
+        self.assertEqual(fake_sleep.call_count, 1)
+        # fake-user-2 was added concurrently, so only fake-user-3 is added on retry
+        fake_patch_rb.assert_called_with(
+            "fake-project",
+            "admin",
+            [
+                {
+                    "op": "add",
+                    "path": "/subjects/-",
+                    "value": {"kind": "User", "name": "fake-user-3"},
+                },
+            ],
+            "2",
+        )
+
+    @mock.patch("coldfront_plugin_cloud.openshift.time.sleep")
+    @mock.patch(
+        "coldfront_plugin_cloud.openshift.OpenShiftResourceAllocator._openshift_get_rolebindings"
+    )
+    @mock.patch(
+        "coldfront_plugin_cloud.openshift.OpenShiftResourceAllocator._openshift_patch_rolebindings"
+    )
+    @mock.patch(
+        "coldfront_plugin_cloud.openshift.OpenShiftResourceAllocator._openshift_create_rolebindings"
+    )
+    def test_assign_roles_bulk_created_concurrently(
+        self, fake_create_rb, fake_patch_rb, fake_get_rb, fake_sleep
+    ):
+        fake_get_rb.side_effect = [
+            kexc.NotFoundError(mock.Mock()),
+            {
+                "metadata": {"resourceVersion": "1"},
+                "subjects": [{"kind": "User", "name": "fake-user-1"}],
+            },
+        ]
+        fake_create_rb.side_effect = kexc.ConflictError(mock.Mock())
+
+        self.allocator.assign_roles_bulk(["fake-user-2"], "fake-project")
+
+        fake_patch_rb.assert_called_once_with(
+            "fake-project",
+            "admin",
+            [
+                {
+                    "op": "add",
+                    "path": "/subjects/-",
+                    "value": {"kind": "User", "name": "fake-user-2"},
+                },
+            ],
+            "1",
+        )
+
+    @mock.patch("coldfront_plugin_cloud.openshift.time.sleep")
+    @mock.patch(
+        "coldfront_plugin_cloud.openshift.OpenShiftResourceAllocator._openshift_get_rolebindings"
+    )
+    @mock.patch(
+        "coldfront_plugin_cloud.openshift.OpenShiftResourceAllocator._openshift_patch_rolebindings"
+    )
+    def test_assign_roles_bulk_conflict_gives_up(
+        self, fake_patch_rb, fake_get_rb, fake_sleep
+    ):
+        fake_get_rb.return_value = {
+            "metadata": {"resourceVersion": "1"},
+            "subjects": [],
+        }
+        fake_patch_rb.side_effect = kexc.ConflictError(mock.Mock())
+
+        with self.assertRaises(openshift.ApiException):
+            self.allocator.assign_roles_bulk(["fake-user"], "fake-project")
+        self.assertEqual(
+            fake_patch_rb.call_count, openshift.ROLEBINDING_UPDATE_ATTEMPTS
+        )
+
+    @mock.patch(
+        "coldfront_plugin_cloud.openshift.OpenShiftResourceAllocator._openshift_get_rolebindings"
+    )
+    @mock.patch(
+        "coldfront_plugin_cloud.openshift.OpenShiftResourceAllocator._openshift_patch_rolebindings"
+    )
+    def test_remove_roles_bulk(self, fake_patch_rb, fake_get_rb):
+        fake_get_rb.return_value = {
+            "metadata": {"resourceVersion": "1"},
+            "subjects": [
+                {"kind": "User", "name": "fake-user-1"},
+                {"kind": "User", "name": "fake-user-2"},
+                {"kind": "Group", "name": "fake-user-3"},
+                {"kind": "User", "name": "fake-user-3"},
+            ],
+        }
+        self.allocator.remove_roles_bulk(["fake-user-1", "fake-user-3"], "fake-project")
+        fake_patch_rb.assert_called_once_with(
+            "fake-project",
+            "admin",
+            [
+                {"op": "remove", "path": "/subjects/3"},
+                {"op": "remove", "path": "/subjects/0"},
+            ],
+            "1",
+        )
+
+    @mock.patch(
+        "coldfront_plugin_cloud.openshift.OpenShiftResourceAllocator._openshift_get_rolebindings"
+    )
+    @mock.patch(
+        "coldfront_plugin_cloud.openshift.OpenShiftResourceAllocator._openshift_patch_rolebindings"
+    )
+    def test_remove_roles_bulk_not_in_rolebinding(self, fake_patch_rb, fake_get_rb):
+        fake_get_rb.return_value = {
+            "subjects": [{"kind": "User", "name": "fake-user-2"}],
+        }
+        self.allocator.remove_roles_bulk(["fake-user-1"], "fake-project")
+        fake_patch_rb.assert_not_called()
+
+    def test_remove_user_from_role(self):
+        fake_rb = mock.Mock(spec=["to_dict"])
+        fake_rb.to_dict.return_value = {
+            "metadata": {"resourceVersion": "1"},
             "subjects": [{"kind": "User", "name": "fake-user"}],
         }
+        self.allocator.k8_client.resources.get.return_value.get.return_value = fake_rb
         self.allocator.k8_client.resources.get.return_value.patch.return_value.to_dict.return_value = {}
         self.allocator.remove_role_from_user("fake-user", "fake-project")
         self.allocator.k8_client.resources.get.return_value.patch.assert_called_with(
-            body={"subjects": []}, namespace="fake-project"
+            body=[
+                {"op": "replace", "path": "/metadata/resourceVersion", "value": "1"},
+                {"op": "remove", "path": "/subjects/0"},
+            ],
+            name="admin",
+            namespace="fake-project",
+            content_type="application/json-patch+json",
         )
 
     def test_remove_user_from_role_not_exists(self):
@@ -112,7 +317,7 @@ class TestMocOpenShiftRBAC(base.TestUnitOpenshiftBase):
             fake_rb
         )
         res = self.allocator._openshift_create_rolebindings(
-            "fake-project", "fake-user", "admin"
+            "fake-project", ["fake-user"], "admin"
         )
         self.assertEqual(res, {})
         self.allocator.k8_client.resources.get.return_value.create.assert_called_with(
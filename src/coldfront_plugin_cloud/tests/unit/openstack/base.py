@@ -0,0 +1,23 @@
+from unittest import mock
+
+from coldfront_plugin_cloud.tests import base
+from coldfront_plugin_cloud.openstack import OpenStackResourceAllocator
+
+
+class TestOpenStackResourceAllocator(OpenStackResourceAllocator):
+    def __init__(self):
+        self.resource = mock.Mock()
+        self.allocation = mock.Mock()
+        self.resource_quotaspecs = mock.Mock()
+        self.session = mock.Mock()
+        self.identity = mock.Mock()
+        self.compute = mock.Mock()
+        self.volume = mock.Mock()
+        self.network = mock.Mock()
+
+        self.member_role_name = "member"
+
+
+class TestUnitOpenStackBase(base.TestBase):
+    def setUp(self) -> None:
+        self.allocator = TestOpenStackResourceAllocator()
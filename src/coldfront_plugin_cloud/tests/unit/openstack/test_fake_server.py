@@ -0,0 +1,83 @@
+import time
+
+from keystoneauth1 import exceptions as ksa_exceptions
+
+from coldfront_plugin_cloud import attributes, openstack, tasks
+from coldfront_plugin_cloud.tests import base
+
+
+class TestFakeOpenStackServer(base.TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.server, self.resource = self.new_fake_openstack_resource(rgw=True)
+
+    def new_allocator(self, allocation=None):
+        return openstack.OpenStackResourceAllocator(self.resource, allocation)
+
+    def test_activate_and_disable_allocation(self):
+        user = self.new_user()
+        project = self.new_project(pi=user)
+        allocation = self.new_allocation(project, self.resource, 2)
+        self.new_allocation_user(allocation, user)
+        allocator = self.new_allocator(allocation)
+
+        tasks.activate_allocation(allocation.pk)
+        allocation.refresh_from_db()
+        project_id = allocation.get_attribute(attributes.ALLOCATION_PROJECT_ID)
+
+        self.assertTrue(allocator.get_project(project_id).enabled)
+        self.assertEqual(
+            self.server.get_quota("compute", project_id)["cores"],
+            allocation.get_attribute(attributes.QUOTA_VCPU),
+        )
+        self.assertEqual(
+            allocator.get_quota(project_id)["x-account-meta-quota-bytes"],
+            allocation.get_attribute(attributes.QUOTA_OBJECT_GB),
+        )
+        self.assertEqual(allocator.get_users(project_id), {user.username})
+        # The federated user is created with its unique_id
+        self.assertEqual(
+            allocator._query_federated_user(user.username)["name"], user.username
+        )
+
+        # The default network, subnet, router and router interface
+        for collection in ("networks", "subnets", "routers", "ports"):
+            self.assertEqual(
+                len(
+                    [
+                        item
+                        for item in self.server.network_resources[collection].values()
+                        if item["project_id"] == project_id
+                    ]
+                ),
+                1,
+            )
+
+        # The Swift account is initialized once, then the project is tagged
+        self.assertIn(
+            openstack.RGW_INITIALIZED_TAG, self.server.projects[project_id]["tags"]
+        )
+        self.assertTrue(tasks.validate_project(allocator, allocation, apply=False))
+
+        tasks.disable_allocation(allocation.pk)
+        self.assertFalse(allocator.get_project(project_id).enabled)
+
+    def test_unauthorized(self):
+        with self.assertRaises(ksa_exceptions.Unauthorized):
+            openstack.get_session_for_resource_via_password(
+                self.resource, "admin", "wrong", self.server.admin_project["id"]
+            ).get_token()
+
+    def test_latency(self):
+        allocator = self.new_allocator()
+        allocator.session.get_token()
+        self.server.latency = lambda method, path: 0.2 if "quota" in path else 0
+
+        start = time.monotonic()
+        allocator.compute.quotas.get(self.server.admin_project["id"])
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        self.assertIn(
+            ("GET", f"/compute/v2.1/os-quota-sets/{self.server.admin_project['id']}"),
+            self.server.requests,
+        )
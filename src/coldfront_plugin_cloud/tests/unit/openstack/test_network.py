@@ -0,0 +1,64 @@
+from coldfront_plugin_cloud.tests.unit.openstack import base
+
+
+class TestOpenStackDefaultNetwork(base.TestUnitOpenStackBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.allocator.resource.get_attribute.return_value = None
+        self.neutron = self.allocator.network
+
+    def test_create_default_network(self):
+        self.neutron.list_networks.return_value = {"networks": []}
+        self.neutron.list_subnets.return_value = {"subnets": []}
+        self.neutron.list_routers.return_value = {"routers": []}
+        self.neutron.list_ports.return_value = {"ports": []}
+        self.neutron.create_network.return_value = {"network": {"id": "network-id"}}
+        self.neutron.create_subnet.return_value = {"subnet": {"id": "subnet-id"}}
+        self.neutron.create_router.return_value = {"router": {"id": "router-id"}}
+
+        self.allocator.create_default_network("fake-project")
+
+        self.neutron.list_ports.assert_called_once_with(
+            project_id="fake-project", device_owner="network:router_interface"
+        )
+        self.neutron.create_network.assert_called_once()
+        self.neutron.create_router.assert_called_once()
+        self.assertEqual(
+            self.neutron.create_subnet.call_args.kwargs["body"]["subnet"]["network_id"],
+            "network-id",
+        )
+        self.neutron.add_interface_router.assert_called_once_with(
+            "router-id", body={"subnet_id": "subnet-id"}
+        )
+
+    def test_create_default_network_exists(self):
+        self.neutron.list_networks.return_value = {"networks": [{"id": "network-id"}]}
+        self.neutron.list_subnets.return_value = {"subnets": [{"id": "subnet-id"}]}
+        self.neutron.list_routers.return_value = {"routers": [{"id": "router-id"}]}
+        self.neutron.list_ports.return_value = {
+            "ports": [
+                {"device_id": "other-router-id", "network_id": "network-id"},
+                {"device_id": "router-id", "network_id": "network-id"},
+            ]
+        }
+
+        self.allocator.create_default_network("fake-project")
+
+        self.neutron.create_network.assert_not_called()
+        self.neutron.create_subnet.assert_not_called()
+        self.neutron.create_router.assert_not_called()
+        self.neutron.add_interface_router.assert_not_called()
+
+    def test_create_default_network_router_not_connected(self):
+        self.neutron.list_networks.return_value = {"networks": [{"id": "network-id"}]}
+        self.neutron.list_subnets.return_value = {"subnets": [{"id": "subnet-id"}]}
+        self.neutron.list_routers.return_value = {"routers": [{"id": "router-id"}]}
+        self.neutron.list_ports.return_value = {
+            "ports": [{"device_id": "router-id", "network_id": "other-network-id"}]
+        }
+
+        self.allocator.create_default_network("fake-project")
+
+        self.neutron.add_interface_router.assert_called_once_with(
+            "router-id", body={"subnet_id": "subnet-id"}
+        )
@@ -0,0 +1,135 @@
+import threading
+import time
+from unittest import mock
+
+from coldfront_plugin_cloud import openstack
+from coldfront_plugin_cloud.tests.unit.openstack import base
+
+
+class TestOpenStackRBAC(base.TestUnitOpenStackBase):
+    @mock.patch(
+        "coldfront_plugin_cloud.openstack.OpenStackResourceAllocator.get_federated_user"
+    )
+    def test_assign_roles_bulk(self, fake_get_user):
+        fake_get_user.side_effect = lambda username: {"id": f"{username}-id"}
+        fake_role = self.allocator.identity.roles.find.return_value.id
+
+        usernames = [f"fake-user-{i}" for i in range(20)]
+        self.allocator.assign_roles_bulk(usernames, "fake-project")
+
+        self.allocator.identity.roles.find.assert_called_once_with(name="member")
+        self.assertEqual(self.allocator.identity.roles.grant.call_count, 20)
+        for username in usernames:
+            self.allocator.identity.roles.grant.assert_any_call(
+                user=f"{username}-id", project="fake-project", role=fake_role
+            )
+
+    @mock.patch(
+        "coldfront_plugin_cloud.openstack.OpenStackResourceAllocator.get_federated_user"
+    )
+    def test_remove_roles_bulk(self, fake_get_user):
+        fake_get_user.side_effect = lambda username: (
+            {"id": f"{username}-id"} if username != "missing-user" else None
+        )
+        fake_role = self.allocator.identity.roles.find.return_value.id
+
+        self.allocator.remove_roles_bulk(
+            ["fake-user-1", "missing-user", "fake-user-2"], "fake-project"
+        )
+
+        self.allocator.identity.roles.find.assert_called_once_with(name="member")
+        self.assertEqual(self.allocator.identity.roles.revoke.call_count, 2)
+        self.allocator.identity.roles.revoke.assert_any_call(
+            user="fake-user-2-id", project="fake-project", role=fake_role
+        )
+
+    @mock.patch(
+        "coldfront_plugin_cloud.openstack.OpenStackResourceAllocator.get_federated_user"
+    )
+    def test_assign_roles_bulk_error(self, fake_get_user):
+        fake_get_user.return_value = {"id": "fake-user-id"}
+        self.allocator.identity.roles.grant.side_effect = [None, RuntimeError("boom")]
+
+        with self.assertRaises(RuntimeError):
+            self.allocator.assign_roles_bulk(["user-1", "user-2"], "fake-project")
+
+    @mock.patch(
+        "coldfront_plugin_cloud.openstack.OpenStackResourceAllocator.get_federated_user"
+    )
+    def test_role_id_cached(self, fake_get_user):
+        fake_get_user.return_value = {"id": "fake-user-id"}
+
+        self.allocator.assign_role_on_user("fake-user-1", "fake-project")
+        self.allocator.remove_role_from_user("fake-user-1", "fake-project")
+        self.allocator.assign_roles_bulk(["fake-user-2"], "fake-project")
+
+        self.allocator.identity.roles.find.assert_called_once_with(name="member")
+
+
+class TestOpenStackUserCache(base.TestUnitOpenStackBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.allocator.resource.get_attribute.return_value = "fake"
+
+    def test_attributes_read_before_threads(self):
+        attribute_threads = set()
+
+        def fake_get_attribute(name):
+            attribute_threads.add(threading.current_thread())
+            return "fake"
+
+        self.allocator.resource.get_attribute.side_effect = fake_get_attribute
+        self.allocator.session.get.return_value.json.return_value = {
+            "users": [{"id": "fake-user-id"}]
+        }
+
+        self.allocator.assign_roles_bulk(["user-1", "user-2", "user-3"], "project")
+
+        self.assertEqual(attribute_threads, {threading.current_thread()})
+        self.assertEqual(self.allocator.identity.roles.grant.call_count, 3)
+
+    def test_user_cached(self):
+        self.allocator.session.get.return_value.json.return_value = {
+            "users": [{"id": "fake-user-id"}]
+        }
+
+        for _ in range(3):
+            user = self.allocator.get_federated_user("fake-user")
+
+        self.assertEqual(user, {"id": "fake-user-id"})
+        self.allocator.session.get.assert_called_once()
+
+    def test_user_not_found_cached(self):
+        self.allocator.session.get.return_value.json.return_value = {"users": []}
+
+        for _ in range(3):
+            self.assertIsNone(self.allocator.get_federated_user("fake-user"))
+
+        # One query by unique_id and one by name
+        self.assertEqual(self.allocator.session.get.call_count, 2)
+
+    def test_user_not_found_cache_expires(self):
+        self.allocator.session.get.return_value.json.return_value = {"users": []}
+        self.allocator.get_federated_user("fake-user")
+
+        with mock.patch(
+            "coldfront_plugin_cloud.utils.time.monotonic",
+            return_value=time.monotonic() + openstack.KEYSTONE_NEGATIVE_CACHE_TTL,
+        ):
+            self.allocator.get_federated_user("fake-user")
+
+        self.assertEqual(self.allocator.session.get.call_count, 4)
+
+    def test_created_user_cached(self):
+        self.allocator.session.get.return_value.json.return_value = {"users": []}
+        self.allocator.session.post.return_value.json.return_value = {
+            "user": {"id": "fake-user-id"}
+        }
+
+        self.assertIsNone(self.allocator.get_federated_user("fake-user"))
+        self.allocator.create_federated_user("fake-user")
+
+        self.assertEqual(
+            self.allocator.get_federated_user("fake-user"), {"id": "fake-user-id"}
+        )
+        self.assertEqual(self.allocator.session.get.call_count, 2)
@@ -0,0 +1,145 @@
+import time
+from unittest import mock
+
+from coldfront_plugin_cloud import openstack
+from coldfront_plugin_cloud.tests.unit.openstack import base
+
+
+@mock.patch("coldfront_plugin_cloud.openstack.swiftclient.Connection")
+class TestSwiftConnectionPool(base.TestUnitOpenStackBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.allocator.session.get_endpoint.return_value = (
+            "https://swift/v1/AUTH_admin-project"
+        )
+        self.allocator.session.get_project_id.return_value = "admin-project"
+
+    def test_connection_shared_between_allocators(self, fake_connection):
+        fake_connection.side_effect = lambda **kwargs: mock.Mock()
+        other_allocator = base.TestOpenStackResourceAllocator()
+        other_allocator.resource = self.allocator.resource
+
+        connection = self.allocator.object("fake-project")
+
+        self.assertIs(other_allocator.object("fake-project"), connection)
+        self.assertIsNot(self.allocator.object("other-project"), connection)
+        fake_connection.assert_any_call(
+            session=self.allocator.session,
+            preauthurl="https://swift/v1/AUTH_fake-project",
+            retries=0,
+        )
+        self.assertEqual(fake_connection.call_count, 2)
+
+    def test_connection_expires(self, fake_connection):
+        fake_connection.side_effect = lambda **kwargs: mock.Mock()
+        connection = self.allocator.object("fake-project")
+
+        with mock.patch(
+            "coldfront_plugin_cloud.utils.time.monotonic",
+            return_value=time.monotonic() + openstack.SWIFT_CONNECTION_TTL,
+        ):
+            self.assertIsNot(self.allocator.object("fake-project"), connection)
+
+    def test_pool_size_bounded(self, fake_connection):
+        for i in range(openstack.SWIFT_POOL_SIZE * 2):
+            self.allocator.object(f"project-{i}")
+
+        pool = openstack.get_swift_connection_pool(self.allocator.resource)
+        self.assertEqual(len(pool), openstack.SWIFT_POOL_SIZE)
+
+    def test_connection_with_session_not_pooled(self, fake_connection):
+        fake_connection.side_effect = lambda **kwargs: mock.Mock()
+        other_session = mock.Mock()
+        other_session.get_endpoint.return_value = "https://swift/v1/AUTH_init"
+        other_session.get_project_id.return_value = "init"
+
+        connection = self.allocator.object("fake-project", session=other_session)
+
+        self.assertIsNot(
+            self.allocator.object("fake-project", session=other_session), connection
+        )
+        self.assertEqual(
+            len(openstack.get_swift_connection_pool(self.allocator.resource)), 0
+        )
+
+
+@mock.patch.dict(
+    "os.environ", {"OPENSTACK_FAKE_RESOURCE_APPLICATION_CREDENTIAL_SECRET": "secret"}
+)
+@mock.patch("coldfront_plugin_cloud.openstack.get_session_for_resource_via_password")
+@mock.patch(
+    "coldfront_plugin_cloud.openstack.OpenStackResourceAllocator.remove_role_from_user"
+)
+@mock.patch(
+    "coldfront_plugin_cloud.openstack.OpenStackResourceAllocator.assign_role_on_user"
+)
+@mock.patch("coldfront_plugin_cloud.openstack.OpenStackResourceAllocator.object")
+class TestRGWInitialization(base.TestUnitOpenStackBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.allocator.resource.name = "fake-resource"
+
+    def test_init_rgw(self, fake_object, fake_assign, fake_remove, fake_session):
+        self.allocator.identity.projects.check_tag.return_value = False
+
+        self.allocator._init_rgw_for_project("fake-project")
+
+        self.allocator.identity.users.create.assert_called_once()
+        fake_assign.assert_called_once_with(
+            openstack.COLDFRONT_RGW_SWIFT_INIT_USER, "fake-project"
+        )
+        fake_object.assert_called_once_with(
+            session=fake_session.return_value, project_id="fake-project"
+        )
+        fake_object.return_value.head_account.assert_called_once()
+        fake_remove.assert_called_once_with(
+            openstack.COLDFRONT_RGW_SWIFT_INIT_USER, "fake-project"
+        )
+        self.allocator.identity.projects.add_tag.assert_called_once_with(
+            "fake-project", openstack.RGW_INITIALIZED_TAG
+        )
+
+        # Initialization is remembered without asking Keystone again, but a
+        # later 403 means the account was lost and initializes it again.
+        with self.assertLogs(level="WARNING"):
+            self.allocator._init_rgw_for_project("fake-project")
+        self.allocator.identity.projects.check_tag.assert_called_once()
+        self.assertEqual(fake_assign.call_count, 2)
+        self.assertEqual(self.allocator.identity.projects.add_tag.call_count, 2)
+
+    def test_init_rgw_already_tagged(
+        self, fake_object, fake_assign, fake_remove, fake_session
+    ):
+        self.allocator.identity.projects.check_tag.return_value = True
+
+        with self.assertLogs(level="WARNING"):
+            self.allocator._init_rgw_for_project("fake-project")
+
+        fake_assign.assert_called_once()
+        fake_object.return_value.head_account.assert_called_once()
+        self.allocator.identity.projects.add_tag.assert_called_once_with(
+            "fake-project", openstack.RGW_INITIALIZED_TAG
+        )
+
+    def test_head_account_single_request(
+        self, fake_object, fake_assign, fake_remove, fake_session
+    ):
+        self.allocator._call_swift_account("fake-project", "head_account")
+
+        fake_object.return_value.head_account.assert_called_once_with()
+        self.allocator.identity.projects.check_tag.assert_not_called()
+
+    def test_head_account_403(
+        self, fake_object, fake_assign, fake_remove, fake_session
+    ):
+        self.allocator.identity.projects.check_tag.return_value = False
+        fake_object.return_value.head_account.side_effect = [
+            openstack.swiftclient.exceptions.ClientException("denied", http_status=403),
+            None,
+            {"x-account-meta-quota-bytes": "1"},
+        ]
+
+        account = self.allocator._call_swift_account("fake-project", "head_account")
+
+        self.assertEqual(account, {"x-account-meta-quota-bytes": "1"})
+        self.allocator.identity.projects.add_tag.assert_called_once()
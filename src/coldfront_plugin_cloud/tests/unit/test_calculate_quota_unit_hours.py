@@ -10,6 +10,7 @@ import freezegun
 from coldfront_plugin_cloud import attributes
 from coldfront_plugin_cloud.tests import base
 from coldfront_plugin_cloud import utils
+from coldfront_plugin_cloud.management.commands import calculate_storage_gb_hours
 
 from coldfront.core.allocation import models as allocation_models
 from django.core.management import call_command
@@ -505,6 +506,16 @@ class TestCalculateQuotaUnitHours(TestCalculateAllocationQuotaHoursBase):
         )
         self.assertEqual(value, 0)
 
+    def test_datetime_type(self):
+        self.assertEqual(
+            calculate_storage_gb_hours.datetime_type("2024-03-01T00:00"),
+            pytz.utc.localize(datetime.datetime(2024, 3, 1)),
+        )
+        self.assertEqual(
+            calculate_storage_gb_hours.datetime_type("2024-03-01T00:00-05:00"),
+            pytz.utc.localize(datetime.datetime(2024, 3, 1, 5)),
+        )
+
 
 class TestNERCOutagesIntegration(TestCalculateAllocationQuotaHoursBase):
     @patch(
@@ -0,0 +1,169 @@
+import csv
+import io
+import json
+from unittest import mock
+
+from django.core.management import call_command
+
+from coldfront_plugin_cloud import attributes, utils
+from coldfront_plugin_cloud.management.commands.count_gpu_usage import Command
+from coldfront_plugin_cloud.tests import base
+
+
+class TestCountGpuUsageBase(base.TestBase):
+    gpu_quota_attribute = None
+
+    def new_gpu_allocation(self, project_id, gpu_quota):
+        allocation = self.new_allocation(self.new_project(), self.resource, 1)
+        utils.set_attribute_on_allocation(
+            allocation, attributes.ALLOCATION_PROJECT_ID, project_id
+        )
+        utils.set_attribute_on_allocation(
+            allocation, self.gpu_quota_attribute, gpu_quota
+        )
+        return allocation
+
+
+class TestCountGpuUsageOpenStack(TestCountGpuUsageBase):
+    gpu_quota_attribute = attributes.QUOTA_GPU
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.resource = self.new_openstack_resource()
+
+        session_patcher = mock.patch(
+            "coldfront_plugin_cloud.openstack.get_session_for_resource"
+        )
+        session_patcher.start()
+        self.addCleanup(session_patcher.stop)
+        client_patcher = mock.patch(
+            "coldfront_plugin_cloud.management.commands.count_gpu_usage.novaclient.Client"
+        )
+        self.client = client_patcher.start().return_value
+        self.addCleanup(client_patcher.stop)
+
+        flavors = []
+        for flavor_id, name in [("f1", "gpu.a100"), ("f2", "gpu.a100x2")]:
+            flavor = mock.Mock(id=flavor_id)
+            flavor.name = name
+            flavors.append(flavor)
+        self.client.flavors.list.return_value = flavors
+
+    def fake_servers(self, servers_by_flavor, page_size):
+        def list_servers(search_opts, marker, limit):
+            self.assertEqual(limit, page_size)
+            servers = servers_by_flavor[search_opts["flavor"]]
+            start = 0
+            if marker:
+                start = [s.id for s in servers].index(marker) + 1
+            return servers[start : start + limit]
+
+        self.client.servers.list.side_effect = list_servers
+
+    @mock.patch(
+        "coldfront_plugin_cloud.management.commands.count_gpu_usage.SERVER_PAGE_SIZE",
+        2,
+    )
+    def test_openstack_usage_json(self):
+        allocation = self.new_gpu_allocation("project-a", 2)
+        self.fake_servers(
+            {
+                "f1": [mock.Mock(id=f"a-{i}", tenant_id="project-a") for i in range(3)],
+                "f2": [
+                    mock.Mock(id="b-1", tenant_id="project-a"),
+                    mock.Mock(id="b-2", tenant_id="project-unknown"),
+                ],
+            },
+            page_size=2,
+        )
+        out = io.StringIO()
+
+        call_command(
+            "count_gpu_usage",
+            resource=self.resource.name,
+            flavor=["gpu.a100", "gpu.a100x2=2"],
+            format="json",
+            stdout=out,
+        )
+
+        usage = {x["project_id"]: x for x in json.loads(out.getvalue())}
+        self.assertEqual(usage["project-a"]["used"], 5)
+        self.assertEqual(usage["project-a"]["allowed"], 2)
+        self.assertEqual(usage["project-a"]["allocation_id"], allocation.pk)
+        self.assertEqual(usage["project-unknown"]["used"], 2)
+        self.assertIsNone(usage["project-unknown"]["allocation_id"])
+        # Flavor f1 has 3 servers, so it is read in two pages.
+        self.assertEqual(self.client.servers.list.call_count, 4)
+
+    def test_project_id_index_single_query(self):
+        for i in range(5):
+            self.new_gpu_allocation(f"project-{i}", 1)
+        allocations = Command.get_active_allocations(self.resource)
+
+        with self.assertNumQueries(1):
+            index = Command.get_project_id_to_allocation(allocations)
+        self.assertEqual(index["project-3"].cloud_project_id, "project-3")
+        self.assertTrue(set(index) >= {f"project-{i}" for i in range(5)})
+
+
+class TestCountGpuUsageOpenShift(TestCountGpuUsageBase):
+    gpu_quota_attribute = attributes.QUOTA_REQUESTS_GPU
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.resource = self.new_openshift_resource()
+        call_command("register_default_quotas", apply=True)
+
+    @mock.patch(
+        "coldfront_plugin_cloud.openshift.OpenShiftResourceAllocator.get_resource_quota_usage"
+    )
+    def test_openshift_over_quota(self, fake_usage):
+        over = self.new_gpu_allocation("project-over", 1)
+        self.new_gpu_allocation("project-within", 2)
+        fake_usage.return_value = {
+            "project-over": {"requests.nvidia.com/gpu": "2"},
+            "project-within": {"requests.nvidia.com/gpu": "2"},
+            "project-unknown": {"requests.nvidia.com/gpu": "1"},
+            "project-no-gpu": {"limits.cpu": "4"},
+        }
+
+        with self.assertLogs(
+            "coldfront_plugin_cloud.management.commands.count_gpu_usage"
+        ) as logs:
+            call_command("count_gpu_usage", resource=self.resource.name)
+
+        warnings = [r.getMessage() for r in logs.records if r.levelname == "WARNING"]
+        errors = [r.getMessage() for r in logs.records if r.levelname == "ERROR"]
+        self.assertEqual(len(warnings), 1)
+        self.assertIn(f"Allocation ID {over.pk}", warnings[0])
+        self.assertIn("(Allowed 1)", warnings[0])
+        self.assertEqual(len(errors), 1)
+        self.assertIn("project-unknown", errors[0])
+        fake_usage.assert_called_once_with()
+
+    @mock.patch(
+        "coldfront_plugin_cloud.openshift.OpenShiftResourceAllocator.get_resource_quota_usage"
+    )
+    def test_openshift_usage_csv(self, fake_usage):
+        allocation = self.new_gpu_allocation("project-a", 4)
+        fake_usage.return_value = {"project-a": {"requests.nvidia.com/gpu": "3"}}
+        out = io.StringIO()
+
+        call_command(
+            "count_gpu_usage", resource=self.resource.name, format="csv", stdout=out
+        )
+
+        rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+        self.assertEqual(
+            rows,
+            [
+                {
+                    "project_id": "project-a",
+                    "allocation_id": str(allocation.pk),
+                    "project": allocation.project.title,
+                    "quota": attributes.QUOTA_REQUESTS_GPU,
+                    "used": "3",
+                    "allowed": "4",
+                }
+            ],
+        )
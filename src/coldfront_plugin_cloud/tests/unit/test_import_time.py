@@ -0,0 +1,69 @@
+import re
+import subprocess
+import sys
+
+from coldfront_plugin_cloud.tests import base
+
+# Cumulative import time allowed for modules loaded by the web app and by
+# every run of the billing commands, in seconds. These are well above the
+# actual times, to leave room for slow machines, while still catching the
+# import of a heavy dependency.
+IMPORT_BUDGETS = {
+    "coldfront_plugin_cloud.signals": 0.25,
+    "coldfront_plugin_cloud.management.commands.fetch_daily_billable_usage": 0.15,
+    "coldfront_plugin_cloud.management.commands.calculate_storage_gb_hours": 0.15,
+}
+
+# Dependencies only imported when they are used
+DEFERRED_MODULES = [
+    "boto3",
+    "pandas",
+    "pyarrow",
+    "pytz",
+    "keystoneclient",
+    "kubernetes",
+]
+
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+\d+ \|\s+(\d+) \|\s*(\S+)$")
+
+
+def import_modules(modules) -> tuple[dict[str, float], set[str]]:
+    """Imports modules once Django is set up in a new interpreter.
+
+    Returns the cumulative import time of every module imported, and the
+    names of all modules loaded."""
+    code = "\n".join(
+        [
+            "import sys",
+            "import django",
+            "django.setup()",
+            *(f"import {module}" for module in modules),
+            "print('\\n'.join(sys.modules))",
+        ]
+    )
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+
+    import_times = {}
+    for line in process.stderr.splitlines():
+        if match := IMPORT_TIME_LINE.match(line):
+            import_times[match.group(2)] = int(match.group(1)) / 1_000_000
+    return import_times, set(process.stdout.splitlines())
+
+
+class TestImportTime(base.TestBase):
+    def test_import_budgets(self):
+        import_times, loaded = import_modules(IMPORT_BUDGETS)
+
+        for module, budget in IMPORT_BUDGETS.items():
+            self.assertLessEqual(
+                import_times[module],
+                budget,
+                f"Importing {module} took {import_times[module]:.3f}s",
+            )
+        for module in DEFERRED_MODULES:
+            self.assertNotIn(module, loaded)
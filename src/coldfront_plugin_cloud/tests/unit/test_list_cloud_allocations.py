@@ -0,0 +1,101 @@
+import csv
+import io
+import json
+from unittest import mock
+
+from django.core.management import call_command
+
+from coldfront_plugin_cloud import attributes, utils
+from coldfront_plugin_cloud.management.commands.list_cloud_allocations import Command
+from coldfront_plugin_cloud.tests import base
+
+
+class TestListCloudAllocations(base.TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.resource = self.new_openstack_resource()
+
+    def new_cloud_allocation(self, gpus=None):
+        allocation = self.new_allocation(self.new_project(), self.resource, 1)
+        if gpus is not None:
+            utils.set_attribute_on_allocation(allocation, attributes.QUOTA_GPU, gpus)
+        return allocation
+
+    def list_allocations(self, **options):
+        with mock.patch("sys.stdout", new_callable=io.StringIO) as out:
+            call_command("list_cloud_allocations", **options)
+        return out.getvalue()
+
+    def test_ndjson(self):
+        allocation = self.new_cloud_allocation(gpus=3)
+        unset = self.new_cloud_allocation()
+        gpus_column = 5 + [
+            x.name for x in Command().get_cloud_attrs("OpenStack")
+        ].index(attributes.QUOTA_GPU)
+
+        output = self.list_allocations(cloud_type="OpenStack", format="ndjson")
+
+        rows = {row[4]: row for row in map(json.loads, output.splitlines())}
+        self.assertEqual(
+            rows[allocation.pk][:5],
+            [
+                allocation.project.pi.email,
+                "OpenStack",
+                allocation.project_id,
+                allocation.project.title,
+                allocation.pk,
+            ],
+        )
+        self.assertEqual(rows[allocation.pk][gpus_column], 3.0)
+        self.assertEqual(rows[unset.pk][gpus_column], 0)
+
+    def test_all_chained(self):
+        openshift = self.new_openshift_resource()
+        allocations = [self.new_cloud_allocation(gpus=1) for _ in range(3)]
+        for _ in range(3):
+            allocation = self.new_allocation(self.new_project(), openshift, 1)
+            allocations.append(allocation)
+        # Sorted differently by code point than by most collations
+        allocations[0].project.pi.email = "Zed@example.com"
+        allocations[0].project.pi.save()
+
+        output = self.list_allocations(cloud_type="all", format="ndjson")
+
+        rows = list(map(json.loads, output.splitlines()))
+        # OpenStack rows come first, each cloud type sorted on its own
+        cloud_types = [row[1] for row in rows]
+        first_openshift = cloud_types.index("OpenShift")
+        self.assertEqual(set(cloud_types[:first_openshift]), {"OpenStack"})
+        self.assertEqual(set(cloud_types[first_openshift:]), {"OpenShift"})
+        for cloud_type in ("OpenStack", "OpenShift"):
+            cloud_rows = [row for row in rows if row[1] == cloud_type]
+            self.assertEqual(cloud_rows, sorted(cloud_rows, key=lambda x: x[0:5]))
+        self.assertEqual(
+            {row[4] for row in rows} & {x.pk for x in allocations},
+            {x.pk for x in allocations},
+        )
+
+    def test_csv(self):
+        allocation = self.new_cloud_allocation(gpus=2)
+
+        output = self.list_allocations(cloud_type="OpenStack", format="csv")
+
+        rows = list(csv.DictReader(io.StringIO(output)))
+        row = next(x for x in rows if x["alloc_id"] == str(allocation.pk))
+        self.assertEqual(row["pi_email"], allocation.project.pi.email)
+        self.assertEqual(row[attributes.QUOTA_GPU.replace(" ", "_")], "2.0")
+
+    def test_query_count_constant(self):
+        command = Command()
+        for _ in range(2):
+            self.new_cloud_allocation(gpus=1)
+        with self.assertNumQueries(3):
+            few = command.get_allocations("OpenStack")
+
+        for _ in range(5):
+            self.new_cloud_allocation(gpus=1)
+        with self.assertNumQueries(3):
+            many = command.get_allocations("OpenStack")
+
+        self.assertEqual(len(many), len(few) + 5)
+        self.assertEqual(many, sorted(many, key=lambda x: x[0:5]))
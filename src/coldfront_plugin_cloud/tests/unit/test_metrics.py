@@ -0,0 +1,187 @@
+import io
+import os
+import tempfile
+from unittest import mock
+
+import kubernetes
+import swiftclient
+from django.core.management import call_command
+from keystoneauth1 import exceptions as ksa_exceptions
+from keystoneauth1 import session
+
+from coldfront_plugin_cloud import metrics, openshift, openstack
+from coldfront_plugin_cloud.tests import base
+
+
+def fake_k8s_response(status, size):
+    response = mock.Mock(status=status)
+    response.getheader.return_value = str(size)
+    return response
+
+
+class TestMetrics(base.TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        metrics.disable()
+        self.addCleanup(metrics.disable)
+
+    def get_api_client(self, responses):
+        patcher = mock.patch.object(
+            kubernetes.client.ApiClient, "call_api", side_effect=responses
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return openshift.ResourceApiClient(
+            kubernetes.client.Configuration(), mock.MagicMock(), name="cluster"
+        )
+
+    def test_disabled(self):
+        func = mock.Mock()
+
+        metrics.measure("cluster", "GET", "/api", func, mock.Mock())
+
+        func.assert_called_once()
+        self.assertIsNone(metrics.get_registry())
+
+    def test_record_requests(self):
+        metrics.enable()
+        api_client = self.get_api_client(
+            [
+                fake_k8s_response(200, 512),
+                fake_k8s_response(404, 0),
+                fake_k8s_response(200, 1024),
+            ]
+        )
+
+        @metrics.instrumented
+        def _openshift_get_project():
+            api_client.call_api("GET", "/apis/project.openshift.io/v1/projects/a")
+            api_client.call_api("GET", "/apis/project.openshift.io/v1/projects/b")
+
+        _openshift_get_project()
+        api_client.call_api(
+            "GET", "https://cluster/api/v1/namespaces/cf-project/resourcequotas"
+        )
+
+        stats = metrics.get_registry().snapshot()
+        self.assertEqual(
+            set(stats),
+            {
+                ("cluster", "_openshift_get_project"),
+                ("cluster", "GET /api/v1/namespaces/{namespace}/resourcequotas"),
+            },
+        )
+        project_stats = stats[("cluster", "_openshift_get_project")]
+        self.assertEqual(project_stats.count, 2)
+        self.assertEqual(project_stats.errors, 1)
+        self.assertEqual(project_stats.statuses, {200: 1, 404: 1})
+        self.assertEqual(project_stats.bytes, 512)
+        self.assertEqual(sum(project_stats.buckets), 2)
+
+    def test_record_openstack_errors(self):
+        metrics.enable()
+        with mock.patch.object(
+            session.Session, "request", side_effect=ksa_exceptions.NotFound()
+        ):
+            sesh = openstack.ResourceSession(None, mock.MagicMock(), name="cloud")
+            with self.assertRaises(ksa_exceptions.NotFound):
+                sesh.request(
+                    "/v3/projects/4d8e5b7f0a1c4b3e9f2d6a8c7b5e3d1f",
+                    "GET",
+                    endpoint_filter={"service_type": "identity"},
+                )
+
+        stats = metrics.get_registry().snapshot()
+        self.assertEqual(
+            stats[("cloud", "identity GET /v3/projects/{id}")].statuses, {404: 1}
+        )
+
+    def test_record_swift_requests(self):
+        metrics.enable()
+        sesh = openstack.ResourceSession(None, mock.MagicMock(), name="cloud")
+        connection = openstack.create_swift_connection(sesh, None)
+        connection.url = "https://swift/v1/AUTH_4d8e5b7f0a1c4b3e9f2d6a8c7b5e3d1f"
+
+        with (
+            mock.patch.object(swiftclient.Connection, "head_account", return_value={}),
+            mock.patch.object(
+                swiftclient.Connection,
+                "post_account",
+                side_effect=swiftclient.exceptions.ClientException(
+                    "denied", http_status=403
+                ),
+            ),
+        ):
+            openstack.call_swift_account(connection, "head_account")
+            with self.assertRaises(swiftclient.exceptions.ClientException):
+                openstack.call_swift_account(connection, "post_account", headers={})
+
+        stats = metrics.get_registry().snapshot()
+        self.assertEqual(
+            stats[("cloud", "object-store HEAD /v1/{id}")].statuses, {200: 1}
+        )
+        self.assertEqual(
+            stats[("cloud", "object-store POST /v1/{id}")].statuses, {403: 1}
+        )
+
+    def test_export(self):
+        metrics.enable()
+        registry = metrics.get_registry()
+        registry.record("cluster", "_openshift_get_project", 0.02, 200, 100)
+        registry.record("cluster", "_openshift_get_project", 0.3, 500, 0)
+
+        summary = registry.format_summary().splitlines()
+        self.assertEqual(
+            summary[0].split()[:4], ["Resource", "Operation", "Calls", "Errors"]
+        )
+        self.assertEqual(
+            summary[1].split()[:4], ["cluster", "_openshift_get_project", "2", "1"]
+        )
+
+        prometheus = registry.format_prometheus()
+        labels = 'resource="cluster",operation="_openshift_get_project"'
+        self.assertIn(
+            f'coldfront_cloud_api_requests_total{{{labels},status="500"}} 1', prometheus
+        )
+        self.assertIn(
+            f'coldfront_cloud_api_request_duration_seconds_bucket{{{labels},le="0.025"}} 1',
+            prometheus,
+        )
+        self.assertIn(
+            f'coldfront_cloud_api_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2',
+            prometheus,
+        )
+        self.assertIn(
+            f"coldfront_cloud_api_response_bytes_total{{{labels}}} 100", prometheus
+        )
+
+    @mock.patch.dict("os.environ", {"CLOUD_API_METRICS_STATSD_HOST": "statsd"})
+    @mock.patch("coldfront_plugin_cloud.metrics.socket.socket")
+    def test_statsd(self, fake_socket):
+        metrics.enable()
+        api_client = self.get_api_client([fake_k8s_response(201, 10)])
+
+        api_client.call_api("POST", "/api/v1/namespaces")
+
+        payload, address = fake_socket.return_value.sendto.call_args.args
+        self.assertEqual(address, ("statsd", 8125))
+        self.assertIn(
+            b"coldfront.cloud_api.cluster.POST_api_v1_namespaces.status.201:1|c",
+            payload,
+        )
+
+    def test_command_summary(self):
+        stderr = io.StringIO()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "metrics.prom")
+            with mock.patch.dict(
+                "os.environ", {"CLOUD_API_METRICS_PROMETHEUS_FILE": path}
+            ):
+                call_command(
+                    "validate_allocations",
+                    api_metrics=True,
+                    stderr=stderr,
+                )
+            self.assertTrue(os.path.exists(path))
+
+        self.assertIn("Operation", stderr.getvalue())
@@ -0,0 +1,70 @@
+import contextlib
+import io
+import os
+import pstats
+import re
+import tempfile
+
+from django.core.management import call_command
+
+from coldfront_plugin_cloud import profiling
+from coldfront_plugin_cloud.tests import base
+
+
+class TestProfiling(base.TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+
+        _, resource = self.new_fake_openstack_resource()
+        self.generate_allocations(resource, 1, users_per_allocation=1)
+
+    def get_phase_seconds(self, summary):
+        return {
+            phase: float(seconds)
+            for phase, seconds in re.findall(r"^(\w+)\s+([\d.]+)", summary, re.M)
+        }
+
+    def test_profile(self):
+        path = os.path.join(self.tmp, "validate.prof")
+        stderr = io.StringIO()
+        call_command("validate_allocations", apply=True, profile=path, stderr=stderr)
+
+        stats = pstats.Stats(path)
+        self.assertTrue(
+            any(
+                filename.endswith("validate_allocations.py") and name == "handle"
+                for filename, _, name in stats.stats
+            )
+        )
+
+        seconds = self.get_phase_seconds(stderr.getvalue())
+        self.assertGreater(seconds["db"], 0)
+        self.assertGreater(seconds["backend"], 0)
+        self.assertEqual(seconds["io"], 0)
+        self.assertGreater(seconds["total"], 0)
+        self.assertFalse(profiling.is_enabled())
+
+    def test_profile_collapsed_stacks(self):
+        path = os.path.join(self.tmp, "validate.collapsed")
+        call_command("validate_allocations", profile=path, stderr=io.StringIO())
+
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            self.assertRegex(line, r"^\S.* \d+$")
+        self.assertTrue(
+            any(re.search(r"validate_allocations\.py:\d+:handle", x) for x in lines)
+        )
+
+    def test_profile_list_cloud_allocations(self):
+        path = os.path.join(self.tmp, "list.prof")
+        stderr = io.StringIO()
+        with contextlib.redirect_stdout(io.StringIO()):
+            call_command("list_cloud_allocations", profile=path, stderr=stderr)
+
+        pstats.Stats(path)
+        self.assertGreater(self.get_phase_seconds(stderr.getvalue())["db"], 0)
@@ -0,0 +1,187 @@
+import contextlib
+import datetime
+import io
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+import pytz
+from django.core.management import call_command
+from django.db import connection
+
+from coldfront_plugin_cloud import attributes, tasks, utils
+from coldfront_plugin_cloud.management import mixins
+from coldfront_plugin_cloud.models import usage_models
+from coldfront_plugin_cloud.tests import base
+from coldfront_plugin_cloud.tests.fakes import generators
+
+# Sizes of the datasets each budget is checked against
+SIZES = (1, 3)
+
+
+class TestQueryBudgets(base.TestBase):
+    def assertQueriesPerAllocation(self, queries_by_size, per_allocation, fixed=0):
+        """Fails if, for any dataset size, more queries were made than the
+        fixed ones and per_allocation for each allocation."""
+        for size, queries in queries_by_size.items():
+            self.assertLessEqual(
+                queries,
+                fixed + per_allocation * size,
+                f"{queries} queries for {size} allocations, the budget is"
+                f" {fixed} + {per_allocation} per allocation: {queries_by_size}",
+            )
+
+    def assertConstantQueries(self, queries_by_size, budget):
+        """Fails if the queries of a per allocation operation depend on the
+        number of allocations, or exceed budget."""
+        self.assertEqual(
+            len(set(queries_by_size.values())),
+            1,
+            f"Queries grow with the number of allocations: {queries_by_size}",
+        )
+        self.assertLessEqual(max(queries_by_size.values()), budget)
+
+    @staticmethod
+    def count_queries(func) -> int:
+        queries = mixins.QueryCounter()
+        with connection.execute_wrapper(queries):
+            func()
+        return len(queries)
+
+    def grow_allocations(self, generate):
+        """Yields each dataset size once generate has been called with the
+        number of allocations missing to reach it."""
+        count = 0
+        for size in SIZES:
+            generate(size - count)
+            count = size
+            yield size
+
+    def test_activate_allocation(self):
+        _, resource = self.new_fake_openstack_resource()
+
+        activations, user_additions = {}, {}
+        for size in self.grow_allocations(
+            lambda n: self.generate_allocations(resource, n, users_per_allocation=1)
+        ):
+            allocation = self.new_allocation(self.new_project(), resource, 1)
+            activations[size] = self.count_queries(
+                lambda: tasks.activate_allocation(allocation.pk)
+            )
+
+            user = self.new_user()
+            self.new_project_user(user, allocation.project, role="User")
+            allocation_user = self.new_allocation_user(allocation, user)
+            user_additions[size] = self.count_queries(
+                lambda: tasks.add_user_to_allocation(allocation_user.pk)
+            )
+
+        self.assertConstantQueries(activations, 120)
+        self.assertConstantQueries(user_additions, 36)
+
+    def count_validate_allocations_queries(self, resource):
+        return {
+            size: self.count_queries(
+                lambda: call_command("validate_allocations", apply=True)
+            )
+            for size in self.grow_allocations(
+                lambda n: self.generate_allocations(resource, n, users_per_allocation=1)
+            )
+        }
+
+    def test_validate_allocations_openstack(self):
+        _, resource = self.new_fake_openstack_resource()
+        queries = self.count_validate_allocations_queries(resource)
+        self.assertQueriesPerAllocation(queries, 40, fixed=10)
+
+    def test_validate_allocations_openshift(self):
+        _, resource = self.new_fake_openshift_resource()
+        queries = self.count_validate_allocations_queries(resource)
+        self.assertQueriesPerAllocation(queries, 37, fixed=10)
+
+    @mock.patch(
+        "coldfront_plugin_cloud.management.commands.fetch_daily_billable_usage.Command.get_allocation_usage",
+        return_value=usage_models.UsageInfo({"CPU": "1.00"}),
+    )
+    def test_fetch_daily_billable_usage(self, _):
+        resource = self.new_openstack_resource()
+
+        def generate(count):
+            for _ in range(count):
+                allocation = self.new_allocation(self.new_project(), resource, 1)
+                utils.set_attribute_on_allocation(
+                    allocation, attributes.ALLOCATION_PROJECT_ID, allocation.pk
+                )
+
+        with mock.patch(
+            "coldfront_plugin_cloud.management.commands.fetch_daily_billable_usage.RESOURCES_DAILY_ENABLED",
+            [resource.name],
+        ):
+            queries = {
+                size: self.count_queries(
+                    lambda: call_command(
+                        "fetch_daily_billable_usage", date="2025-11-15"
+                    )
+                )
+                for size in self.grow_allocations(generate)
+            }
+        self.assertQueriesPerAllocation(queries, 15, fixed=5)
+
+    def test_calculate_storage_gb_hours(self):
+        start = pytz.utc.localize(datetime.datetime(2020, 3, 1))
+        end = pytz.utc.localize(datetime.datetime(2020, 4, 1))
+        resource = self.new_openstack_resource(internal_name="stack")
+        call_command("register_default_quotas", apply=True)
+        generator = generators.BillingHistoryGenerator(start, end)
+        outages = generators.SyntheticOutages({})
+
+        def run_invoice(output):
+            with contextlib.redirect_stdout(io.StringIO()):
+                call_command(
+                    "calculate_storage_gb_hours",
+                    start=start,
+                    end=end,
+                    invoice_month="2020-03",
+                    output=output,
+                    openstack_nese_gb_rate=Decimal("0.000009"),
+                    openshift_nese_gb_rate=Decimal("0.000009"),
+                    openshift_ibm_gb_rate=Decimal("0.000009"),
+                )
+
+        with (
+            tempfile.TemporaryDirectory() as tmp,
+            mock.patch.object(utils, "_OUTAGES_DATA", outages),
+        ):
+            output = os.path.join(tmp, "invoices.csv")
+            queries = {
+                size: self.count_queries(lambda: run_invoice(output))
+                for size in self.grow_allocations(
+                    lambda n: generator.generate(resource, n)
+                )
+            }
+        self.assertQueriesPerAllocation(queries, 38, fixed=15)
+
+
+class TestDebugSql(base.TestBase):
+    def test_normalize_sql(self):
+        self.assertEqual(
+            mixins.normalize_sql(
+                "SELECT * FROM t WHERE a = 12 AND b = 'it''s' AND c IN (%s, %s, %s)"
+            ),
+            "SELECT * FROM t WHERE a = ? AND b = ? AND c IN (...)",
+        )
+
+    def test_debug_sql(self):
+        _, resource = self.new_fake_openstack_resource()
+        self.generate_allocations(resource, 2, users_per_allocation=1)
+
+        stderr = io.StringIO()
+        call_command("validate_allocations", debug_sql=True, stderr=stderr)
+
+        summary = stderr.getvalue().splitlines()
+        self.assertRegex(summary[0], r"^\d+ SQL queries, \d+ distinct statements\.$")
+        # Attributes of each allocation are fetched with the same statement
+        self.assertRegex(
+            summary[1], r'^\s+\d+\s+[\d.]+s  SELECT .*"allocation_allocationattribute"'
+        )
@@ -0,0 +1,135 @@
+import threading
+import time
+from unittest import mock
+
+import kubernetes
+from django.core.exceptions import ImproperlyConfigured
+from keystoneauth1 import session
+
+from coldfront_plugin_cloud import openshift, openstack, ratelimit
+from coldfront_plugin_cloud.tests import base
+
+
+class TestRateLimit(base.TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        ratelimit._rate_limiters.clear()
+        self.addCleanup(ratelimit._rate_limiters.clear)
+
+    def test_token_bucket(self):
+        bucket = ratelimit.TokenBucket(rate=50, burst=2)
+
+        start = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        # The burst is free, the remaining 4 tokens take 1/50s each.
+        self.assertGreaterEqual(time.monotonic() - start, 4 / 50 - 0.01)
+
+    def test_concurrency_limit(self):
+        limiter = ratelimit.RateLimiter(concurrency=ratelimit.ConcurrencyLimiter(2))
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def request():
+            with limiter:
+                with lock:
+                    active.append(1)
+                    peak.append(len(active))
+                time.sleep(0.01)
+                with lock:
+                    active.pop()
+
+        threads = [threading.Thread(target=request) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(max(peak), 2)
+
+    def test_nested_requests_not_limited_again(self):
+        limiter = ratelimit.RateLimiter(concurrency=ratelimit.ConcurrencyLimiter(1))
+
+        with limiter:
+            # e.g. fetching a token before the request can be made
+            with limiter:
+                pass
+
+        # The slot was released once the outermost request finished.
+        self.assertTrue(limiter.concurrency._semaphore.acquire(blocking=False))
+
+    @mock.patch.dict(
+        "os.environ",
+        {
+            "OPENSTACK_LIMITED_RATE_LIMIT": "5",
+            "OPENSTACK_LIMITED_MAX_CONCURRENT_REQUESTS": "3",
+        },
+    )
+    def test_get_rate_limiter(self):
+        limited = mock.Mock()
+        limited.name = "limited"
+        unlimited = mock.Mock()
+        unlimited.name = "unlimited"
+
+        rate_limiter = ratelimit.get_rate_limiter("OPENSTACK", limited)
+        self.assertIs(rate_limiter, ratelimit.get_rate_limiter("OPENSTACK", limited))
+        self.assertEqual(rate_limiter.bucket.rate, 5)
+        self.assertEqual(rate_limiter.bucket.burst, 5)
+        self.assertEqual(rate_limiter.concurrency.limit, 3)
+
+        rate_limiter = ratelimit.get_rate_limiter("OPENSTACK", unlimited)
+        self.assertIsNone(rate_limiter.bucket)
+        self.assertIsNone(rate_limiter.concurrency)
+
+    @mock.patch.dict(
+        "os.environ",
+        {"REDIS_HOST": "redis", "OPENSHIFT_SHARED_RATE_LIMIT": "10"},
+    )
+    @mock.patch("coldfront_plugin_cloud.ratelimit.get_redis_client")
+    def test_shared_via_redis(self, fake_get_redis_client):
+        fake_script = fake_get_redis_client.return_value.register_script.return_value
+        fake_script.side_effect = ["0.02", "0"]
+        resource = mock.Mock()
+        resource.name = "shared"
+
+        rate_limiter = ratelimit.get_rate_limiter("OPENSHIFT", resource)
+        with rate_limiter:
+            pass
+
+        self.assertIsInstance(rate_limiter.bucket, ratelimit.RedisTokenBucket)
+        fake_script.assert_called_with(
+            keys=["coldfront_plugin_cloud:ratelimit:OPENSHIFT_SHARED:bucket"],
+            args=[10.0, 10],
+        )
+        self.assertEqual(fake_script.call_count, 2)
+
+    @mock.patch.dict(
+        "os.environ",
+        {"REDIS_HOST": "redis", "OPENSHIFT_SHARED_RATE_LIMIT": "10"},
+    )
+    @mock.patch.dict("sys.modules", {"redis": None})
+    def test_shared_via_redis_not_installed(self):
+        resource = mock.Mock()
+        resource.name = "shared"
+
+        with self.assertRaisesRegex(ImproperlyConfigured, r"\[redis\]"):
+            ratelimit.get_rate_limiter("OPENSHIFT", resource)
+
+    def test_clients_use_rate_limiter(self):
+        rate_limiter = mock.MagicMock()
+
+        with mock.patch.object(session.Session, "request") as fake_request:
+            sesh = openstack.ResourceSession(None, rate_limiter)
+            sesh.request("https://keystone", "GET")
+        fake_request.assert_called_once()
+        rate_limiter.__enter__.assert_called_once()
+
+        rate_limiter.reset_mock()
+        with mock.patch.object(kubernetes.client.ApiClient, "call_api") as fake_request:
+            api_client = openshift.ResourceApiClient(
+                kubernetes.client.Configuration(), rate_limiter
+            )
+            api_client.call_api("GET", "https://openshift/api")
+        fake_request.assert_called_once()
+        rate_limiter.__enter__.assert_called_once()
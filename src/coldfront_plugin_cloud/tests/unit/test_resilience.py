@@ -0,0 +1,211 @@
+from unittest import mock
+
+import kubernetes
+import requests
+import swiftclient
+import urllib3
+from keystoneauth1 import exceptions as ksa_exceptions
+from keystoneauth1 import session
+
+from coldfront_plugin_cloud import openshift, openstack, resilience
+from coldfront_plugin_cloud.tests import base
+
+
+def fake_response(status):
+    return mock.Mock(status=status, status_code=status)
+
+
+def connect_failure(reason):
+    """A ConnectFailure raised by keystoneauth for a requests ConnectionError
+    caused by reason."""
+    exception = ksa_exceptions.ConnectFailure()
+    exception.__context__ = requests.exceptions.ConnectionError(
+        urllib3.exceptions.MaxRetryError(None, "/", reason)
+    )
+    return exception
+
+
+@mock.patch("coldfront_plugin_cloud.resilience.time.sleep", mock.Mock())
+class TestResilience(base.TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        resilience._retry_policies.clear()
+        self.addCleanup(resilience._retry_policies.clear)
+
+    def test_retry_transient_errors(self):
+        policy = resilience.RetryPolicy(attempts=3)
+        func = mock.Mock(side_effect=[fake_response(503), fake_response(200)])
+        discard = mock.Mock()
+
+        result = policy.call("GET", func, openshift.classify_response, discard)
+
+        self.assertEqual(result.status, 200)
+        self.assertEqual(func.call_count, 2)
+        discard.assert_called_once()
+
+    def test_give_up_after_attempts(self):
+        policy = resilience.RetryPolicy(attempts=3)
+        func = mock.Mock(side_effect=ksa_exceptions.ServiceUnavailable())
+
+        with self.assertRaises(ksa_exceptions.ServiceUnavailable):
+            policy.call("GET", func, openstack.classify_response)
+        self.assertEqual(func.call_count, 3)
+
+    def test_non_idempotent_requests(self):
+        policy = resilience.RetryPolicy(attempts=3)
+
+        # A POST may have been processed, retrying could duplicate it.
+        func = mock.Mock(side_effect=ksa_exceptions.ServiceUnavailable())
+        with self.assertRaises(ksa_exceptions.ServiceUnavailable):
+            policy.call("POST", func, openstack.classify_response)
+        self.assertEqual(func.call_count, 1)
+
+        # Unless it was rejected before being processed or never sent.
+        func = mock.Mock(
+            side_effect=[
+                fake_response(429),
+                connect_failure(urllib3.exceptions.NewConnectionError(None, "")),
+                connect_failure(urllib3.exceptions.NameResolutionError("", None, "")),
+                fake_response(201),
+            ]
+        )
+        policy = resilience.RetryPolicy(attempts=4)
+        result = policy.call("POST", func, openstack.classify_response)
+        self.assertEqual(result.status_code, 201)
+        self.assertEqual(func.call_count, 4)
+
+        # A connection lost once the request was written may have been.
+        func = mock.Mock(
+            side_effect=connect_failure(
+                urllib3.exceptions.ProtocolError("Connection aborted.")
+            )
+        )
+        with self.assertRaises(ksa_exceptions.ConnectFailure):
+            policy.call("POST", func, openstack.classify_response)
+        self.assertEqual(func.call_count, 1)
+
+        # Errors unrelated to the health of the resource are never retried.
+        func = mock.Mock(side_effect=ksa_exceptions.Conflict())
+        with self.assertRaises(ksa_exceptions.Conflict):
+            policy.call("PUT", func, openstack.classify_response)
+        self.assertEqual(func.call_count, 1)
+
+    def test_circuit_breaker(self):
+        breaker = resilience.CircuitBreaker(
+            "test", failure_threshold=2, reset_timeout=30
+        )
+        policy = resilience.RetryPolicy(breaker, attempts=1)
+        failing = mock.Mock(return_value=fake_response(500))
+        healthy = mock.Mock(return_value=fake_response(200))
+
+        for _ in range(2):
+            policy.call("GET", failing, openshift.classify_response)
+        self.assertEqual(breaker.state, breaker.OPEN)
+
+        with self.assertRaises(resilience.CircuitOpenError):
+            policy.call("GET", healthy, openshift.classify_response)
+        healthy.assert_not_called()
+
+        with mock.patch("time.monotonic", return_value=breaker._opened_at + 30):
+            # A failing probe opens the circuit again straight away.
+            policy.call("GET", failing, openshift.classify_response)
+            self.assertEqual(breaker.state, breaker.OPEN)
+
+        with mock.patch("time.monotonic", return_value=breaker._opened_at + 30):
+            policy.call("GET", healthy, openshift.classify_response)
+        self.assertEqual(breaker.state, breaker.CLOSED)
+        policy.call("GET", healthy, openshift.classify_response)
+        self.assertEqual(healthy.call_count, 2)
+
+    def test_token_fetch_is_part_of_attempt(self):
+        breaker = resilience.CircuitBreaker(
+            "test", failure_threshold=1, reset_timeout=30
+        )
+        breaker.record_failure()
+        rate_limiter = mock.MagicMock()
+        sesh = openstack.ResourceSession(
+            None, rate_limiter, resilience.RetryPolicy(breaker, attempts=3)
+        )
+
+        def fake_request(url, method, **kwargs):
+            if url.endswith("/servers"):
+                # The auth plugin fetches a token with the same session
+                sesh.request("https://keystone/v3/auth/tokens", "POST")
+            return fake_response(200)
+
+        with (
+            mock.patch.object(session.Session, "request", side_effect=fake_request),
+            mock.patch("time.monotonic", return_value=breaker._opened_at + 30),
+        ):
+            # The trial request of the half open circuit can get its token
+            sesh.request("https://nova/servers", "GET")
+        self.assertEqual(breaker.state, breaker.CLOSED)
+        self.assertEqual(rate_limiter.__enter__.call_count, 1)
+
+    @mock.patch.dict(
+        "os.environ",
+        {
+            "OPENSHIFT_FLAKY_RETRY_ATTEMPTS": "5",
+            "OPENSHIFT_FLAKY_CIRCUIT_BREAKER_THRESHOLD": "0",
+        },
+    )
+    def test_get_retry_policy(self):
+        flaky = mock.Mock()
+        flaky.name = "flaky"
+        default = mock.Mock()
+        default.name = "default"
+
+        policy = resilience.get_retry_policy("OPENSHIFT", flaky)
+        self.assertIs(policy, resilience.get_retry_policy("OPENSHIFT", flaky))
+        self.assertEqual(policy.attempts, 5)
+        self.assertIsNone(policy.breaker)
+
+        policy = resilience.get_retry_policy("OPENSHIFT", default)
+        self.assertEqual(policy.attempts, resilience.DEFAULT_RETRY_ATTEMPTS)
+        self.assertEqual(
+            policy.breaker.failure_threshold,
+            resilience.DEFAULT_CIRCUIT_BREAKER_THRESHOLD,
+        )
+
+    def test_clients_retry(self):
+        rate_limiter = mock.MagicMock()
+        policy = resilience.RetryPolicy(attempts=2)
+
+        with mock.patch.object(
+            session.Session,
+            "request",
+            side_effect=[ksa_exceptions.GatewayTimeout(), fake_response(200)],
+        ) as fake_request:
+            sesh = openstack.ResourceSession(None, rate_limiter, policy)
+            sesh.request("https://keystone", "GET")
+        self.assertEqual(fake_request.call_count, 2)
+        # Every attempt goes through the rate limiter.
+        self.assertEqual(rate_limiter.__enter__.call_count, 2)
+
+        # swiftclient sends requests with its own connection
+        rate_limiter.reset_mock()
+        with mock.patch.object(
+            swiftclient.Connection,
+            "head_account",
+            side_effect=[
+                swiftclient.exceptions.ClientException("timeout", http_status=504),
+                {},
+            ],
+        ) as fake_request:
+            connection = openstack.create_swift_connection(sesh, None)
+            openstack.call_swift_account(connection, "head_account")
+        self.assertEqual(fake_request.call_count, 2)
+        self.assertEqual(rate_limiter.__enter__.call_count, 2)
+
+        rate_limiter.reset_mock()
+        with mock.patch.object(
+            kubernetes.client.ApiClient,
+            "call_api",
+            side_effect=[fake_response(502), fake_response(200)],
+        ) as fake_request:
+            api_client = openshift.ResourceApiClient(
+                kubernetes.client.Configuration(), rate_limiter, policy
+            )
+            api_client.call_api("GET", "https://openshift/api")
+        self.assertEqual(fake_request.call_count, 2)
+        self.assertEqual(rate_limiter.__enter__.call_count, 2)
@@ -0,0 +1,144 @@
+import ast
+from unittest import mock
+
+from coldfront.core.allocation.models import AllocationUserStatusChoice
+
+from django_q.models import Schedule
+
+from coldfront_plugin_cloud import signals
+from coldfront_plugin_cloud.tests import base
+
+
+@mock.patch.dict("os.environ", {"REDIS_HOST": "redis"})
+class TestAllocationTaskCoalescing(base.TestBase):
+    def test_activation_enqueued_once(self):
+        signals.activate_allocation_receiver(None, allocation_pk=42)
+
+        s = Schedule.objects.get(name="allocation-42")
+        self.assertEqual(s.func, "coldfront_plugin_cloud.tasks.activate_allocation")
+        self.assertEqual(s.schedule_type, Schedule.ONCE)
+        self.assertEqual(ast.literal_eval(s.args), (42,))
+
+    def test_burst_of_activations_coalesced(self):
+        signals.activate_allocation_receiver(None, allocation_pk=42)
+        first_run = Schedule.objects.get(name="allocation-42").next_run
+
+        for _ in range(5):
+            signals.activate_allocation_receiver(None, allocation_pk=42)
+
+        self.assertEqual(Schedule.objects.filter(name="allocation-42").count(), 1)
+        self.assertGreater(
+            Schedule.objects.get(name="allocation-42").next_run, first_run
+        )
+
+    @mock.patch.dict("os.environ", {"ALLOCATION_TASK_MAX_DELAY_SECONDS": "10"})
+    def test_coalesced_activation_delay_capped(self):
+        signals.activate_allocation_receiver(None, allocation_pk=42)
+        first_run = Schedule.objects.get(name="allocation-42").next_run
+
+        signals.activate_allocation_receiver(None, allocation_pk=42)
+        self.assertEqual(Schedule.objects.get(name="allocation-42").next_run, first_run)
+
+    def test_activations_for_different_allocations_not_coalesced(self):
+        signals.activate_allocation_receiver(None, allocation_pk=42)
+        signals.activate_allocation_receiver(None, allocation_pk=43)
+
+        self.assertEqual(
+            Schedule.objects.filter(name__startswith="allocation-").count(),
+            2,
+        )
+
+    @mock.patch.dict("os.environ", {"ALLOCATION_TASK_DEBOUNCE_SECONDS": "0"})
+    def test_activation_after_task_started(self):
+        signals.activate_allocation_receiver(None, allocation_pk=42)
+        # The scheduler deletes ONCE schedules when handing them to a worker.
+        Schedule.objects.filter(name="allocation-42").delete()
+
+        signals.activate_allocation_receiver(None, allocation_pk=42)
+        self.assertTrue(Schedule.objects.filter(name="allocation-42").exists())
+
+    @mock.patch("coldfront_plugin_cloud.signals.activate_allocation")
+    @mock.patch.dict("os.environ", {"REDIS_HOST": ""})
+    def test_activation_sync(self, fake_activate):
+        signals.activate_allocation_receiver(None, allocation_pk=42)
+
+        fake_activate.assert_called_once_with(42)
+        self.assertFalse(
+            Schedule.objects.filter(name__startswith="allocation-").exists()
+        )
+
+    def test_disable_supersedes_pending_activation(self):
+        signals.activate_allocation_receiver(None, allocation_pk=42)
+        signals.allocation_disable_receiver(None, allocation_pk=42)
+
+        s = Schedule.objects.get(name="allocation-42")
+        self.assertEqual(s.func, "coldfront_plugin_cloud.tasks.disable_allocation")
+        self.assertEqual(ast.literal_eval(s.args), (42,))
+
+    def test_user_removals_batched(self):
+        project = self.new_project()
+        allocation = self.new_allocation(project, self.new_openshift_resource(), 1)
+        allocation_users = [
+            self.new_allocation_user(allocation, self.new_user()) for _ in range(3)
+        ]
+
+        for allocation_user in allocation_users:
+            signals.allocation_remove_user_receiver(
+                None, allocation_user_pk=allocation_user.pk
+            )
+
+        s = Schedule.objects.get(name=f"remove_users_from_allocation-{allocation.pk}")
+        self.assertEqual(
+            s.func, "coldfront_plugin_cloud.tasks.remove_users_from_allocation"
+        )
+        self.assertEqual(
+            ast.literal_eval(s.args), (sorted(au.pk for au in allocation_users),)
+        )
+
+    @mock.patch("coldfront_plugin_cloud.signals.async_task")
+    def test_user_readded_before_removal_runs(self, fake_async_task):
+        project = self.new_project()
+        allocation = self.new_allocation(project, self.new_openshift_resource(), 1)
+        au1 = self.new_allocation_user(allocation, self.new_user())
+        au2 = self.new_allocation_user(allocation, self.new_user())
+        name = f"remove_users_from_allocation-{allocation.pk}"
+
+        signals.allocation_remove_user_receiver(None, allocation_user_pk=au1.pk)
+        signals.allocation_remove_user_receiver(None, allocation_user_pk=au2.pk)
+        signals.activate_allocation_user_receiver(None, allocation_user_pk=au1.pk)
+
+        self.assertEqual(
+            ast.literal_eval(Schedule.objects.get(name=name).args), ([au2.pk],)
+        )
+        fake_async_task.assert_called_once_with(signals.add_user_to_allocation, au1.pk)
+
+        signals.activate_allocation_user_receiver(None, allocation_user_pk=au2.pk)
+        self.assertFalse(Schedule.objects.filter(name=name).exists())
+
+
+class TestRemoveUsersFromAllocation(base.TestBase):
+    @mock.patch("coldfront_plugin_cloud.tasks.find_allocator")
+    def test_remove_users_single_allocator(self, fake_find_allocator):
+        project = self.new_project()
+        allocation = self.new_allocation(project, self.new_openshift_resource(), 1)
+        allocation_users = [
+            self.new_allocation_user(allocation, self.new_user()) for _ in range(3)
+        ]
+        removed = AllocationUserStatusChoice.objects.get(name="Removed")
+        for allocation_user in allocation_users:
+            allocation_user.status = removed
+            allocation_user.save()
+        fake_allocator = fake_find_allocator.return_value
+
+        with mock.patch.object(
+            allocation.__class__, "get_attribute", return_value="fake-project"
+        ):
+            signals.remove_users_from_allocation([au.pk for au in allocation_users])
+
+        fake_find_allocator.assert_called_once_with(allocation)
+        fake_allocator.remove_roles_bulk.assert_called_once()
+        usernames, project_id = fake_allocator.remove_roles_bulk.call_args.args
+        self.assertEqual(
+            sorted(usernames), sorted(au.user.username for au in allocation_users)
+        )
+        self.assertEqual(project_id, "fake-project")
@@ -0,0 +1,81 @@
+import json
+import subprocess
+import sys
+from unittest import mock
+
+from django.core.management import call_command
+
+from coldfront_plugin_cloud import (
+    attributes,
+    esi,
+    openshift,
+    openshift_vm,
+    openstack,
+    tasks,
+    utils,
+)
+from coldfront_plugin_cloud.tests import base
+
+CHECK_IMPORTED_MODULES = """
+import json, sys
+import django
+django.setup()
+import coldfront_plugin_cloud.signals
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+class TestFindAllocator(base.TestBase):
+    def test_get_allocator_class(self):
+        for resource_type, allocator_class in [
+            ("OpenStack", openstack.OpenStackResourceAllocator),
+            ("OpenShift", openshift.OpenShiftResourceAllocator),
+            ("ESI", esi.ESIResourceAllocator),
+            ("OpenShift Virtualization", openshift_vm.OpenShiftVMResourceAllocator),
+        ]:
+            self.assertIs(tasks.get_allocator_class(resource_type), allocator_class)
+        self.assertIsNone(tasks.get_allocator_class("Cluster"))
+
+    def test_find_allocator(self):
+        resource = self.new_openshift_resource()
+        call_command("register_default_quotas", apply=True)
+        allocation = self.new_allocation(self.new_project(), resource, 1)
+
+        allocator = tasks.find_allocator(allocation)
+        self.assertIsInstance(allocator, openshift.OpenShiftResourceAllocator)
+        self.assertEqual(allocator.resource, resource)
+
+    def test_signals_do_not_import_allocators(self):
+        output = subprocess.run(
+            [sys.executable, "-c", CHECK_IMPORTED_MODULES],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout
+        modules = set(json.loads(output))
+
+        self.assertIn("coldfront_plugin_cloud.tasks", modules)
+        for module in [
+            "coldfront_plugin_cloud.openstack",
+            "coldfront_plugin_cloud.openshift",
+            "keystoneclient",
+            "kubernetes",
+        ]:
+            self.assertNotIn(module, modules)
+
+
+class TestValidateProject(base.TestBase):
+    def test_drift_without_apply_not_validated(self):
+        resource = self.new_openshift_resource()
+        allocation = self.new_allocation(self.new_project(), resource, 1)
+        utils.set_attribute_on_allocation(
+            allocation, attributes.ALLOCATION_PROJECT_ID, "project"
+        )
+        allocator = mock.Mock(project_not_found_errors=())
+
+        allocator.set_project_configuration.return_value = False
+        self.assertTrue(tasks.validate_project(allocator, allocation, apply=False))
+
+        allocator.set_project_configuration.return_value = True
+        self.assertFalse(tasks.validate_project(allocator, allocation, apply=False))
+        self.assertTrue(tasks.validate_project(allocator, allocation, apply=True))
@@ -1,6 +1,8 @@
 import re
 import secrets
+import time
 from random import randrange
+from unittest import mock
 
 from coldfront_plugin_cloud.tests import base
 from coldfront_plugin_cloud import utils
@@ -29,3 +31,38 @@ class TestGetSanitizedProjectName(base.TestBase):
         self.assertEqual(utils.env_safe_name(42), "42")
         self.assertEqual(utils.env_safe_name(None), "NONE")
         self.assertEqual(utils.env_safe_name("hello"), "HELLO")
+
+
+class TestTTLCache(base.TestBase):
+    def test_get_set(self):
+        cache = utils.TTLCache(ttl=60)
+        cache.set("foo", "bar")
+        self.assertEqual(cache.get("foo"), "bar")
+        self.assertIn("foo", cache)
+        self.assertIsNone(cache.get("baz"))
+        self.assertEqual(cache.pop("foo"), "bar")
+        self.assertNotIn("foo", cache)
+
+    def test_expiry(self):
+        cache = utils.TTLCache(ttl=60)
+        cache.set("foo", "bar")
+        cache.set("baz", "qux", ttl=120)
+
+        with mock.patch(
+            "coldfront_plugin_cloud.utils.time.monotonic",
+            return_value=time.monotonic() + 90,
+        ):
+            self.assertIsNone(cache.get("foo"))
+            self.assertEqual(cache.get("baz"), "qux")
+            self.assertEqual(len(cache), 1)
+
+    def test_maxsize_evicts_least_recently_used(self):
+        cache = utils.TTLCache(ttl=60, maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
@@ -0,0 +1,174 @@
+import argparse
+import os
+import tempfile
+from unittest import mock
+
+import django_q.tasks
+from django.core.management import CommandError, call_command
+
+from coldfront_plugin_cloud import attributes, tasks, utils
+from coldfront_plugin_cloud.management.commands.validate_allocations import (
+    get_shard,
+    parse_shard,
+)
+from coldfront_plugin_cloud.tests import base
+
+COMMAND = "coldfront_plugin_cloud.management.commands.validate_allocations"
+
+
+class TestIncrementalValidation(base.TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.resource = self.new_openshift_resource()
+        self.allocations = []
+        for i in range(3):
+            allocation = self.new_allocation(self.new_project(), self.resource, 1)
+            utils.set_attribute_on_allocation(
+                allocation, attributes.ALLOCATION_PROJECT_ID, f"project-{i}"
+            )
+            self.allocations.append(allocation)
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.state_file = os.path.join(tmp_dir.name, "state.json")
+
+        self.project_versions = {f"project-{i}": "1" for i in range(3)}
+        find_allocator = mock.patch(
+            "coldfront_plugin_cloud.tasks.find_allocator",
+            side_effect=self.fake_find_allocator,
+        )
+        find_allocator.start()
+        self.addCleanup(find_allocator.stop)
+        validate = mock.patch(
+            "coldfront_plugin_cloud.tasks.validate_project", return_value=True
+        )
+        self.fake_validate = validate.start()
+        self.addCleanup(validate.stop)
+
+    def fake_find_allocator(self, allocation):
+        allocator = mock.Mock(allocation=allocation, resource=self.resource)
+        allocator.get_project_versions.return_value = self.project_versions
+        return allocator
+
+    def validate(self, full_coverage_runs=1000, **options):
+        self.fake_validate.reset_mock()
+        call_command(
+            "validate_allocations",
+            incremental=True,
+            state_file=self.state_file,
+            full_coverage_runs=full_coverage_runs,
+            **options,
+        )
+        return {
+            call.args[1]
+            for call in self.fake_validate.call_args_list
+            if call.args[1] in self.allocations
+        }
+
+    def test_only_changed_allocations_validated(self):
+        self.assertEqual(self.validate(), set(self.allocations))
+        self.assertEqual(self.validate(), set())
+
+        # Change in ColdFront
+        utils.set_attribute_on_allocation(
+            self.allocations[0], attributes.ALLOCATION_INSTITUTION_SPECIFIC_CODE, "isc"
+        )
+        self.assertEqual(self.validate(), {self.allocations[0]})
+
+        # Change in the cluster
+        self.project_versions["project-2"] = "2"
+        self.assertEqual(self.validate(), {self.allocations[2]})
+
+        self.assertEqual(self.validate(), set())
+
+    def test_failed_validation_retried(self):
+        self.fake_validate.return_value = False
+        self.assertEqual(self.validate(), set(self.allocations))
+        self.assertEqual(self.validate(), set(self.allocations))
+
+    def test_rotating_slice(self):
+        self.validate(full_coverage_runs=2)
+
+        validated = self.validate(full_coverage_runs=2)
+        validated |= self.validate(full_coverage_runs=2)
+        self.assertEqual(validated, set(self.allocations))
+
+    def test_shards_partition_allocations(self):
+        shards = []
+        for i in range(3):
+            shards.append(self.validate(shard=(i, 3)))
+
+        self.assertEqual(set().union(*shards), set(self.allocations))
+        self.assertEqual(sum(len(x) for x in shards), len(self.allocations))
+        self.assertEqual(
+            get_shard(self.allocations[0].pk, 3), get_shard(self.allocations[0].pk, 3)
+        )
+
+    def test_state_file_required(self):
+        with mock.patch.dict("os.environ", {"VALIDATE_ALLOCATIONS_STATE_FILE": ""}):
+            with self.assertRaises(CommandError):
+                call_command("validate_allocations", incremental=True)
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("1/4"), (1, 4))
+        for value in ["4/4", "-1/4", "1", "a/b"]:
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parse_shard(value)
+
+    def test_fan_out(self):
+        enqueued = []
+
+        def fake_async_task(func, *args, group):
+            enqueued.append(args[0])
+            # Run in this process, saving the results to the Task table
+            django_q.tasks.async_task(func, *args, group=group, sync=True)
+
+        with (
+            mock.patch(f"{COMMAND}.async_task", side_effect=fake_async_task),
+            # Every task has finished once enqueued, there is nothing to wait for
+            mock.patch(
+                f"{COMMAND}.time.sleep",
+                side_effect=AssertionError("Waited for finished tasks"),
+            ),
+            mock.patch(
+                "coldfront_plugin_cloud.tasks.validate_allocation",
+                side_effect=lambda pk, apply: pk != self.allocations[1].pk,
+            ) as fake_validate_allocation,
+        ):
+            self.validate(fan_out=True, fan_out_chunk_size=2)
+            pks = [pk for chunk in enqueued for pk in chunk]
+            self.assertTrue({a.pk for a in self.allocations} <= set(pks))
+            self.assertTrue(all(len(chunk) <= 2 for chunk in enqueued))
+            self.fake_validate.assert_not_called()
+
+            # Only allocations that were validated get a watermark.
+            enqueued.clear()
+            fake_validate_allocation.reset_mock()
+            self.validate(fan_out=True, fan_out_chunk_size=2)
+            self.assertIn(
+                self.allocations[1].pk, [pk for chunk in enqueued for pk in chunk]
+            )
+            self.assertNotIn(
+                self.allocations[0].pk, [pk for chunk in enqueued for pk in chunk]
+            )
+
+
+class TestValidateAllocationTask(base.TestBase):
+    @mock.patch("coldfront_plugin_cloud.tasks.find_allocator")
+    def test_validate_allocation(self, fake_find_allocator):
+        resource = self.new_openshift_resource()
+        active = self.new_allocation(self.new_project(), resource, 1)
+        utils.set_attribute_on_allocation(
+            active, attributes.ALLOCATION_PROJECT_ID, "project-a"
+        )
+        expired = self.new_allocation(self.new_project(), resource, 1, status="Expired")
+        fake_allocator = fake_find_allocator.return_value
+        fake_allocator.set_project_configuration.return_value = False
+
+        self.assertTrue(tasks.validate_allocation(active.pk, apply=False))
+        fake_allocator.set_project_configuration.assert_called_once_with(
+            "project-a", apply=False
+        )
+
+        self.assertFalse(tasks.validate_allocation(expired.pk))
+        fake_find_allocator.assert_called_once()
@@ -0,0 +1,193 @@
+import queue
+import threading
+import time
+from unittest import mock
+
+from django_q.models import Schedule
+from kubernetes.client.rest import ApiException
+
+from coldfront_plugin_cloud import attributes, utils
+from coldfront_plugin_cloud.management.commands.watch_openshift_projects import (
+    Command,
+)
+from coldfront_plugin_cloud.tests import base
+
+
+def event(event_type, name, resource_version, namespace=None, **fields):
+    metadata = {"name": name, "resourceVersion": resource_version}
+    if namespace:
+        metadata["namespace"] = namespace
+    return {"type": event_type, "raw_object": {"metadata": metadata, **fields}}
+
+
+class TestWatchOpenShiftProjects(base.TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.resource = self.new_openshift_resource()
+        self.allocation = self.new_allocation(self.new_project(), self.resource, 1)
+        utils.set_attribute_on_allocation(
+            self.allocation, attributes.ALLOCATION_PROJECT_ID, "project-a"
+        )
+
+        self.command = Command()
+        self.command.resource = self.resource
+        self.command.allocator = mock.Mock()
+        self.command.apply = True
+        self.command.namespace_index = self.command.get_namespace_index()
+        self.command.index_loaded_at = time.monotonic()
+        self.command.digests = {}
+        self.command.events = queue.Queue()
+        self.command.stopped = threading.Event()
+
+    def test_watch_resumes_and_relists_on_expiry(self):
+        fake_api = self.command.allocator.get_resource_api.return_value
+        fake_api.get.return_value.to_dict.side_effect = [
+            {"metadata": {"resourceVersion": "10"}},
+            {"metadata": {"resourceVersion": "20"}},
+        ]
+
+        def first_watch():
+            yield event("MODIFIED", "quota", "11", namespace="project-a")
+            yield event("BOOKMARK", "", "12")
+            raise ConnectionError("connection dropped")
+
+        def second_watch():
+            yield event("DELETED", "rolebinding", "13", namespace="project-a")
+            raise ApiException(status=410)
+
+        def third_watch():
+            self.command.stopped.set()
+            yield from ()
+
+        fake_api.watch.side_effect = [first_watch(), second_watch(), third_watch()]
+
+        with mock.patch(
+            "coldfront_plugin_cloud.management.commands.watch_openshift_projects.RECONNECT_DELAY_SECONDS",
+            0,
+        ):
+            self.command.watch("v1", "ResourceQuota")
+
+        self.assertEqual(
+            [call.kwargs["resource_version"] for call in fake_api.watch.call_args_list],
+            ["10", "12", "20"],
+        )
+        self.assertEqual(
+            list(self.command.events.queue),
+            [
+                ("project-a", "ResourceQuota quota MODIFIED"),
+                ("project-a", "ResourceQuota rolebinding DELETED"),
+            ],
+        )
+
+    def test_watch_skips_unchanged_fields_and_other_namespaces(self):
+        fake_api = self.command.allocator.get_resource_api.return_value
+        fake_api.get.return_value.to_dict.return_value = {
+            "metadata": {"resourceVersion": "1"}
+        }
+        spec = {"hard": {"pods": "10"}}
+
+        def watch():
+            yield event(
+                "MODIFIED", "quota", "2", namespace="project-a", spec=spec, status={}
+            )
+            # Usage of the quota changing
+            yield event(
+                "MODIFIED",
+                "quota",
+                "3",
+                namespace="project-a",
+                spec=spec,
+                status={"used": {"pods": "1"}},
+            )
+            yield event(
+                "MODIFIED", "quota", "4", namespace="openshift-monitoring", spec=spec
+            )
+            yield event(
+                "MODIFIED",
+                "quota",
+                "5",
+                namespace="project-a",
+                spec={"hard": {"pods": "20"}},
+            )
+            yield event("DELETED", "quota", "6", namespace="project-a", spec=spec)
+            yield event("ADDED", "quota", "7", namespace="project-a", spec=spec)
+            self.command.stopped.set()
+
+        fake_api.watch.return_value = watch()
+
+        self.command.watch("v1", "ResourceQuota", ["spec"])
+
+        self.assertEqual(
+            list(self.command.events.queue),
+            [
+                ("project-a", "ResourceQuota quota MODIFIED"),
+                ("project-a", "ResourceQuota quota MODIFIED"),
+                ("project-a", "ResourceQuota quota DELETED"),
+                ("project-a", "ResourceQuota quota ADDED"),
+            ],
+        )
+
+    def test_namespace_watch_uses_project_label(self):
+        fake_api = self.command.allocator.get_resource_api.return_value
+        fake_api.get.return_value.to_dict.return_value = {
+            "metadata": {"resourceVersion": "1"}
+        }
+
+        def watch():
+            self.command.stopped.set()
+            yield event("MODIFIED", "project-a", "2")
+
+        fake_api.watch.return_value = watch()
+
+        self.command.watch("v1", "Namespace")
+
+        self.assertEqual(
+            fake_api.watch.call_args.kwargs["label_selector"],
+            "nerc.mghpcc.org/project=true",
+        )
+        self.assertEqual(
+            self.command.events.get_nowait(),
+            ("project-a", "Namespace project-a MODIFIED"),
+        )
+
+    @mock.patch("coldfront_plugin_cloud.tasks.validate_allocation")
+    @mock.patch.dict("os.environ", {"REDIS_HOST": ""})
+    def test_reconcile_sync(self, fake_validate):
+        self.command.reconcile("project-a", "ResourceQuota quota MODIFIED")
+        self.command.reconcile("openshift-monitoring", "ResourceQuota quota MODIFIED")
+
+        fake_validate.assert_called_once_with(self.allocation.pk, apply=True)
+
+    @mock.patch(
+        "coldfront_plugin_cloud.tasks.validate_allocation",
+        side_effect=[RuntimeError("boom"), True],
+    )
+    @mock.patch.dict("os.environ", {"REDIS_HOST": ""})
+    def test_reconcile_sync_error(self, fake_validate):
+        with self.assertLogs(level="ERROR"):
+            self.command.reconcile("project-a", "ResourceQuota quota MODIFIED")
+        self.command.reconcile("project-a", "ResourceQuota quota MODIFIED")
+
+        self.assertEqual(fake_validate.call_count, 2)
+
+    @mock.patch.dict("os.environ", {"REDIS_HOST": "redis"})
+    def test_reconcile_async_coalesced(self):
+        for _ in range(3):
+            self.command.reconcile("project-a", "RoleBinding admin MODIFIED")
+
+        name = f"validate_allocation-{self.allocation.pk}"
+        self.assertEqual(Schedule.objects.filter(name=name).count(), 1)
+        self.assertEqual(
+            Schedule.objects.get(name=name).func,
+            "coldfront_plugin_cloud.tasks.validate_allocation",
+        )
+
+    def test_new_allocation_found_after_index_refresh(self):
+        allocation = self.new_allocation(self.new_project(), self.resource, 1)
+        utils.set_attribute_on_allocation(
+            allocation, attributes.ALLOCATION_PROJECT_ID, "project-b"
+        )
+        self.assertIsNone(self.command.get_allocation_pk("project-b"))
+
+        self.command.index_loaded_at -= 3600
+        self.assertEqual(self.command.get_allocation_pk("project-b"), allocation.pk)
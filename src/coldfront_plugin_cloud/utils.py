@@ -1,8 +1,11 @@
+import collections
 import datetime
 import functools
 import math
 import re
 import secrets
+import threading
+import time
 
 from coldfront.core.allocation.models import (
     Allocation,
@@ -12,12 +15,65 @@ from coldfront.core.allocation.models import (
     AllocationAttributeChangeRequest,
 )
 
-from coldfront_plugin_cloud import attributes
+from coldfront_plugin_cloud import attributes, profiling
 
 # Load outages data once per program execution
 _OUTAGES_DATA = None
 
 
+class TTLCache:
+    """Thread-safe cache whose entries expire after a time-to-live.
+
+    If maxsize is set, the least recently used entries are evicted once the
+    cache is full.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, ttl: float, maxsize: int | None = None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value, expires_at = self._data.get(key, (self._MISSING, 0))
+            if value is self._MISSING:
+                return default
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float | None = None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            value, expires_at = self._data.pop(key, (default, 0))
+            return value if expires_at > time.monotonic() else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key, self._MISSING) is not self._MISSING
+
+    def __len__(self):
+        with self._lock:
+            now = time.monotonic()
+            return sum(1 for _, expires_at in self._data.values() if expires_at > now)
+
+
 def env_safe_name(name):
     return re.sub(r"[^A-Za-z0-9]", "_", str(name)).upper()
 
@@ -208,7 +264,8 @@ def load_outages_from_nerc_rates(
     if _OUTAGES_DATA is None:
         from nerc_rates import outages
 
-        _OUTAGES_DATA = outages.load_from_url()
+        with profiling.phase(profiling.IO):
+            _OUTAGES_DATA = outages.load_from_url()
     return _OUTAGES_DATA.get_outages_during(
         start.isoformat(), end.isoformat(), affected_service
     )